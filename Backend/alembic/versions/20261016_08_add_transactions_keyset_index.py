@@ -0,0 +1,27 @@
+"""Add composite index for keyset pagination of transactions.
+
+Revision ID: 20261016_08_add_transactions_keyset_index
+Revises: 20251112_07_add_asset_lot_fields
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+
+
+revision = "20261016_08_add_transactions_keyset_index"
+down_revision = "20251112_07_add_asset_lot_fields"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Atende ORDER BY executed_at, id (asc ou desc) e o filtro por cursor
+    op.create_index(
+        "ix_transactions_portfolio_executed_id",
+        "transactions",
+        ["portfolio_id", "executed_at", "id"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transactions_portfolio_executed_id", table_name="transactions")
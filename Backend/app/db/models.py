@@ -133,6 +133,10 @@ class Transaction(Base):
 
 class AssetPrice(Base):
     __tablename__ = "asset_prices"
+    __table_args__ = (
+        # Um fechamento por ativo e dia (alvo do ON CONFLICT nos upserts)
+        UniqueConstraint("asset_id", "date", name="uq_asset_prices_asset_date"),
+    )
     id = Column(Integer, primary_key=True)
     asset_id = Column(
         Integer, ForeignKey(FK_ASSETS_ID, ondelete="CASCADE"), nullable=False
@@ -190,9 +190,12 @@ def create_asset(body: AssetCreate, db: Session = Depends(get_db)):
         ),
     )
     db.add(a)
+    # flush ja preenche id e defaults; serializar antes do commit evita o
+    # SELECT extra de refresh/recarga dos atributos expirados
+    db.flush()
+    payload = asset_to_json(a)
     db.commit()
-    db.refresh(a)
-    return asset_to_json(a)
+    return payload
 
 
 @router.get("/search")
@@ -3,7 +3,9 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
@@ -89,15 +91,17 @@ def _load_session(db: Session, user: User, session_id: Optional[int]) -> ChatSes
 
 
 def _fetch_history(db: Session, session_id: int, limit: int) -> List[ChatMessage]:
-    query = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at.asc())
+    query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+    if limit <= 0:
+        return query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).all()
+    # A janela e cortada no banco: so as ultimas `limit` mensagens sao lidas
+    rows = (
+        query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit)
+        .all()
     )
-    rows = query.all()
-    if limit <= 0 or len(rows) <= limit:
-        return rows
-    return rows[-limit:]
+    rows.reverse()
+    return rows
 
 
 def _persist_message(
@@ -113,12 +117,7 @@ def _persist_message(
     return msg
 
 
-@router.post("", response_model=ChatResponse)
-def chat(
-    body: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
+def _validated_message(body: ChatRequest) -> str:
     if not _settings.chat.enabled:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -130,6 +129,20 @@ def chat(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Mensagem vazia."
         )
+    return user_message
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@router.post("", response_model=ChatResponse)
+def chat(
+    body: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    user_message = _validated_message(body)
 
     session = _load_session(db, current_user, body.session_id)
     history_rows = _fetch_history(db, session.id, _settings.chat.history_window)
@@ -155,6 +168,60 @@ def chat(
     )
 
 
+@router.post("/stream")
+def chat_stream(
+    body: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Mesmo fluxo do POST /chat, em Server-Sent Events: `meta` (sessao e
+    observacoes), um `token` por trecho do modelo e `done` ao final, quando a
+    resposta completa ja foi gravada no historico.
+    """
+    user_message = _validated_message(body)
+
+    session = _load_session(db, current_user, body.session_id)
+    session_id = session.id
+    history_rows = _fetch_history(db, session_id, _settings.chat.history_window)
+
+    _persist_message(db, session_id, "user", user_message)
+    db.commit()
+
+    stream = _agent.stream_reply(
+        db=db, user=current_user, message=user_message, history=history_rows
+    )
+    observations = [
+        _serialize_observation(obs).model_dump(mode="json")
+        for obs in stream.observations
+    ]
+
+    # O corpo e transmitido depois que o handler retorna: a resposta final e
+    # gravada numa sessao propria, sem depender do ciclo de vida do get_db
+    bind = db.get_bind()
+
+    def events():
+        yield _sse_event(
+            "meta", {"session_id": session_id, "observations": observations}
+        )
+        parts: List[str] = []
+        for chunk in stream.chunks:
+            parts.append(chunk)
+            yield _sse_event("token", {"text": chunk})
+
+        stream_db = Session(bind=bind)
+        try:
+            _persist_message(stream_db, session_id, "assistant", "".join(parts))
+            stream_db.commit()
+        finally:
+            stream_db.close()
+        yield _sse_event(
+            "done", {"used_fallback": stream.used_fallback, "error": stream.error}
+        )
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @router.post(
     "/session", response_model=NewSessionResponse, status_code=status.HTTP_201_CREATED
 )
@@ -201,8 +268,6 @@ def get_history(
 def get_chat_status():
     if not _settings.chat.enabled:
         return ChatStatusResponse(ready=False, reason="chat_disabled")
-    if getattr(_agent, "_llm", None) is None:
+    if not _agent._llm_ready():
         return ChatStatusResponse(ready=False, reason="llm_unavailable")
-    if getattr(_agent, "_prompt", None) is None:
-        return ChatStatusResponse(ready=False, reason="prompt_unavailable")
     return ChatStatusResponse(ready=True)
@@ -4,8 +4,9 @@ from sqlalchemy.orm import Session
 from decimal import Decimal
 
 from app.db.base import get_db
-from app.db.models import Asset, Holding
+from app.db.models import Holding
 from app.routes.holdings import get_or_create_default_portfolio  # reuso
+from app.routes.prices import get_or_create_assets
 from app.routes.auth import get_current_user, User  # type: ignore
 
 router = APIRouter(prefix="/import", tags=["import"])
@@ -17,18 +18,6 @@ class HoldingInput(BaseModel):
     avg_price: condecimal(gt=Decimal("0"))
 
 
-def get_or_create_asset(db: Session, symbol: str) -> Asset:
-    s = symbol.strip().upper()
-    a = db.query(Asset).filter(Asset.symbol == s).first()
-    if a:
-        return a
-    a = Asset(symbol=s, name=s, class_="acao", currency="BRL")
-    db.add(a)
-    db.commit()
-    db.refresh(a)
-    return a
-
-
 @router.post("/holdings")
 def import_holdings(
     items: list[HoldingInput],
@@ -38,30 +27,39 @@ def import_holdings(
     portfolio = get_or_create_default_portfolio(db, user.id)
     created, updated = 0, 0
 
-    for it in items:
-        a = get_or_create_asset(db, it.symbol)
-        h = (
-            db.query(Holding)
-            .filter(
-                Holding.portfolio_id == portfolio.id,
-                Holding.asset_id == a.id,
-            )
-            .first()
+    # Ativos e posicoes resolvidos em lote; um unico commit ao final
+    assets = get_or_create_assets(db, [it.symbol for it in items])
+    asset_ids = {a.id for a in assets.values()}
+    holdings_by_asset: dict[int, Holding] = {}
+    existing = (
+        db.query(Holding)
+        .filter(
+            Holding.portfolio_id == portfolio.id,
+            Holding.asset_id.in_(asset_ids),
         )
+        .order_by(Holding.id)
+        .all()
+    )
+    for h in existing:
+        holdings_by_asset.setdefault(h.asset_id, h)
+
+    for it in items:
+        a = assets[it.symbol.strip().upper()]
+        h = holdings_by_asset.get(a.id)
 
         if h:
             h.quantity = float(it.quantity)
             h.avg_price = float(it.avg_price)
             updated += 1
         else:
-            db.add(
-                Holding(
-                    portfolio_id=portfolio.id,
-                    asset_id=a.id,
-                    quantity=float(it.quantity),
-                    avg_price=float(it.avg_price),
-                )
+            h = Holding(
+                portfolio_id=portfolio.id,
+                asset_id=a.id,
+                quantity=float(it.quantity),
+                avg_price=float(it.avg_price),
             )
+            db.add(h)
+            holdings_by_asset[a.id] = h
             created += 1
 
     db.commit()
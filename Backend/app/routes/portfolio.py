@@ -1,8 +1,17 @@
+import base64
 import json
+import math
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Date, Row, and_, func, select, tuple_
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
 from collections import defaultdict
+import numpy as np
 from typing import Dict, Iterable, List, Optional, Tuple, Literal
 
 from app.db.base import get_db
@@ -15,12 +24,13 @@ from app.db.models import (
     Transaction,
 )
 from app.routes.auth import get_current_user, User  # type: ignore
+from app.responses import ORJSONResponse
 from app.services.fx import FxRateNotFoundError, get_fx_rate
 from app.services.history import ensure_history_for_assets
 from app.services.currency import normalize_currency_code
 from app.services.allocations import (
-    CLASS_LABELS,
     AllocationProfile,
+    class_label,
     get_allocation_profile,
     normalize_asset_class,
 )
@@ -29,11 +39,30 @@ from app.services.rebalance import (
     RebalanceOptions,
     rebalance_portfolio,
 )
-from app.services.portfolio_utils import record_transaction
+from app.services.portfolio_utils import record_transactions, transaction_row
 from pydantic import BaseModel, field_validator, confloat, constr
 
 router = APIRouter(prefix="/portfolio", tags=["portfolio"])
 
+FX_PREFETCH_WORKERS = 8
+
+
+@lru_cache(maxsize=64)
+def _profile_rules_context(
+    profile_key: str, rules_json: Optional[str]
+) -> tuple[AllocationProfile, tuple[str, ...]]:
+    # Depende so do perfil e do texto das regras: memoizavel entre requisicoes
+    allocation = get_allocation_profile(profile_key)
+    rules_applied: tuple[str, ...] = ()
+    if rules_json:
+        try:
+            loaded_rules = json.loads(rules_json)
+            if isinstance(loaded_rules, list):
+                rules_applied = tuple(str(item) for item in loaded_rules)
+        except json.JSONDecodeError:
+            rules_applied = ()
+    return allocation, rules_applied
+
 
 def _resolve_profile_context(
     db: Session, user_id: int, profile_override: Optional[str]
@@ -49,28 +78,19 @@ def _resolve_profile_context(
     else:
         profile_key = "moderado"
 
-    allocation = get_allocation_profile(profile_key)
-
-    rules_applied: List[str] = []
-    if rp and rp.rules:
-        try:
-            loaded_rules = json.loads(rp.rules)
-            if isinstance(loaded_rules, list):
-                rules_applied = [str(item) for item in loaded_rules]
-        except json.JSONDecodeError:
-            rules_applied = []
-
-    return rp, allocation, profile_source, rules_applied
+    allocation, rules_applied = _profile_rules_context(
+        profile_key, rp.rules if rp else None
+    )
+    return rp, allocation, profile_source, list(rules_applied)
 
 
-def convert_to_brl(
-    price: float,
+def _resolve_fx(
     currency: Optional[str],
     fx_cache: Dict[str, tuple[float, Optional[datetime]]],
-) -> tuple[float, float, Optional[datetime], str]:
+) -> tuple[float, Optional[datetime], str]:
     curr = normalize_currency_code(currency)
     if curr == "BRL":
-        return price, 1.0, None, curr
+        return 1.0, None, curr
 
     cached = fx_cache.get(curr)
     if cached:
@@ -81,6 +101,53 @@ def convert_to_brl(
         except FxRateNotFoundError:
             rate, ts = 1.0, None
         fx_cache[curr] = (rate, ts)
+    return rate, ts, curr
+
+
+def _prefetch_fx(
+    currencies: Iterable[Optional[str]],
+    fx_cache: Dict[str, tuple[float, Optional[datetime]]],
+) -> None:
+    """Resolve em paralelo as moedas ainda fora do cache (I/O de rede)."""
+    pending = sorted(
+        {normalize_currency_code(cur) for cur in currencies} - {"BRL"} - set(fx_cache)
+    )
+    if not pending:
+        return
+
+    def _fetch(curr: str) -> tuple[float, Optional[datetime]]:
+        try:
+            return get_fx_rate(curr, "BRL")
+        except FxRateNotFoundError:
+            return 1.0, None
+
+    if len(pending) == 1:
+        fx_cache[pending[0]] = _fetch(pending[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(FX_PREFETCH_WORKERS, len(pending))) as ex:
+        fx_cache.update(zip(pending, ex.map(_fetch, pending)))
+
+
+def _fx_rate(
+    currency: Optional[str],
+    fx_cache: Dict[str, tuple[float, Optional[datetime]]],
+) -> float:
+    rate, _, _ = _resolve_fx(currency, fx_cache)
+    return rate
+
+
+def convert_to_brl_fast(price: float, rate: float) -> float:
+    return price * rate
+
+
+def convert_to_brl_with_meta(
+    price: float,
+    currency: Optional[str],
+    fx_cache: Dict[str, tuple[float, Optional[datetime]]],
+) -> tuple[float, float, Optional[datetime], str]:
+    rate, ts, curr = _resolve_fx(currency, fx_cache)
+    if curr == "BRL":
+        return price, 1.0, None, curr
     return price * rate, rate, ts, curr
 
 
@@ -121,15 +188,28 @@ CLASS_CANDIDATES: Dict[str, List[dict]] = {
 }
 
 
+# Payload de candidatos por classe montado uma vez no import
+CLASS_CANDIDATES_PAYLOAD: Dict[str, Tuple[dict, ...]] = {
+    cls: tuple(
+        {
+            "symbol": item["symbol"],
+            "description": item.get("description"),
+            "class": cls,
+            "class_label": class_label(cls),
+        }
+        for item in items
+    )
+    for cls, items in CLASS_CANDIDATES.items()
+}
+
+
 def normalize_class(raw: Optional[str]) -> str:
     value = (raw or "acao").strip().lower()
     return CLASS_NORMALIZATION.get(value, "outros")
 
 
-def _compose_dt(date_obj: Optional[datetime]) -> Optional[str]:
-    if not date_obj:
-        return None
-    return date_obj.isoformat()
+# Leituras de historico so usam data e fechamento; OHLV ficam fora do SELECT
+_PRICE_COLUMNS = load_only(AssetPrice.asset_id, AssetPrice.date, AssetPrice.close)
 
 
 def _pick_price_rows(
@@ -142,13 +222,12 @@ def _pick_price_rows(
     current_at = asset.last_quote_at
 
     # Busca últimos fechamentos registrados para fallback e referência anterior
-    price_rows: List[AssetPrice] = (
-        db.query(AssetPrice)
-        .filter(AssetPrice.asset_id == asset.id)
+    price_rows = db.execute(
+        select(AssetPrice.date, AssetPrice.close)
+        .where(AssetPrice.asset_id == asset.id)
         .order_by(AssetPrice.date.desc())
         .limit(2)
-        .all()
-    )
+    ).all()
 
     prev_price = None
     prev_at = None
@@ -166,6 +245,36 @@ def _pick_price_rows(
     return current_price, current_at, prev_price, prev_at
 
 
+def _latest_closes(
+    db: Session, asset_ids: Iterable[int], before: Optional[date] = None
+) -> Dict[int, float]:
+    """
+    Ultimo fechamento registrado por ativo (opcionalmente anterior a `before`),
+    em uma unica consulta servida pelo indice (asset_id, date).
+    """
+    ids = list(set(asset_ids))
+    if not ids:
+        return {}
+    conditions = [AssetPrice.asset_id.in_(ids)]
+    if before is not None:
+        conditions.append(AssetPrice.date < before)
+    ranked = (
+        select(
+            AssetPrice.asset_id,
+            AssetPrice.close,
+            func.row_number()
+            .over(partition_by=AssetPrice.asset_id, order_by=AssetPrice.date.desc())
+            .label("rn"),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked.c.asset_id, ranked.c.close).where(ranked.c.rn == 1)
+    ).all()
+    return {asset_id: float(close) for asset_id, close in rows}
+
+
 def _build_portfolio_snapshot(
     db: Session,
     portfolio: Portfolio,
@@ -184,32 +293,31 @@ def _build_portfolio_snapshot(
         .all()
     )
 
-    itens: List[dict] = []
-    invested_total = 0.0
-    market_total = 0.0
-    previous_total = 0.0
     fx_cache: Dict[str, tuple[float, Optional[datetime]]] = {}
+    _prefetch_fx((h.asset.currency for h in rows if h.asset), fx_cache)
     fx_meta: Dict[str, dict] = {}
     as_of: Optional[datetime] = None
 
+    # 1a passada: so coleta colunas brutas (precos, cambio, metadados)
+    records: List[tuple] = []
+    quantities: List[float] = []
+    avg_prices: List[float] = []
+    prices_brl: List[float] = []
+    prev_prices_brl: List[float] = []
+
     for holding in rows:
         asset = holding.asset
-        normalized_class = normalize_class(asset.class_)
         quantity = float(holding.quantity)
         avg_price = float(holding.avg_price)
-        invested_value = quantity * avg_price
-        invested_total += invested_value
 
         price_now, price_at, prev_price_raw, prev_at = _pick_price_rows(db, asset)
         if price_now is None:
             price_now = avg_price
             price_at = holding.updated_at or holding.created_at
 
-        converted_price, fx_rate, fx_ts, currency = convert_to_brl(
+        converted_price, fx_rate, fx_ts, currency = convert_to_brl_with_meta(
             float(price_now), asset.currency, fx_cache
         )
-        current_value = quantity * converted_price
-        market_total += current_value
 
         if price_at and (as_of is None or price_at > as_of):
             as_of = price_at
@@ -225,66 +333,134 @@ def _build_portfolio_snapshot(
             prev_price_raw = price_now
             prev_at = price_at
 
-        prev_converted, _, _, _ = convert_to_brl(
-            float(prev_price_raw), asset.currency, fx_cache
+        prev_converted = convert_to_brl_fast(float(prev_price_raw), fx_rate)
+
+        records.append(
+            (
+                holding,
+                asset,
+                currency,
+                fx_rate,
+                float(price_now),
+                price_at,
+                float(prev_price_raw),
+                prev_at,
+            )
         )
-        previous_value = quantity * prev_converted
-        previous_total += previous_value
+        quantities.append(quantity)
+        avg_prices.append(avg_price)
+        prices_brl.append(converted_price)
+        prev_prices_brl.append(prev_converted)
+
+    # Aritmetica de todas as posicoes de uma vez
+    qty = np.asarray(quantities, dtype=float)
+    invested = qty * np.asarray(avg_prices, dtype=float)
+    current = qty * np.asarray(prices_brl, dtype=float)
+    previous = qty * np.asarray(prev_prices_brl, dtype=float)
+    pnl_abs = current - invested
+    day_change = current - previous
+    pnl_pct = np.divide(
+        pnl_abs * 100.0, invested, out=np.zeros_like(pnl_abs), where=invested > 0
+    )
+    day_change_pct = np.divide(
+        day_change * 100.0, previous, out=np.zeros_like(day_change), where=previous > 0
+    )
 
-        pnl_abs_item = current_value - invested_value
-        pnl_pct_item = (
-            (pnl_abs_item / invested_value * 100.0) if invested_value > 0 else 0.0
-        )
-        day_change_abs = current_value - previous_value
-        day_change_pct = (
-            (day_change_abs / previous_value * 100.0) if previous_value > 0 else 0.0
-        )
+    invested_total = float(invested.sum())
+    market_total = float(current.sum())
+    previous_total = float(previous.sum())
+    if market_total > 0:
+        weights = current / market_total * 100.0
+    else:
+        weights = np.zeros_like(current)
 
-        itens.append(
-            {
-                "holding_id": holding.id,
-                "asset_id": holding.asset_id,
-                "symbol": asset.symbol,
-                "name": asset.name,
-                "class": normalized_class,
-                "class_original": asset.class_,
-                "quantity": quantity,
-                "avg_price": avg_price,
-                "currency": currency,
-                "last_price": converted_price,
-                "last_price_original": float(price_now),
-                "fx_rate": fx_rate if currency != "BRL" else None,
-                "last_price_at": _compose_dt(price_at),
-                "prev_price": prev_converted,
-                "prev_price_original": float(prev_price_raw),
-                "prev_price_at": _compose_dt(prev_at),
-                "valor": current_value,
-                "valor_prev": previous_value,
-                "pct": 0.0,
-                "pnl_abs": pnl_abs_item,
-                "pnl_pct": pnl_pct_item,
-                "day_change_abs": day_change_abs,
-                "day_change_pct": day_change_pct,
-                "created_at": (
-                    holding.created_at.isoformat() if holding.created_at else None
-                ),
-                "updated_at": (
-                    holding.updated_at.isoformat() if holding.updated_at else None
-                ),
-                "purchase_date": (
-                    holding.purchase_date.isoformat() if holding.purchase_date else None
-                ),
-            }
-        )
+    computed = np.column_stack(
+        (current, previous, weights, pnl_abs, pnl_pct, day_change, day_change_pct)
+    ).tolist()
 
-    total = market_total
-    if total > 0:
-        for item in itens:
-            item["pct"] = round((item["valor"] / total) * 100.0, 2)
+    itens: List[dict] = [
+        {
+            "holding_id": holding.id,
+            "asset_id": holding.asset_id,
+            "symbol": asset.symbol,
+            "name": asset.name,
+            "class": normalize_class(asset.class_),
+            "class_original": asset.class_,
+            "quantity": quantity,
+            "avg_price": avg_price,
+            "currency": currency,
+            "last_price": price_brl,
+            "last_price_original": price_original,
+            "fx_rate": fx_rate if currency != "BRL" else None,
+            "last_price_at": price_at,
+            "prev_price": prev_brl,
+            "prev_price_original": prev_original,
+            "prev_price_at": prev_at,
+            "valor": valor,
+            "valor_prev": valor_prev,
+            # round() como antes: np.round diverge em fronteiras .xx5
+            "pct": round(pct, 2),
+            "pnl_abs": pnl_abs_item,
+            "pnl_pct": pnl_pct_item,
+            "day_change_abs": day_change_item,
+            "day_change_pct": day_change_pct_item,
+            "created_at": holding.created_at,
+            "updated_at": holding.updated_at,
+            "purchase_date": holding.purchase_date,
+        }
+        for (
+            holding,
+            asset,
+            currency,
+            fx_rate,
+            price_original,
+            price_at,
+            prev_original,
+            prev_at,
+        ), quantity, avg_price, price_brl, prev_brl, (
+            valor,
+            valor_prev,
+            pct,
+            pnl_abs_item,
+            pnl_pct_item,
+            day_change_item,
+            day_change_pct_item,
+        ) in zip(
+            records, quantities, avg_prices, prices_brl, prev_prices_brl, computed
+        )
+    ]
 
     return itens, invested_total, market_total, previous_total, fx_meta, as_of
 
 
+SUMMARY_ROUNDED_FIELDS = (
+    "pnl_abs",
+    "pnl_pct",
+    "day_change_abs",
+    "day_change_pct",
+    "valor",
+    "valor_prev",
+)
+
+
+def _round_item_fields(itens: List[dict]) -> List[dict]:
+    """
+    Arredonda os campos monetarios dos itens com round() (mesmo resultado de
+    antes; np.round diverge em fronteiras .xx5, p.ex. 1234.565).
+    """
+    for item in itens:
+        for field in SUMMARY_ROUNDED_FIELDS:
+            item[field] = round(item[field], 2)
+    return itens
+
+
+def _round6_rows(rows: List[tuple]) -> List[List[float]]:
+    """Arredonda (6 casas) uma tabela de percentuais em um unico np.round."""
+    if not rows:
+        return []
+    return np.round(np.array(rows, dtype=float), 6).tolist()
+
+
 def serialize_transaction(tx: Transaction) -> dict:
     asset = tx.asset
     executed_at = tx.executed_at
@@ -307,6 +483,20 @@ def serialize_transaction(tx: Transaction) -> dict:
     }
 
 
+def _encode_tx_cursor(tx: Transaction) -> str:
+    raw = f"{tx.executed_at.isoformat()}|{tx.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_tx_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        ts_raw, id_raw = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts_raw), int(id_raw)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=422, detail="Cursor invalido.")
+
+
 class TransactionUpdateRequest(BaseModel):
     quantity: Optional[float] = None
     price: Optional[float] = None
@@ -382,6 +572,18 @@ SERIES_RANGE_DELTAS = {
 }
 
 
+@lru_cache(maxsize=32)
+def _series_skeleton(
+    start_date: date, end_date: date
+) -> Tuple[Tuple[date, ...], Tuple[str, ...]]:
+    """Dias (e seus rotulos ISO) do intervalo; reaproveitado entre requisicoes."""
+    total_days = max((end_date - start_date).days, 0)
+    day_dates = tuple(
+        start_date + timedelta(days=offset) for offset in range(total_days + 1)
+    )
+    return day_dates, tuple(day.isoformat() for day in day_dates)
+
+
 def _resolve_range_start(
     range_key: str,
     earliest_date: Optional[date],
@@ -406,21 +608,37 @@ def _resolve_range_start(
 
 
 def _derive_portfolio_earliest_date(
+    db: Session,
     portfolio: Portfolio,
-    holdings: Iterable[Holding],
-    transactions: Iterable[Transaction],
 ) -> Optional[date]:
-    candidates: List[date] = []
-    for h in holdings:
-        if h.purchase_date:
-            candidates.append(h.purchase_date)
-        elif h.created_at:
-            candidates.append(h.created_at.date())
-
-    for tx in transactions:
-        if tx.executed_at:
-            candidates.append(tx.executed_at.date())
+    # Agrega os minimos no banco em vez de trazer todas as linhas para o Python
+    first_purchase, first_created, first_executed = db.execute(
+        select(
+            select(func.min(Holding.purchase_date))
+            .where(Holding.portfolio_id == portfolio.id)
+            .scalar_subquery(),
+            select(func.min(Holding.created_at))
+            .where(
+                Holding.portfolio_id == portfolio.id,
+                Holding.purchase_date.is_(None),
+            )
+            .scalar_subquery(),
+            select(func.min(Transaction.executed_at))
+            .where(
+                Transaction.portfolio_id == portfolio.id,
+                Transaction.status == "active",
+            )
+            .scalar_subquery(),
+        )
+    ).one()
 
+    candidates: List[date] = []
+    if first_purchase:
+        candidates.append(first_purchase)
+    if first_created:
+        candidates.append(first_created.date())
+    if first_executed:
+        candidates.append(first_executed.date())
     if portfolio.created_at:
         candidates.append(portfolio.created_at.date())
 
@@ -434,7 +652,7 @@ class RealizedPnlTracker:
         self.realized_total = 0.0
         self.realized_cost_basis = 0.0
 
-    def apply(self, tx: Transaction, *, count_realized: bool = True) -> None:
+    def apply(self, tx: Transaction | Row, *, count_realized: bool = True) -> None:
         asset_id = tx.asset_id
         if asset_id is None:
             return
@@ -483,21 +701,34 @@ def _generate_portfolio_timeseries(
     range_key: str,
 ) -> dict:
     today = date.today()
-    transactions = (
-        db.query(Transaction)
-        .filter(
+    # Tuplas leves (sem hidratar ORM); a data de execucao ja vem calculada do banco
+    transactions = db.execute(
+        select(
+            Transaction.asset_id,
+            Transaction.type,
+            Transaction.quantity,
+            Transaction.price,
+            Transaction.total,
+            Transaction.kind,
+            func.date(Transaction.executed_at, type_=Date).label("executed_on"),
+        )
+        .where(
             Transaction.portfolio_id == portfolio.id,
             Transaction.status == "active",
         )
         .order_by(Transaction.executed_at.asc(), Transaction.id.asc())
-        .all()
-    )
+    ).all()
 
-    earliest = _derive_portfolio_earliest_date(portfolio, holdings, transactions)
+    earliest = _derive_portfolio_earliest_date(db, portfolio)
     start_date = _resolve_range_start(range_key, earliest, today)
 
-    asset_ids = {tx.asset_id for tx in transactions if tx.asset_id is not None} | {
-        h.asset_id for h in holdings
+    # Ordem estavel: cada ativo ocupa uma coluna fixa nos estados diarios
+    asset_ids: List[int] = sorted(
+        {tx.asset_id for tx in transactions if tx.asset_id is not None}
+        | {h.asset_id for h in holdings}
+    )
+    asset_col: Dict[int, int] = {
+        asset_id: col for col, asset_id in enumerate(asset_ids)
     }
     if not asset_ids:
         return {
@@ -514,9 +745,9 @@ def _generate_portfolio_timeseries(
         if h.asset:
             asset_map[h.asset_id] = h.asset
 
-    missing_ids = asset_ids - set(asset_map.keys())
+    missing_ids = [asset_id for asset_id in asset_ids if asset_id not in asset_map]
     if missing_ids:
-        extra_assets = db.query(Asset).filter(Asset.id.in_(list(missing_ids))).all()
+        extra_assets = db.query(Asset).filter(Asset.id.in_(missing_ids)).all()
         for asset in extra_assets:
             asset_map[asset.id] = asset
 
@@ -538,8 +769,9 @@ def _generate_portfolio_timeseries(
     if asset_ids:
         rows = (
             db.query(AssetPrice)
+            .options(_PRICE_COLUMNS)
             .filter(
-                AssetPrice.asset_id.in_(list(asset_ids)),
+                AssetPrice.asset_id.in_(asset_ids),
                 AssetPrice.date >= start_date,
                 AssetPrice.date <= today,
             )
@@ -549,36 +781,24 @@ def _generate_portfolio_timeseries(
         for row in rows:
             prices_by_asset[row.asset_id].append(row)
 
-    previous_price_map: Dict[int, Optional[AssetPrice]] = {}
-    for asset_id in asset_ids:
-        prev_row = (
-            db.query(AssetPrice)
-            .filter(
-                AssetPrice.asset_id == asset_id,
-                AssetPrice.date < start_date,
-            )
-            .order_by(AssetPrice.date.desc())
-            .first()
-        )
-        if prev_row:
-            previous_price_map[asset_id] = prev_row
+    previous_closes = _latest_closes(db, asset_ids, before=start_date)
 
     pnl_tracker = RealizedPnlTracker()
     qty_state: Dict[int, float] = pnl_tracker.qty_state
-    for asset_id in asset_ids:
-        qty_state.setdefault(asset_id, 0.0)
-    price_state: Dict[int, Optional[float]] = {asset_id: None for asset_id in asset_ids}
-    price_pointers: Dict[int, int] = {asset_id: 0 for asset_id in asset_ids}
+    n_assets = len(asset_ids)
+    qty_cols: List[float] = [0.0] * n_assets
+    price_cols: List[Optional[float]] = [None] * n_assets
+    price_pointers: List[int] = [0] * n_assets
     invested_cumulative = 0.0
     realized_cumulative = 0.0
     fx_cache: Dict[str, tuple[float, Optional[datetime]]] = {}
 
     # Transa????es anteriores ao per??odo selecionado
-    tx_map: Dict[date, List[Tuple[Transaction, float, bool]]] = defaultdict(list)
+    tx_map: Dict[date, List[Tuple[Row, float, bool]]] = defaultdict(list)
     for tx in transactions:
-        if not tx.executed_at:
+        tx_date = tx.executed_on
+        if not tx_date:
             continue
-        tx_date = tx.executed_at.date()
         tx_type = (tx.type or "").lower()
         if tx_type not in {"buy", "sell"}:
             continue
@@ -600,74 +820,99 @@ def _generate_portfolio_timeseries(
         else:
             tx_map[tx_date].append((tx, delta_val, realized_flag))
 
-    for asset_id, prev_row in previous_price_map.items():
-        if prev_row is None:
-            continue
-        asset = asset_map.get(asset_id)
-        if not asset:
-            continue
-        converted_price, _, _, _ = convert_to_brl(
-            float(prev_row.close),
-            asset.currency,
-            fx_cache,
+    for asset_id, qty in qty_state.items():
+        col = asset_col.get(asset_id)
+        if col is not None:
+            qty_cols[col] = qty
+
+    # Uma taxa por coluna: o loop diario so multiplica preco * taxa
+    fx_cols: List[Optional[float]] = [
+        (
+            _fx_rate(asset_map[asset_id].currency, fx_cache)
+            if asset_id in asset_map
+            else None
+        )
+        for asset_id in asset_ids
+    ]
+    # Datas e fechamentos ja convertidos por coluna, para busca binaria no loop
+    row_dates: List[List[date]] = []
+    brl_closes: List[List[float]] = []
+    for asset_id, rate in zip(asset_ids, fx_cols):
+        asset_rows = prices_by_asset.get(asset_id, []) if rate is not None else []
+        row_dates.append([row.date for row in asset_rows])
+        brl_closes.append(
+            [convert_to_brl_fast(float(row.close), rate) for row in asset_rows]
         )
-        price_state[asset_id] = converted_price
 
-    total_days = (today - start_date).days
-    if total_days < 0:
-        total_days = 0
+    for asset_id, prev_close in previous_closes.items():
+        col = asset_col[asset_id]
+        rate = fx_cols[col]
+        if rate is None:
+            continue
+        price_cols[col] = convert_to_brl_fast(prev_close, rate)
 
-    series: List[dict] = []
-    for offset in range(total_days + 1):
-        current_date = start_date + timedelta(days=offset)
+    day_dates, day_labels = _series_skeleton(start_date, today)
+    n_days = len(day_dates)
+    market_values = np.zeros(n_days)
+    invested_values = np.zeros(n_days)
+    realized_values = np.zeros(n_days)
+    for offset, current_date in enumerate(day_dates):
 
         # Atualiza preços até a data atual
-        for asset_id in asset_ids:
-            asset = asset_map.get(asset_id)
-            if not asset:
-                continue
-            rows = prices_by_asset.get(asset_id, [])
-            pointer = price_pointers[asset_id]
-            while pointer < len(rows) and rows[pointer].date <= current_date:
-                converted_price, _, _, _ = convert_to_brl(
-                    float(rows[pointer].close),
-                    asset.currency,
-                    fx_cache,
-                )
-                price_state[asset_id] = converted_price
-                pointer += 1
-            price_pointers[asset_id] = pointer
+        for col in range(n_assets):
+            new_pointer = bisect_right(row_dates[col], current_date)
+            if new_pointer != price_pointers[col]:
+                price_cols[col] = brl_closes[col][new_pointer - 1]
+                price_pointers[col] = new_pointer
 
         # Aplica transa????es do dia
         if current_date in tx_map:
             for tx, delta_val, realized_flag in tx_map[current_date]:
                 invested_cumulative += delta_val
                 pnl_tracker.apply(tx, count_realized=realized_flag)
+                col = asset_col[tx.asset_id]
+                qty_cols[col] = qty_state.get(tx.asset_id, 0.0)
             realized_cumulative = pnl_tracker.realized_total
 
         market_value = 0.0
-
-        market_value = 0.0
-        for asset_id in asset_ids:
-            qty = qty_state.get(asset_id, 0.0)
-            price_brl = price_state.get(asset_id)
+        for qty, price_brl in zip(qty_cols, price_cols):
             if qty <= 0 or price_brl is None:
                 continue
             market_value += qty * price_brl
 
-        pnl_total = market_value - invested_cumulative
-        pnl_unrealized = pnl_total - realized_cumulative
-        series.append(
-            {
-                "date": current_date.isoformat(),
-                "market_value": round(market_value, 2),
-                "invested": round(invested_cumulative, 2),
-                "pnl": round(pnl_total, 2),
-                "pnl_total": round(pnl_total, 2),
-                "pnl_realized": round(realized_cumulative, 2),
-                "pnl_unrealized": round(pnl_unrealized, 2),
-            }
+        market_values[offset] = market_value
+        invested_values[offset] = invested_cumulative
+        realized_values[offset] = realized_cumulative
+
+    # PnL vetorizado; o arredondamento usa round() (np.round diverge em .xx5)
+    pnl_totals = market_values - invested_values
+    pnl_unrealized = pnl_totals - realized_values
+    rounded = [
+        [round(value, 2) for value in row]
+        for row in np.column_stack(
+            (
+                market_values,
+                invested_values,
+                pnl_totals,
+                realized_values,
+                pnl_unrealized,
+            )
+        ).tolist()
+    ]
+    series: List[dict] = [
+        {
+            "date": day,
+            "market_value": market_value,
+            "invested": invested,
+            "pnl": pnl_total,
+            "pnl_total": pnl_total,
+            "pnl_realized": realized,
+            "pnl_unrealized": unrealized,
+        }
+        for day, (market_value, invested, pnl_total, realized, unrealized) in zip(
+            day_labels, rounded
         )
+    ]
 
     return {
         "as_of": series[-1]["date"] if series else today.isoformat(),
@@ -754,21 +999,9 @@ def portfolio_summary(
     )
     dividends_ytd = 0.0
 
-    return {
-        "total": round(market_total, 2),
-        "invested_total": round(invested_total, 2),
-        "market_total": round(market_total, 2),
-        "pnl_abs": round(total_pnl_abs, 2),
-        "pnl_pct": round(pnl_pct, 2),
-        "pnl_unrealized_abs": round(unrealized_abs, 2),
-        "pnl_unrealized_pct": round(unrealized_pct, 2),
-        "pnl_realized_abs": round(realized_abs, 2),
-        "pnl_realized_pct": round(realized_pct, 2),
-        "day_change_abs": round(day_change_total, 2),
-        "day_change_pct": round(day_change_pct_total, 2),
-        "as_of": as_of.isoformat() if as_of else None,
-        "base_currency": "BRL",
-        "kpis": {
+    return ORJSONResponse(
+        {
+            "total": round(market_total, 2),
             "invested_total": round(invested_total, 2),
             "market_total": round(market_total, 2),
             "pnl_abs": round(total_pnl_abs, 2),
@@ -779,22 +1012,25 @@ def portfolio_summary(
             "pnl_realized_pct": round(realized_pct, 2),
             "day_change_abs": round(day_change_total, 2),
             "day_change_pct": round(day_change_pct_total, 2),
-            "dividends_ytd": round(dividends_ytd, 2),
-        },
-        "itens": [
-            {
-                **item,
-                "pnl_abs": round(item["pnl_abs"], 2),
-                "pnl_pct": round(item["pnl_pct"], 2),
-                "day_change_abs": round(item["day_change_abs"], 2),
-                "day_change_pct": round(item["day_change_pct"], 2),
-                "valor": round(item["valor"], 2),
-                "valor_prev": round(item["valor_prev"], 2),
-            }
-            for item in itens
-        ],
-        "fx_rates": fx_meta,
-    }
+            "as_of": as_of,
+            "base_currency": "BRL",
+            "kpis": {
+                "invested_total": round(invested_total, 2),
+                "market_total": round(market_total, 2),
+                "pnl_abs": round(total_pnl_abs, 2),
+                "pnl_pct": round(pnl_pct, 2),
+                "pnl_unrealized_abs": round(unrealized_abs, 2),
+                "pnl_unrealized_pct": round(unrealized_pct, 2),
+                "pnl_realized_abs": round(realized_abs, 2),
+                "pnl_realized_pct": round(realized_pct, 2),
+                "day_change_abs": round(day_change_total, 2),
+                "day_change_pct": round(day_change_pct_total, 2),
+                "dividends_ytd": round(dividends_ytd, 2),
+            },
+            "itens": _round_item_fields(itens),
+            "fx_rates": fx_meta,
+        }
+    )
 
 
 @router.get("/timeseries")
@@ -833,7 +1069,9 @@ def portfolio_timeseries(
         .all()
     )
 
-    return _generate_portfolio_timeseries(db, portfolio, holdings, range_key)
+    return ORJSONResponse(
+        _generate_portfolio_timeseries(db, portfolio, holdings, range_key)
+    )
 
 
 @router.get("/allocation")
@@ -876,17 +1114,19 @@ def portfolio_allocation(
     normalized_filter = normalize_class(class_filter) if class_filter else None
 
     if mode == "class":
-        buckets: Dict[str, float] = defaultdict(float)
+        buckets: Dict[str, List[float]] = defaultdict(list)
         for item in itens:
-            buckets[item["class"]] += item["valor"]
+            buckets[item["class"]].append(item["valor"])
 
+        # fsum evita deriva de arredondamento entre valores de magnitudes distintas
+        class_totals = {cls: math.fsum(values) for cls, values in buckets.items()}
         items_payload = [
             {
                 "class": cls,
                 "value": round(value, 2),
                 "weight_pct": round((value / market_total) * 100.0, 2),
             }
-            for cls, value in buckets.items()
+            for cls, value in class_totals.items()
         ]
         items_payload.sort(key=lambda x: x["value"], reverse=True)
         applied_filter = None
@@ -902,27 +1142,33 @@ def portfolio_allocation(
                 detail="Nenhum ativo encontrado para a classe informada.",
             )
 
-        payload = [
-            {
-                "holding_id": item["holding_id"],
-                "symbol": item["symbol"],
-                "name": item["name"],
-                "class": item["class"],
-                "value": round(item["valor"], 2),
-                "weight_pct": round((item["valor"] / market_total) * 100.0, 2),
-            }
-            for item in filtered_items
-        ]
-        payload.sort(key=lambda x: x["value"], reverse=True)
+        # Pesos calculados em lote sobre os valores brutos (arredondados so na
+        # saida); o corte de OUTROS vira uma mascara
+        values = np.array([item["valor"] for item in filtered_items], dtype=float)
+        weights = values / market_total * 100.0
+        order = np.argsort(-values, kind="stable")
 
         threshold = max(group_small, 0.0)
+        small = (
+            weights / 100.0 < threshold
+            if threshold > 0
+            else np.zeros(len(values), dtype=bool)
+        )
+        grouped_value = math.fsum(values[small].tolist())
+
         major: List[dict] = []
-        grouped_value = 0.0
-        for entry in payload:
-            if threshold > 0 and (entry["weight_pct"] / 100.0) < threshold:
-                grouped_value += entry["value"]
-            else:
-                major.append(entry)
+        for idx in order[~small[order]].tolist():
+            item = filtered_items[idx]
+            major.append(
+                {
+                    "holding_id": item["holding_id"],
+                    "symbol": item["symbol"],
+                    "name": item["name"],
+                    "class": item["class"],
+                    "value": round(float(values[idx]), 2),
+                    "weight_pct": round(float(weights[idx]), 2),
+                }
+            )
 
         if grouped_value > 0:
             major.append(
@@ -960,6 +1206,10 @@ def portfolio_transactions(
     order: str = Query("desc", pattern="^(asc|desc)$"),
     status: str = Query("active", pattern="^(active|voided|all)$"),
     kind: str = Query("all"),
+    cursor: Optional[str] = Query(
+        None,
+        description="Cursor retornado em next_cursor; quando informado, ignora offset.",
+    ),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -977,36 +1227,74 @@ def portfolio_transactions(
     if not portfolio:
         return {"items": [], "total": 0, "limit": limit, "offset": offset}
 
-    query = (
-        db.query(Transaction)
-        .options(joinedload(Transaction.asset))
-        .filter(Transaction.portfolio_id == portfolio.id)
-    )
+    preds = [Transaction.portfolio_id == portfolio.id]
 
     status = status.lower()
     if status != "all":
-        query = query.filter(Transaction.status == status)
+        preds.append(Transaction.status == status)
 
     if start:
         start_dt = datetime.combine(start, datetime.min.time())
-        query = query.filter(Transaction.executed_at >= start_dt)
+        preds.append(Transaction.executed_at >= start_dt)
     if end:
         end_dt = datetime.combine(end, datetime.max.time())
-        query = query.filter(Transaction.executed_at <= end_dt)
+        preds.append(Transaction.executed_at <= end_dt)
 
     kind = (kind or "all").lower()
     if kind != "all":
-        query = query.filter(Transaction.kind == kind)
-
-    total = query.count()
+        preds.append(Transaction.kind == kind)
 
     if order == "asc":
-        query = query.order_by(Transaction.executed_at.asc(), Transaction.id.asc())
+        ordering = (Transaction.executed_at.asc(), Transaction.id.asc())
+    else:
+        ordering = (Transaction.executed_at.desc(), Transaction.id.desc())
+
+    if cursor:
+        # Keyset: continua a partir de (executed_at, id) da ultima linha entregue
+        cur_ts, cur_id = _decode_tx_cursor(cursor)
+        keyset = tuple_(Transaction.executed_at, Transaction.id)
+        boundary = tuple_(cur_ts, cur_id)
+        page_preds = preds + [
+            keyset > boundary if order == "asc" else keyset < boundary
+        ]
+        rows: List[Transaction] = (
+            db.execute(
+                select(Transaction)
+                .options(joinedload(Transaction.asset))
+                .where(and_(*page_preds))
+                .order_by(*ordering)
+                .limit(limit)
+            )
+            .unique()
+            .scalars()
+            .all()
+        )
+        total = db.scalar(
+            select(func.count()).select_from(Transaction).where(and_(*preds))
+        )
     else:
-        query = query.order_by(Transaction.executed_at.desc(), Transaction.id.desc())
+        # COUNT(*) OVER () traz o total filtrado junto com a pagina, em uma so consulta
+        stmt = (
+            select(Transaction, func.count().over().label("total"))
+            .options(joinedload(Transaction.asset))
+            .where(and_(*preds))
+            .order_by(*ordering)
+            .limit(limit)
+            .offset(offset)
+        )
+        result = db.execute(stmt).unique().all()
+        rows = [tx for tx, _ in result]
+
+        if result:
+            total = result[0].total
+        else:
+            # Pagina vazia (ex.: offset alem do fim) nao carrega o total da janela
+            total = db.scalar(
+                select(func.count()).select_from(Transaction).where(and_(*preds))
+            )
 
-    rows = query.offset(offset).limit(limit).all()
     items = [serialize_transaction(tx) for tx in rows]
+    next_cursor = _encode_tx_cursor(rows[-1]) if len(rows) == limit else None
 
     return {
         "items": items,
@@ -1016,6 +1304,7 @@ def portfolio_transactions(
         "order": order,
         "status": status,
         "kind": kind,
+        "next_cursor": next_cursor,
     }
 
 
@@ -1074,9 +1363,11 @@ def update_transaction(
     tx.total = float(tx.price) * float(tx.quantity)
     tx.source = "manual"
 
+    # Serializa antes do commit: os valores em memoria ja sao os gravados e o
+    # commit expiraria o objeto, forcando um novo SELECT
+    payload = serialize_transaction(tx)
     db.commit()
-    db.refresh(tx)
-    return serialize_transaction(tx)
+    return payload
 
 
 @router.post("/transactions/{tx_id}/void")
@@ -1113,166 +1404,228 @@ def void_transaction(
     tx.status = "voided"
     tx.source = "manual"
 
+    payload = serialize_transaction(tx)
     db.commit()
-    db.refresh(tx)
-    return serialize_transaction(tx)
+    return payload
 
 
-@router.get("/rebalance")
-def portfolio_rebalance(
-    profile_override: Optional[str] = Query(
-        None,
-        description="Força um perfil específico (conservador|moderado|arrojado).",
-    ),
-    allow_sells: bool = Query(
-        True,
-        description="Permite sugerir vendas para financiar compras.",
-    ),
-    prefer_etfs: bool = Query(
-        False,
-        description="Quando possível, prioriza ETFs na alocação de compras.",
-    ),
-    min_trade_value: float = Query(
-        100.0,
-        ge=0.0,
-        description="Valor mínimo por ordem sugerida (em BRL).",
-    ),
-    max_turnover: float = Query(
-        0.25,
-        ge=0.0,
-        le=1.0,
-        description="Turnover máximo permitido (percentual do valor total).",
-    ),
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    rp, allocation, profile_source, rules_applied = _resolve_profile_context(
-        db, user.id, profile_override
-    )
+# Plano de rebalanceamento memoizado por parametros + carimbo das posicoes
+_REBALANCE_CACHE_LOCK = threading.Lock()
+_REBALANCE_CACHE_TTL = 60.0  # seconds
+_REBALANCE_CACHE_MAXSIZE = 256
+_REBALANCE_CACHE: Dict[tuple, Tuple[float, dict]] = {}
 
-    portfolio = (
-        db.query(Portfolio)
-        .filter(Portfolio.user_id == user.id)
-        .order_by(Portfolio.id.asc())
-        .first()
+
+def _holdings_stamp(db: Session, portfolio_id: int) -> tuple:
+    """
+    Assinatura linha a linha de tudo que entra no plano (posicoes, dados do ativo
+    e fechamento de fallback); agregados como SUM/MAX colidem, p.ex. quando o
+    /rebalance/apply troca N unidades entre ativos com data retroativa.
+    """
+    latest_close = (
+        select(AssetPrice.close)
+        .where(AssetPrice.asset_id == Asset.id)
+        .order_by(AssetPrice.date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(
+            Holding.id,
+            Holding.quantity,
+            Holding.avg_price,
+            Holding.updated_at,
+            Asset.id,
+            Asset.symbol,
+            Asset.name,
+            Asset.class_,
+            Asset.currency,
+            Asset.last_quote_price,
+            Asset.last_quote_at,
+            Asset.lot_size,
+            Asset.qty_step,
+            Asset.supports_fractional,
+            latest_close,
+        )
+        .join(Asset, Asset.id == Holding.asset_id)
+        .where(Holding.portfolio_id == portfolio_id)
+        .order_by(Holding.id)
+    )
+    return tuple(tuple(row) for row in rows)
+
+
+def _rebalance_cache_get(key: tuple) -> Optional[dict]:
+    now_ts = time.monotonic()
+    with _REBALANCE_CACHE_LOCK:
+        cached = _REBALANCE_CACHE.get(key)
+        if not cached:
+            return None
+        stored_at, plan = cached
+        if now_ts - stored_at > _REBALANCE_CACHE_TTL:
+            _REBALANCE_CACHE.pop(key, None)
+            return None
+        return plan
+
+
+def _rebalance_cache_store(key: tuple, plan: dict) -> None:
+    now_ts = time.monotonic()
+    with _REBALANCE_CACHE_LOCK:
+        if len(_REBALANCE_CACHE) >= _REBALANCE_CACHE_MAXSIZE:
+            expired = [
+                k
+                for k, (stored_at, _) in _REBALANCE_CACHE.items()
+                if now_ts - stored_at > _REBALANCE_CACHE_TTL
+            ]
+            for k in expired:
+                _REBALANCE_CACHE.pop(k, None)
+            if len(_REBALANCE_CACHE) >= _REBALANCE_CACHE_MAXSIZE:
+                oldest = min(_REBALANCE_CACHE, key=lambda k: _REBALANCE_CACHE[k][0])
+                _REBALANCE_CACHE.pop(oldest, None)
+        _REBALANCE_CACHE[key] = (now_ts, plan)
+
+
+def _load_rebalance_rows(db: Session, portfolio_id: int) -> List[Holding]:
+    # selectinload busca os ativos em um SELECT ... IN, sem duplicar linhas no join
+    return (
+        db.query(Holding)
+        .options(selectinload(Holding.asset))
+        .filter(Holding.portfolio_id == portfolio_id)
+        .all()
     )
 
-    options_payload = {
-        "allow_sells": allow_sells,
-        "prefer_etfs": prefer_etfs,
-        "min_trade_value": min_trade_value,
-        "max_turnover": max_turnover,
+
+def _empty_rebalance_plan(
+    allocation,
+    profile_source: str,
+    rules_applied: List[str],
+    note: str,
+    as_of: str,
+    options_payload: dict,
+) -> dict:
+    return {
+        "profile": allocation.profile,
+        "profile_source": profile_source,
+        "total_value": 0.0,
+        "total_value_after": 0.0,
+        "targets": allocation.weights,
+        "bands": allocation.bands,
+        "classes": {},
+        "suggestions": [],
+        "within_bands": True,
+        "turnover": 0.0,
+        "net_cash_flow": 0.0,
+        "rules_applied": rules_applied,
+        "notes": [note],
+        "as_of": as_of,
+        "options": options_payload,
     }
-    timestamp_iso = datetime.now(timezone.utc).isoformat()
 
-    if not portfolio:
-        return {
-            "profile": allocation.profile,
-            "profile_source": profile_source,
-            "total_value": 0.0,
-            "total_value_after": 0.0,
-            "targets": allocation.weights,
-            "bands": allocation.bands,
-            "classes": {},
-            "suggestions": [],
-            "within_bands": True,
-            "turnover": 0.0,
-            "net_cash_flow": 0.0,
-            "rules_applied": rules_applied,
-            "notes": ["Nenhum portfólio encontrado para o usuário."],
-            "as_of": timestamp_iso,
-            "options": options_payload,
-        }
 
-    rows = (
-        db.query(Holding)
-        .options(joinedload(Holding.asset))
-        .filter(Holding.portfolio_id == portfolio.id)
-        .all()
+def _holding_snapshot(asset: Asset, quantity: float, price: float) -> HoldingSnapshot:
+    return HoldingSnapshot(
+        symbol=asset.symbol,
+        name=asset.name or asset.symbol,
+        asset_class=normalize_asset_class(asset.symbol, asset.class_),
+        quantity=quantity,
+        price=price,
+        value=quantity * price,
+        lot_size=float(asset.lot_size or 1.0),
+        qty_step=float(asset.qty_step or 1.0),
+        supports_fractional=bool(
+            asset.supports_fractional if asset.supports_fractional is not None else True
+        ),
     )
 
-    if not rows:
-        return {
-            "profile": allocation.profile,
-            "profile_source": profile_source,
-            "total_value": 0.0,
-            "total_value_after": 0.0,
-            "targets": allocation.weights,
-            "bands": allocation.bands,
-            "classes": {},
-            "suggestions": [],
-            "within_bands": True,
-            "turnover": 0.0,
-            "net_cash_flow": 0.0,
-            "rules_applied": rules_applied,
-            "notes": ["Nenhuma posição cadastrada na carteira."],
-            "as_of": timestamp_iso,
-            "options": options_payload,
-        }
 
+def _snapshot_holdings(db: Session, rows: Iterable[Holding]) -> List[HoldingSnapshot]:
+    """Converte as posicoes para BRL; ignora as que nao tem valor positivo."""
+    rows = list(rows)
     fx_cache: Dict[str, tuple[float, Optional[datetime]]] = {}
     holdings: List[HoldingSnapshot] = []
-    total_value = 0.0
+    # Normaliza cada moeda uma vez e resolve as taxas antes do laco
+    currency_by_id = {
+        h.asset_id: normalize_currency_code(h.asset.currency) for h in rows
+    }
+    _prefetch_fx(currency_by_id.values(), fx_cache)
+    rate_by_currency = {
+        cur: _fx_rate(cur, fx_cache) for cur in set(currency_by_id.values())
+    }
+    # Fechamentos de fallback buscados de uma vez para quem esta sem cotacao
+    latest_closes = _latest_closes(
+        db, (h.asset_id for h in rows if h.asset.last_quote_price is None)
+    )
 
     for h in rows:
         asset = h.asset
-        normalized_class = normalize_asset_class(asset.symbol, asset.class_)
-
         if asset.last_quote_price is not None:
             raw_price = float(asset.last_quote_price)
         else:
-            last_price_row = (
-                db.query(AssetPrice)
-                .filter(AssetPrice.asset_id == h.asset_id)
-                .order_by(AssetPrice.date.desc())
-                .first()
-            )
-            raw_price = (
-                float(last_price_row.close) if last_price_row else float(h.avg_price)
-            )
+            raw_price = latest_closes.get(h.asset_id, float(h.avg_price))
 
-        converted_price, _, _, _ = convert_to_brl(raw_price, asset.currency, fx_cache)
-        value = float(h.quantity) * converted_price
-        if value <= 0:
+        converted_price = convert_to_brl_fast(
+            raw_price, rate_by_currency[currency_by_id[h.asset_id]]
+        )
+        snapshot = _holding_snapshot(asset, float(h.quantity), converted_price)
+        if snapshot.value <= 0:
             continue
+        holdings.append(snapshot)
 
-        holdings.append(
-            HoldingSnapshot(
-                symbol=asset.symbol,
-                name=asset.name or asset.symbol,
-                asset_class=normalized_class,
-                quantity=float(h.quantity),
-                price=converted_price,
-                value=value,
-                lot_size=float(asset.lot_size or 1.0),
-                qty_step=float(asset.qty_step or 1.0),
-                supports_fractional=bool(
-                    asset.supports_fractional
-                    if asset.supports_fractional is not None
-                    else True
-                ),
-            )
+    return holdings
+
+
+def _build_plan(
+    db: Session,
+    rows: Iterable[Holding],
+    profile_context: tuple,
+    **plan_options,
+) -> dict:
+    """Monta o plano de rebalanceamento a partir das posicoes ja carregadas."""
+    rows = list(rows)
+    if not rows:
+        _, allocation, profile_source, rules_applied = profile_context
+        return _empty_rebalance_plan(
+            allocation,
+            profile_source,
+            rules_applied,
+            "Nenhuma posição cadastrada na carteira.",
+            datetime.now(timezone.utc).isoformat(),
+            plan_options,
         )
-        total_value += value
+    return _compute_rebalance(
+        _snapshot_holdings(db, rows), profile_context, **plan_options
+    )
+
+
+def _compute_rebalance(
+    holdings: List[HoldingSnapshot],
+    profile_context: tuple,
+    *,
+    allow_sells: bool,
+    prefer_etfs: bool,
+    min_trade_value: float,
+    max_turnover: float,
+) -> dict:
+    """Executa o rebalanceamento sobre snapshots em memoria, sem acessar o banco."""
+    rp, allocation, profile_source, rules_applied = profile_context
+    options_payload = {
+        "allow_sells": allow_sells,
+        "prefer_etfs": prefer_etfs,
+        "min_trade_value": min_trade_value,
+        "max_turnover": max_turnover,
+    }
+    timestamp_iso = datetime.now(timezone.utc).isoformat()
+    # Soma compensada: os pesos do plano dependem deste total
+    total_value = math.fsum(h.value for h in holdings)
 
     if total_value <= 0 or not holdings:
-        return {
-            "profile": allocation.profile,
-            "profile_source": profile_source,
-            "total_value": 0.0,
-            "total_value_after": 0.0,
-            "targets": allocation.weights,
-            "bands": allocation.bands,
-            "classes": {},
-            "suggestions": [],
-            "within_bands": True,
-            "turnover": 0.0,
-            "net_cash_flow": 0.0,
-            "rules_applied": rules_applied,
-            "notes": ["Não há valores positivos para rebalancear."],
-            "as_of": timestamp_iso,
-            "options": options_payload,
-        }
+        return _empty_rebalance_plan(
+            allocation,
+            profile_source,
+            rules_applied,
+            "Não há valores positivos para rebalancear.",
+            timestamp_iso,
+            options_payload,
+        )
 
     options = RebalanceOptions(
         allow_sells=allow_sells,
@@ -1285,21 +1638,47 @@ def portfolio_rebalance(
         holdings, allocation.weights, allocation.bands, options
     )
 
+    summaries = list(result.class_summaries.items())
+    class_pcts = _round6_rows(
+        [
+            (
+                summary.current_pct,
+                summary.target_pct,
+                summary.floor_pct,
+                summary.ceiling_pct,
+                summary.post_pct,
+                summary.post_pct - summary.current_pct,
+            )
+            for _, summary in summaries
+        ]
+    )
     class_payload: Dict[str, dict] = {}
-    for cls, summary in result.class_summaries.items():
+    for (cls, summary), pcts in zip(summaries, class_pcts):
+        current_pct, target_pct, floor_pct, ceiling_pct, post_pct, delta_pct = pcts
         class_payload[cls] = {
-            "label": CLASS_LABELS.get(cls, cls.title()),
+            "label": class_label(cls),
             "current_value": summary.current_value,
-            "current_pct": round(summary.current_pct, 6),
-            "target_pct": round(summary.target_pct, 6),
-            "floor_pct": round(summary.floor_pct, 6),
-            "ceiling_pct": round(summary.ceiling_pct, 6),
+            "current_pct": current_pct,
+            "target_pct": target_pct,
+            "floor_pct": floor_pct,
+            "ceiling_pct": ceiling_pct,
             "delta_value": summary.delta_value,
             "post_value": summary.post_value,
-            "post_pct": round(summary.post_pct, 6),
-            "delta_pct": round(summary.post_pct - summary.current_pct, 6),
+            "post_pct": post_pct,
+            "delta_pct": delta_pct,
         }
 
+    suggestion_weights = _round6_rows(
+        [
+            (
+                s.weight_before,
+                s.weight_after,
+                s.class_weight_before,
+                s.class_weight_after,
+            )
+            for s in result.suggestions
+        ]
+    )
     suggestions_payload = [
         {
             "symbol": s.symbol,
@@ -1308,13 +1687,13 @@ def portfolio_rebalance(
             "quantity": s.quantity,
             "value": s.value,
             "price_ref": s.price_ref,
-            "weight_before": round(s.weight_before, 6),
-            "weight_after": round(s.weight_after, 6),
-            "class_weight_before": round(s.class_weight_before, 6),
-            "class_weight_after": round(s.class_weight_after, 6),
+            "weight_before": weights[0],
+            "weight_after": weights[1],
+            "class_weight_before": weights[2],
+            "class_weight_after": weights[3],
             "rationale": s.rationale,
         }
-        for s in result.suggestions
+        for s, weights in zip(result.suggestions, suggestion_weights)
     ]
 
     total_after = total_value + result.net_cash_flow
@@ -1322,21 +1701,11 @@ def portfolio_rebalance(
     if not notes and not suggestions_payload:
         notes.append("Carteira já dentro das bandas definidas.")
 
-    candidates_payload: Dict[str, List[dict]] = {}
-    for cls in result.missing_buy_classes:
-        suggestions = CLASS_CANDIDATES.get(cls)
-        if not suggestions:
-            continue
-        class_label = CLASS_LABELS.get(cls, cls.title())
-        candidates_payload[cls] = [
-            {
-                "symbol": item["symbol"],
-                "description": item.get("description"),
-                "class": cls,
-                "class_label": class_label,
-            }
-            for item in suggestions
-        ]
+    candidates_payload: Dict[str, List[dict]] = {
+        cls: list(CLASS_CANDIDATES_PAYLOAD[cls])
+        for cls in result.missing_buy_classes
+        if CLASS_CANDIDATES_PAYLOAD.get(cls)
+    }
 
     return {
         "profile": allocation.profile,
@@ -1359,6 +1728,86 @@ def portfolio_rebalance(
     }
 
 
+@router.get("/rebalance")
+def portfolio_rebalance(
+    profile_override: Optional[str] = Query(
+        None,
+        description="Força um perfil específico (conservador|moderado|arrojado).",
+    ),
+    allow_sells: bool = Query(
+        True,
+        description="Permite sugerir vendas para financiar compras.",
+    ),
+    prefer_etfs: bool = Query(
+        False,
+        description="Quando possível, prioriza ETFs na alocação de compras.",
+    ),
+    min_trade_value: float = Query(
+        100.0,
+        ge=0.0,
+        description="Valor mínimo por ordem sugerida (em BRL).",
+    ),
+    max_turnover: float = Query(
+        0.25,
+        ge=0.0,
+        le=1.0,
+        description="Turnover máximo permitido (percentual do valor total).",
+    ),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    profile_context = _resolve_profile_context(db, user.id, profile_override)
+
+    portfolio = (
+        db.query(Portfolio)
+        .filter(Portfolio.user_id == user.id)
+        .order_by(Portfolio.id.asc())
+        .first()
+    )
+    if not portfolio:
+        plan = _build_plan(
+            db,
+            [],
+            profile_context,
+            allow_sells=allow_sells,
+            prefer_etfs=prefer_etfs,
+            min_trade_value=min_trade_value,
+            max_turnover=max_turnover,
+        )
+        plan["notes"] = ["Nenhum portfólio encontrado para o usuário."]
+        return plan
+
+    rp, allocation, profile_source, rules_applied = profile_context
+    cache_key = (
+        user.id,
+        portfolio.id,
+        allocation.profile,
+        profile_source,
+        rp.score if rp else None,
+        tuple(rules_applied),
+        allow_sells,
+        prefer_etfs,
+        min_trade_value,
+        max_turnover,
+        _holdings_stamp(db, portfolio.id),
+    )
+    cached = _rebalance_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    plan = _build_plan(
+        db,
+        _load_rebalance_rows(db, portfolio.id),
+        profile_context,
+        allow_sells=allow_sells,
+        prefer_etfs=prefer_etfs,
+        min_trade_value=min_trade_value,
+        max_turnover=max_turnover,
+    )
+    _rebalance_cache_store(cache_key, plan)
+    return plan
+
+
 @router.post("/rebalance/apply")
 def portfolio_rebalance_apply(
     body: RebalanceApplyRequest,
@@ -1380,15 +1829,16 @@ def portfolio_rebalance_apply(
         )
 
     options = body.options
-    current_plan = portfolio_rebalance(
-        profile_override=options.profile_override,
-        allow_sells=options.allow_sells,
-        prefer_etfs=options.prefer_etfs,
-        min_trade_value=options.min_trade_value,
-        max_turnover=options.max_turnover,
-        db=db,
-        user=user,
-    )
+    profile_context = _resolve_profile_context(db, user.id, options.profile_override)
+    plan_options = {
+        "allow_sells": options.allow_sells,
+        "prefer_etfs": options.prefer_etfs,
+        "min_trade_value": options.min_trade_value,
+        "max_turnover": options.max_turnover,
+    }
+    rows = _load_rebalance_rows(db, portfolio.id)
+    snapshots = _snapshot_holdings(db, rows)
+    current_plan = _compute_rebalance(snapshots, profile_context, **plan_options)
 
     plan_suggestions = current_plan.get("suggestions") or []
     if not plan_suggestions:
@@ -1433,18 +1883,27 @@ def portfolio_rebalance_apply(
             status_code=409, detail="Já existe uma aplicação para este request_id."
         )
 
-    rows = (
-        db.query(Holding)
-        .options(joinedload(Holding.asset))
-        .filter(Holding.portfolio_id == portfolio.id)
-        .all()
-    )
-    holdings_by_symbol = {row.asset.symbol.upper(): row for row in rows if row.asset}
-    assets_by_symbol = {
-        row.asset.symbol.upper(): row.asset for row in rows if row.asset
-    }
+    # Uma unica passada mantem os dois indices coerentes
+    holdings_by_symbol: Dict[str, Holding] = {}
+    assets_by_symbol: Dict[str, Asset] = {}
+    for row in rows:
+        asset = row.asset
+        if not asset:
+            continue
+        symbol = asset.symbol.upper()
+        holdings_by_symbol[symbol] = row
+        assets_by_symbol[symbol] = asset
+    # Ativos sugeridos fora da carteira resolvidos num unico IN, nao um por item
+    unknown = {item["symbol"].upper() for item in to_apply} - assets_by_symbol.keys()
+    if unknown:
+        assets_by_symbol.update(
+            (asset.symbol.upper(), asset)
+            for asset in db.query(Asset).filter(Asset.symbol.in_(unknown))
+        )
+    snapshots_by_symbol = {snap.symbol.upper(): snap for snap in snapshots}
 
     applied_records: List[dict] = []
+    tx_rows: List[dict] = []
     base_date = body.execution_date or datetime.now(timezone.utc).date()
     execution_dt = datetime.combine(base_date, datetime.min.time(), tzinfo=timezone.utc)
     today_utc = base_date
@@ -1463,17 +1922,10 @@ def portfolio_rebalance_apply(
 
         holding = holdings_by_symbol.get(symbol)
         asset = assets_by_symbol.get(symbol)
-        if not asset and holding and holding.asset:
-            asset = holding.asset
-            assets_by_symbol[symbol] = asset
-
         if not asset:
-            asset = db.query(Asset).filter(Asset.symbol == symbol).first()
-            if not asset:
-                raise HTTPException(
-                    status_code=404, detail=f"Ativo {symbol} não encontrado."
-                )
-            assets_by_symbol[symbol] = asset
+            raise HTTPException(
+                status_code=404, detail=f"Ativo {symbol} não encontrado."
+            )
 
         if action == "comprar":
             if not holding:
@@ -1494,6 +1946,13 @@ def portfolio_rebalance_apply(
             holding.quantity = new_qty
             holding.avg_price = total_cost / new_qty if new_qty > 0 else price
             holding.updated_at = now.replace(tzinfo=None)
+
+            snapshot = snapshots_by_symbol.get(symbol)
+            if snapshot:
+                snapshot.quantity += qty
+                snapshot.value = snapshot.quantity * snapshot.price
+            else:
+                snapshots_by_symbol[symbol] = _holding_snapshot(asset, qty, price)
         else:
             if not holding:
                 raise HTTPException(
@@ -1514,8 +1973,15 @@ def portfolio_rebalance_apply(
                 holding.quantity = new_qty
                 holding.updated_at = now.replace(tzinfo=None)
 
-        record_transaction(
-            db,
+            snapshot = snapshots_by_symbol.get(symbol)
+            if snapshot:
+                if new_qty <= EPS:
+                    snapshots_by_symbol.pop(symbol)
+                else:
+                    snapshot.quantity = new_qty
+                    snapshot.value = new_qty * snapshot.price
+
+        tx_row = transaction_row(
             portfolio.id,
             asset.id,
             "buy" if action == "comprar" else "sell",
@@ -1526,20 +1992,19 @@ def portfolio_rebalance_apply(
             source="rebalance",
             note=request_marker,
         )
+        if tx_row is not None:
+            tx_rows.append(tx_row)
         applied_records.append(
             {"symbol": symbol, "action": action, "quantity": qty, "price": price}
         )
 
+    # Transacoes do lote gravadas em um unico INSERT multi-linha
+    record_transactions(db, tx_rows)
     db.commit()
 
-    updated_plan = portfolio_rebalance(
-        profile_override=options.profile_override,
-        allow_sells=options.allow_sells,
-        prefer_etfs=options.prefer_etfs,
-        min_trade_value=options.min_trade_value,
-        max_turnover=options.max_turnover,
-        db=db,
-        user=user,
+    # Plano atualizado sai dos snapshots ajustados em memoria, sem nova consulta
+    updated_plan = _compute_rebalance(
+        list(snapshots_by_symbol.values()), profile_context, **plan_options
     )
 
     return {
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import io
 from datetime import datetime
 from datetime import date as date_type
 from typing import Iterable, Dict, Tuple
@@ -7,45 +8,149 @@ from decimal import Decimal
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, condecimal, field_validator
-from sqlalchemy import and_
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
+from app.db.base import get_db, on_conflict_insert
 from app.db.models import Asset, AssetPrice
+from app.responses import ORJSONResponse
 from app.routes.auth import get_current_user, User  # type: ignore
 from app.services.fx import FxRateNotFoundError, get_fx_rate
-from app.services.quotes import QuoteNotFoundError, refresh_asset_quote
+from app.services.quotes import QuoteNotFoundError, refresh_asset_quotes
 from app.services.currency import normalize_currency_code
 
 router = APIRouter(prefix="/prices", tags=["prices"])
 
+PRICE_UPSERT_CHUNK = 1000
+PRICE_COPY_THRESHOLD = 5000
 
-def get_or_create_asset(db: Session, symbol: str) -> Asset:
-    s = symbol.strip().upper()
-    a = db.query(Asset).filter(Asset.symbol == s).first()
-    if a:
-        return a
-    a = Asset(symbol=s, name=s, class_="acao", currency="BRL")
-    db.add(a)
-    db.commit()
-    db.refresh(a)
-    return a
 
+def get_or_create_assets(db: Session, symbols: Iterable[str]) -> dict[str, Asset]:
+    """
+    Busca ou cria ativos em lote: um SELECT IN para os existentes e um
+    unico INSERT ... ON CONFLICT DO NOTHING RETURNING para os que faltam.
+    """
+    wanted = {s.strip().upper() for s in symbols}
+    assets = _load_assets_by_symbol(db, wanted)
+    missing = sorted(wanted - assets.keys())
+    if not missing:
+        return assets
 
-def upsert_price_row(
-    db: Session, asset_id: int, d: date_type, close_val: float
-) -> AssetPrice:
-    p = (
-        db.query(AssetPrice)
-        .filter(and_(AssetPrice.asset_id == asset_id, AssetPrice.date == d))
-        .first()
-    )
-    if p:
-        p.close = close_val
+    values = [
+        {"symbol": s, "name": s, "class_": "acao", "currency": "BRL"} for s in missing
+    ]
+    dialect_insert = _price_insert(db)
+    if dialect_insert is None:
+        created = [Asset(**row) for row in values]
+        db.add_all(created)
+        db.flush()
     else:
-        p = AssetPrice(asset_id=asset_id, date=d, close=close_val)
-        db.add(p)
-    return p
+        stmt = (
+            dialect_insert(Asset)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=[Asset.symbol])
+            .returning(Asset)
+        )
+        created = db.scalars(stmt).all()
+    assets.update((a.symbol, a) for a in created)
+
+    # Simbolos inseridos por outra transacao entre o SELECT e o INSERT
+    raced = wanted - assets.keys()
+    if raced:
+        assets.update(_load_assets_by_symbol(db, raced))
+    return assets
+
+
+def _price_insert(db: Session):
+    """Retorna o insert com suporte a ON CONFLICT do dialeto, se houver."""
+    return on_conflict_insert(db)
+
+
+def _copy_upsert_prices(db: Session, rows: Iterable[dict]) -> None:
+    """
+    Carga grande no PostgreSQL: COPY para uma tabela temporaria e um unico
+    INSERT ... SELECT ... ON CONFLICT a partir dela.
+    """
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(f"{row['asset_id']}\t{row['date'].isoformat()}\t{row['close']!r}\n")
+    buf.seek(0)
+
+    raw = db.connection().connection  # conexao DBAPI (psycopg2)
+    with raw.cursor() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE _px_stage "
+            "(asset_id integer, date date, close double precision) ON COMMIT DROP"
+        )
+        cur.copy_expert("COPY _px_stage (asset_id, date, close) FROM STDIN", buf)
+        cur.execute(
+            "INSERT INTO asset_prices (asset_id, date, close) "
+            "SELECT asset_id, date, close FROM _px_stage "
+            "ON CONFLICT (asset_id, date) DO UPDATE SET close = EXCLUDED.close"
+        )
+        cur.execute("DROP TABLE _px_stage")
+
+
+def _preload_upsert_prices(db: Session, rows: list[dict]) -> None:
+    """
+    Caminho sem ON CONFLICT: busca as chaves existentes em um unico SELECT
+    (asset_id, date) IN (...) e grava com UPDATE/INSERT em lote (executemany),
+    sem hidratar objetos AssetPrice.
+    """
+    keys = [(row["asset_id"], row["date"]) for row in rows]
+    id_by_key = {}
+    for start in range(0, len(keys), PRICE_UPSERT_CHUNK):
+        chunk = keys[start : start + PRICE_UPSERT_CHUNK]
+        existing = db.execute(
+            select(AssetPrice.id, AssetPrice.asset_id, AssetPrice.date).where(
+                tuple_(AssetPrice.asset_id, AssetPrice.date).in_(chunk)
+            )
+        )
+        id_by_key.update(((asset_id, d), pk) for pk, asset_id, d in existing)
+
+    updates, inserts = [], []
+    for key, row in zip(keys, rows):
+        pk = id_by_key.get(key)
+        if pk is not None:
+            updates.append({"id": pk, "close": row["close"]})
+        else:
+            inserts.append(row)
+    if updates:
+        db.execute(update(AssetPrice), updates)
+    if inserts:
+        db.execute(insert(AssetPrice), inserts)
+
+
+def upsert_price_rows(db: Session, rows: list[dict]) -> None:
+    """
+    Grava fechamentos (asset_id, date, close) com INSERT ... ON CONFLICT, em lotes
+    de ate PRICE_UPSERT_CHUNK linhas (limite de parametros por statement).
+    No PostgreSQL, cargas a partir de PRICE_COPY_THRESHOLD linhas usam COPY.
+    Linhas repetidas para o mesmo (asset_id, date) mantem o ultimo valor.
+    """
+    deduped = list({(row["asset_id"], row["date"]): row for row in rows}.values())
+    if not deduped:
+        return
+
+    dialect_insert = _price_insert(db)
+    if dialect_insert is None:
+        _preload_upsert_prices(db, deduped)
+        return
+
+    if dialect_insert is pg_insert and len(deduped) >= PRICE_COPY_THRESHOLD:
+        _copy_upsert_prices(db, deduped)
+        return
+
+    for start in range(0, len(deduped), PRICE_UPSERT_CHUNK):
+        stmt = dialect_insert(AssetPrice).values(
+            deduped[start : start + PRICE_UPSERT_CHUNK]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AssetPrice.asset_id, AssetPrice.date],
+            set_={"close": stmt.excluded.close},
+        )
+        db.execute(stmt)
 
 
 class PriceUpsert(BaseModel):
@@ -58,24 +163,50 @@ class PriceUpsert(BaseModel):
         return value.strip().upper()
 
 
-@router.post("/upsert", status_code=201)
-def upsert_price(body: PriceUpsert, db: Session = Depends(get_db)):
+def _parse_price_date(raw: str) -> date_type:
+    # fromisoformat (C) e bem mais rapido que strptime, mas desde o 3.11 tambem
+    # aceita formatos compactos/semana ISO; exige o layout YYYY-MM-DD antes.
+    if len(raw) == 10 and raw[4] == "-" and raw[7] == "-":
+        try:
+            return date_type.fromisoformat(raw)
+        except ValueError:
+            pass
+    # Caminho lento: strptime segue aceitando datas sem zero a esquerda (2024-1-2)
     try:
-        d: date_type = datetime.strptime(body.date, "%Y-%m-%d").date()
+        return datetime.strptime(raw, "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(status_code=422, detail="Data invalida. Use YYYY-MM-DD.")
 
-    asset = get_or_create_asset(db, body.symbol)
-    price = upsert_price_row(db, asset.id, d, float(body.close))
+
+@router.post("/upsert", status_code=201)
+def upsert_price(body: PriceUpsert, db: Session = Depends(get_db)):
+    d = _parse_price_date(body.date)
+    asset = get_or_create_assets(db, [body.symbol])[body.symbol]
+    close_val = float(body.close)
+    upsert_price_rows(db, [{"asset_id": asset.id, "date": d, "close": close_val}])
     db.commit()
     return {
         "asset_id": asset.id,
         "symbol": asset.symbol,
         "date": str(d),
-        "close": float(price.close),
+        "close": close_val,
     }
 
 
+@router.post("/bulk-upsert", status_code=201)
+def bulk_upsert_prices(body: list[PriceUpsert], db: Session = Depends(get_db)):
+    parsed = [(item.symbol, _parse_price_date(item.date), item.close) for item in body]
+    assets = get_or_create_assets(db, {symbol for symbol, _, _ in parsed})
+    rows = [
+        {"asset_id": assets[symbol].id, "date": d, "close": float(close)}
+        for symbol, d, close in parsed
+    ]
+
+    upsert_price_rows(db, rows)
+    db.commit()
+    return {"upserted": len({(row["asset_id"], row["date"]) for row in rows})}
+
+
 class QuoteRefreshRequest(BaseModel):
     symbols: list[str]
     force: bool = False
@@ -88,21 +219,46 @@ class QuoteRefreshRequest(BaseModel):
 
 
 def _load_assets_by_symbol(db: Session, symbols: Iterable[str]) -> dict[str, Asset]:
-    records = (
-        db.query(Asset).filter(Asset.symbol.in_([s.upper() for s in symbols])).all()
-    )
-    return {asset.symbol.upper(): asset for asset in records}
+    # Simbolos ja chegam em caixa alta (validator) e sao gravados assim no banco
+    records = db.query(Asset).filter(Asset.symbol.in_(set(symbols))).all()
+    return {asset.symbol: asset for asset in records}
+
+
+def _fetch_fx_to_brl(currency: str) -> Tuple[float, datetime | None]:
+    try:
+        return get_fx_rate(currency, "BRL")
+    except FxRateNotFoundError:  # pragma: no cover
+        return 1.0, None
+
+
+def _preload_fx(
+    assets: Iterable[Asset],
+) -> Tuple[Dict[int, str], Dict[str, Tuple[float, datetime]]]:
+    """Normaliza as moedas uma unica vez e busca cada taxa necessaria so uma vez."""
+    assets = list(assets)
+    currency_by_id = {
+        a.id: normalize_currency_code(a.currency, a.symbol) for a in assets
+    }
+    needed = {
+        currency_by_id[a.id]
+        for a in assets
+        if a.last_quote_price is not None and currency_by_id[a.id] != "BRL"
+    }
+    fx_cache = {f"{cur}:BRL": _fetch_fx_to_brl(cur) for cur in needed}
+    return currency_by_id, fx_cache
 
 
 def _serialize_quote(
     asset: Asset,
     fx_cache: Dict[str, Tuple[float, datetime]] | None = None,
+    currency: str | None = None,
 ) -> dict:
-    fx_cache = fx_cache or {}
+    if fx_cache is None:
+        fx_cache = {}
     price_original = (
         float(asset.last_quote_price) if asset.last_quote_price is not None else None
     )
-    currency = normalize_currency_code(asset.currency, asset.symbol)
+    currency = currency or normalize_currency_code(asset.currency, asset.symbol)
 
     converted_price = price_original
     retrieved_at = asset.last_quote_at.isoformat() if asset.last_quote_at else None
@@ -112,10 +268,7 @@ def _serialize_quote(
         if cache_key in fx_cache:
             rate, fx_ts = fx_cache[cache_key]
         else:
-            try:
-                rate, fx_ts = get_fx_rate(currency, "BRL")
-            except FxRateNotFoundError:  # pragma: no cover
-                rate, fx_ts = 1.0, None
+            rate, fx_ts = _fetch_fx_to_brl(currency)
             fx_cache[cache_key] = (rate, fx_ts)
         converted_price = price_original * rate
         if fx_ts and not retrieved_at:
@@ -129,6 +282,17 @@ def _serialize_quote(
     }
 
 
+def _refresh_or_404(db: Session, assets: Iterable[Asset], force: bool) -> bool:
+    # Busca as cotacoes em paralelo; a gravacao segue na sessao da requisicao
+    try:
+        return refresh_asset_quotes(db, assets, force=force)
+    except QuoteNotFoundError as exc:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Cotacao nao encontrada para {exc}",
+        ) from exc
+
+
 @router.post("/refresh")
 def refresh_quotes(
     body: QuoteRefreshRequest,
@@ -139,33 +303,23 @@ def refresh_quotes(
         return {"quotes": {}}
 
     symbol_map = _load_assets_by_symbol(db, body.symbols)
-    missing = [s for s in body.symbols if s.upper() not in symbol_map]
+    missing = [s for s in body.symbols if s not in symbol_map]
     if missing:
         raise HTTPException(
             status_code=404,
             detail=f"Ativos nao encontrados: {', '.join(missing)}",
         )
 
-    refreshed_any = False
-    for asset in symbol_map.values():
-        try:
-            refreshed = refresh_asset_quote(db, asset, force=body.force)
-        except QuoteNotFoundError as exc:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Cotacao nao encontrada para {asset.symbol}",
-            ) from exc
-        refreshed_any = refreshed_any or refreshed
-
-    fx_cache: Dict[str, Tuple[float, datetime]] = {}
+    refreshed_any = _refresh_or_404(db, symbol_map.values(), body.force)
 
     if refreshed_any:
         db.commit()
     else:
         db.flush()
 
+    currency_by_id, fx_cache = _preload_fx(symbol_map.values())
     quotes = {
-        symbol: _serialize_quote(asset, fx_cache)
+        symbol: _serialize_quote(asset, fx_cache, currency_by_id[asset.id])
         for symbol, asset in symbol_map.items()
     }
     return {"quotes": quotes}
@@ -180,29 +334,17 @@ def refresh_all_quotes(
     if not body.symbols:
         return {"quotes": {}}
 
-    assets: dict[str, Asset] = {}
-    for symbol in body.symbols:
-        assets[symbol.upper()] = get_or_create_asset(db, symbol)
+    by_symbol = get_or_create_assets(db, body.symbols)
+    assets = {symbol: by_symbol[symbol] for symbol in body.symbols}
 
-    refreshed_any = False
-    for asset in assets.values():
-        try:
-            refreshed = refresh_asset_quote(db, asset, force=body.force)
-        except QuoteNotFoundError as exc:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Cotacao nao encontrada para {asset.symbol}",
-            ) from exc
-        refreshed_any = refreshed_any or refreshed
-
-    fx_cache: Dict[str, Tuple[float, datetime]] = {}
-
-    if refreshed_any:
-        db.commit()
+    _refresh_or_404(db, assets.values(), body.force)
+    # Persiste cotacoes atualizadas e ativos criados pelo lote
+    db.commit()
 
+    currency_by_id, fx_cache = _preload_fx(assets.values())
     return {
         "quotes": {
-            symbol: _serialize_quote(asset, fx_cache)
+            symbol: _serialize_quote(asset, fx_cache, currency_by_id[asset.id])
             for symbol, asset in assets.items()
         }
     }
@@ -242,23 +384,28 @@ def fx_rate(
 @router.get("/history/{symbol}")
 def price_history(symbol: str, db: Session = Depends(get_db)):
     s = symbol.strip().upper()
-    asset = db.query(Asset).filter(Asset.symbol == s).first()
-    if not asset:
-        raise HTTPException(status_code=404, detail="Asset nao encontrado")
-
-    rows = (
-        db.query(AssetPrice)
-        .filter(AssetPrice.asset_id == asset.id)
+    # Uma unica ida ao banco: LEFT JOIN do ativo com a projecao (date, close), sem
+    # hidratar objetos ORM; o indice ix_asset_prices_asset_date atende o ORDER BY.
+    # Ativo sem precos volta como uma linha com date nula.
+    rows = db.execute(
+        select(AssetPrice.date, AssetPrice.close)
+        .select_from(Asset)
+        .outerjoin(AssetPrice, AssetPrice.asset_id == Asset.id)
+        .where(Asset.symbol == s)
         .order_by(AssetPrice.date.desc())
         .limit(60)
-        .all()
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Asset nao encontrado")
+    return ORJSONResponse(
+        [
+            {
+                "date": d,
+                "close": float(close),
+                "source": "yfinance",
+                "price_type": "close",
+            }
+            for d, close in rows
+            if d is not None
+        ]
     )
-    return [
-        {
-            "date": str(row.date),
-            "close": float(row.close),
-            "source": "yfinance",
-            "price_type": "close",
-        }
-        for row in rows
-    ]
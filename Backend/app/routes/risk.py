@@ -1,15 +1,17 @@
-import json
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, conint, field_validator
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
+from app.db.base import get_db, on_conflict_insert
 from app.db.models import RiskProfile
 from app.routes.auth import get_current_user, User  # type: ignore
-from app.services.allocations import get_allocation_profile
+from app.services.allocations import get_allocation_response
 from app.services.risk_profile import (
     QUESTIONNAIRE_VERSION,
     SCORE_VERSION,
@@ -21,6 +23,8 @@ from app.services.risk_profile import (
 
 router = APIRouter(prefix="/risk", tags=["risk"])
 
+_EXPECTED_QIDS = frozenset(get_question_ids())
+
 
 class RiskAssessmentRequest(BaseModel):
     answers: Dict[str, conint(ge=1, le=5)]
@@ -28,19 +32,15 @@ class RiskAssessmentRequest(BaseModel):
 
     @field_validator("answers")
     def validate_answers(cls, value: Dict[str, int]) -> Dict[str, int]:
-        expected = set(get_question_ids())
-        provided = set(value.keys())
-        missing = expected - provided
-        extra = provided - expected
+        provided = value.keys()
+        missing = _EXPECTED_QIDS - provided
+        extra = provided - _EXPECTED_QIDS
         if missing or extra:
             raise ValueError(
                 f"Respostas inválidas. Faltando: {sorted(missing)}. Desconhecidas: {sorted(extra)}"
             )
-        coerced = {k: int(v) for k, v in value.items()}
-        for key, v in coerced.items():
-            if v < 1 or v > 5:
-                raise ValueError(f"Resposta fora da escala (1-5) para '{key}'.")
-        return coerced
+        # Escala 1-5 e tipo inteiro ja garantidos por conint
+        return value
 
     @field_validator("restrictions", mode="before")
     def default_restrictions(cls, value):
@@ -58,58 +58,92 @@ class RiskAssessmentRequest(BaseModel):
         return dedup
 
 
+@lru_cache(maxsize=1)
+def _cached_questionnaire(version: str) -> Dict[str, object]:
+    # O questionario e imutavel por versao; a chave invalida o cache numa troca
+    return serialize_questionnaire()
+
+
 @router.get("/questions")
 def get_questions():
-    return serialize_questionnaire()
+    return _cached_questionnaire(QUESTIONNAIRE_VERSION)
 
 
-@router.get("")
-def get_profile(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    rp = db.query(RiskProfile).filter(RiskProfile.user_id == user.id).first()
-    allocation_profile = get_allocation_profile(rp.profile if rp else "moderado")
+@lru_cache(maxsize=256)
+def _decode_profile_state(
+    answers_json: Optional[str], rules_json: Optional[str]
+) -> Tuple[Optional[dict], Optional[list], Optional[str], Tuple[str, ...]]:
+    """
+    Decodifica answers/rules salvos e recalcula o perfil base uma unica vez por
+    conteudo armazenado. O resultado e compartilhado: tratar como somente leitura.
+    """
     payload = {"answers": None, "restrictions": []}
-    rules_applied: List[str] = []
     base_profile: Optional[str] = None
-
-    if rp and rp.answers:
+    if answers_json:
         try:
-            payload = json.loads(rp.answers)
-        except json.JSONDecodeError:
+            payload = orjson.loads(answers_json)
+        except orjson.JSONDecodeError:
             payload = {"answers": None, "restrictions": []}
-
-        answers = payload.get("answers") or {}
         try:
-            computation = compute_risk_profile(answers)
-            base_profile = computation.base_profile
+            base_profile = compute_risk_profile(
+                payload.get("answers") or {}
+            ).base_profile
         except InvalidRiskAnswer:
             base_profile = None
 
-    if rp and rp.rules:
+    rules: Tuple[str, ...] = ()
+    if rules_json:
         try:
-            rules_applied = list(json.loads(rp.rules))
-        except json.JSONDecodeError:
-            rules_applied = []
+            rules = tuple(orjson.loads(rules_json))
+        except orjson.JSONDecodeError:
+            rules = ()
+    return payload.get("answers"), payload.get("restrictions"), base_profile, rules
+
 
+@router.get("")
+def get_profile(
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    rp = db.execute(
+        select(
+            RiskProfile.profile,
+            RiskProfile.score,
+            RiskProfile.questionnaire_version,
+            RiskProfile.score_version,
+            RiskProfile.answers,
+            RiskProfile.rules,
+            RiskProfile.last_updated,
+        ).where(RiskProfile.user_id == user.id)
+    ).first()
+    if rp is None:
+        return {
+            "profile": None,
+            "score": None,
+            "base_profile": None,
+            "questionnaire_version": QUESTIONNAIRE_VERSION,
+            "score_version": SCORE_VERSION,
+            "answers": None,
+            "restrictions": [],
+            "rules_applied": [],
+            "last_updated": None,
+            "allocation": get_allocation_response("moderado"),
+        }
+
+    answers, restrictions, base_profile, rules = _decode_profile_state(
+        rp.answers, rp.rules
+    )
     return {
-        "profile": rp.profile if rp else None,
-        "score": rp.score if rp else None,
+        "profile": rp.profile,
+        "score": rp.score,
         "base_profile": base_profile,
-        "questionnaire_version": (rp.questionnaire_version if rp else None)
-        or QUESTIONNAIRE_VERSION,
-        "score_version": (rp.score_version if rp else None) or SCORE_VERSION,
-        "answers": payload.get("answers"),
-        "restrictions": payload.get("restrictions"),
-        "rules_applied": rules_applied,
-        "last_updated": rp.last_updated if rp else None,
-        "allocation": {
-            "profile": allocation_profile.profile,
-            "weights": allocation_profile.weights,
-            "bands": allocation_profile.bands,
-            "description": allocation_profile.description,
-        },
+        "questionnaire_version": rp.questionnaire_version or QUESTIONNAIRE_VERSION,
+        "score_version": rp.score_version or SCORE_VERSION,
+        "answers": answers,
+        "restrictions": restrictions,
+        "rules_applied": list(rules),
+        "last_updated": rp.last_updated,
+        "allocation": get_allocation_response(rp.profile),
     }
 
 
@@ -129,34 +163,38 @@ def set_profile(
         "restrictions": body.restrictions or [],
     }
 
-    rp = db.query(RiskProfile).filter(RiskProfile.user_id == user.id).first()
     now = datetime.now(timezone.utc)
+    values = {
+        "user_id": user.id,
+        "profile": computation.profile,
+        "score": computation.score,
+        "last_updated": now,
+        "questionnaire_version": QUESTIONNAIRE_VERSION,
+        "score_version": SCORE_VERSION,
+        "answers": orjson.dumps(payload).decode(),
+        "rules": orjson.dumps(computation.rules_applied).decode(),
+    }
 
-    if not rp:
-        rp = RiskProfile(
-            user_id=user.id,
-            profile=computation.profile,
-            score=computation.score,
-            last_updated=now,
-            questionnaire_version=QUESTIONNAIRE_VERSION,
-            score_version=SCORE_VERSION,
-            answers=json.dumps(payload),
-            rules=json.dumps(computation.rules_applied),
-        )
-        db.add(rp)
+    insert = on_conflict_insert(db)
+    if insert is not None:
+        # Upsert em um unico statement (user_id e unico); o RETURNING dispensa o
+        # SELECT previo e o refresh apos o commit
+        stmt = insert(RiskProfile).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RiskProfile.user_id],
+            set_={key: stmt.excluded[key] for key in values if key != "user_id"},
+        ).returning(RiskProfile.last_updated)
+        last_updated = db.execute(stmt).scalar_one()
+        db.commit()
     else:
-        rp.profile = computation.profile
-        rp.score = computation.score
-        rp.last_updated = now
-        rp.questionnaire_version = QUESTIONNAIRE_VERSION
-        rp.score_version = SCORE_VERSION
-        rp.answers = json.dumps(payload)
-        rp.rules = json.dumps(computation.rules_applied)
-
-    db.commit()
-    db.refresh(rp)
-
-    allocation_profile = get_allocation_profile(computation.profile)
+        rp = db.query(RiskProfile).filter(RiskProfile.user_id == user.id).first()
+        if not rp:
+            rp = RiskProfile(user_id=user.id)
+            db.add(rp)
+        for key, value in values.items():
+            setattr(rp, key, value)
+        db.commit()
+        last_updated = rp.last_updated
 
     return {
         "profile": computation.profile,
@@ -167,11 +205,6 @@ def set_profile(
         "rules_applied": computation.rules_applied,
         "answers": body.answers,
         "restrictions": body.restrictions,
-        "last_updated": rp.last_updated,
-        "allocation": {
-            "profile": allocation_profile.profile,
-            "weights": allocation_profile.weights,
-            "bands": allocation_profile.bands,
-            "description": allocation_profile.description,
-        },
+        "last_updated": last_updated,
+        "allocation": get_allocation_response(computation.profile),
     }
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import math
+import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, Iterable
 
-
 ALLOCATION_CLASSES = ("acao", "etf", "fii", "cripto")
 
 
@@ -16,7 +18,7 @@ class AllocationProfile:
 
 
 def _normalize(weights: Dict[str, float]) -> Dict[str, float]:
-    total = sum(max(v, 0.0) for v in weights.values())
+    total = math.fsum(max(v, 0.0) for v in weights.values())
     if total <= 0:
         raise ValueError("Pesos inválidos para alocação alvo.")
     return {k: max(v, 0.0) / total for k, v in weights.items()}
@@ -25,14 +27,12 @@ def _normalize(weights: Dict[str, float]) -> Dict[str, float]:
 ALLOCATION_PROFILES: Dict[str, AllocationProfile] = {
     "conservador": AllocationProfile(
         profile="conservador",
-        weights=_normalize(
-            {
-                "etf": 0.60,
-                "acao": 0.25,
-                "fii": 0.12,
-                "cripto": 0.03,
-            }
-        ),
+        weights={
+            "etf": 0.60,
+            "acao": 0.25,
+            "fii": 0.12,
+            "cripto": 0.03,
+        },
         bands={
             "etf": 0.03,
             "acao": 0.03,
@@ -43,14 +43,12 @@ ALLOCATION_PROFILES: Dict[str, AllocationProfile] = {
     ),
     "moderado": AllocationProfile(
         profile="moderado",
-        weights=_normalize(
-            {
-                "etf": 0.45,
-                "acao": 0.35,
-                "fii": 0.15,
-                "cripto": 0.05,
-            }
-        ),
+        weights={
+            "etf": 0.45,
+            "acao": 0.35,
+            "fii": 0.15,
+            "cripto": 0.05,
+        },
         bands={
             "etf": 0.05,
             "acao": 0.05,
@@ -61,14 +59,12 @@ ALLOCATION_PROFILES: Dict[str, AllocationProfile] = {
     ),
     "arrojado": AllocationProfile(
         profile="arrojado",
-        weights=_normalize(
-            {
-                "etf": 0.30,
-                "acao": 0.45,
-                "fii": 0.15,
-                "cripto": 0.10,
-            }
-        ),
+        weights={
+            "etf": 0.30,
+            "acao": 0.45,
+            "fii": 0.15,
+            "cripto": 0.10,
+        },
         bands={
             "etf": 0.08,
             "acao": 0.08,
@@ -79,6 +75,28 @@ ALLOCATION_PROFILES: Dict[str, AllocationProfile] = {
     ),
 }
 
+# Pesos ja normalizados nos literais; valida uma vez na importacao que
+# _normalize os deixaria inalterados (nao negativos e somando 1)
+for _profile in ALLOCATION_PROFILES.values():
+    _expected = _normalize(_profile.weights)
+    if any(
+        not math.isclose(weight, _expected[cls], abs_tol=1e-9)
+        for cls, weight in _profile.weights.items()
+    ):
+        raise ValueError(f"Pesos do perfil {_profile.profile} nao estao normalizados.")
+del _profile, _expected
+
+# Payload pronto para resposta por perfil; tratado como somente leitura.
+_RESPONSE_CACHE: Dict[str, Dict[str, object]] = {
+    key: {
+        "profile": value.profile,
+        "weights": value.weights,
+        "bands": value.bands,
+        "description": value.description,
+    }
+    for key, value in ALLOCATION_PROFILES.items()
+}
+
 
 CLASS_LABELS = {
     "acao": "Ações",
@@ -88,40 +106,61 @@ CLASS_LABELS = {
 }
 
 
+def class_label(asset_class: str) -> str:
+    """Rotulo de exibicao da classe; classes sem cadastro viram Title Case."""
+    return CLASS_LABELS.get(asset_class) or asset_class.title()
+
+
 def get_allocation_profile(profile: str) -> AllocationProfile:
     key = (profile or "moderado").lower()
     return ALLOCATION_PROFILES.get(key, ALLOCATION_PROFILES["moderado"])
 
 
+@lru_cache(maxsize=8)
+def get_allocation_response(profile: str | None) -> Dict[str, object]:
+    key = (profile or "moderado").lower()
+    return _RESPONSE_CACHE.get(key, _RESPONSE_CACHE["moderado"])
+
+
 def list_allocation_profiles() -> Iterable[AllocationProfile]:
     return ALLOCATION_PROFILES.values()
 
 
+_RAW_CLASS_ALIASES = {
+    "acao": ("acao", "stock", "equity", "ações", "bdr"),
+    "etf": ("etf", "exchange traded fund", "fund etf"),
+    "fii": ("fii", "fundo imobiliario", "fundo imobiliário", "fundo", "reit"),
+    "cripto": ("cripto", "crypto", "cryptocurrency"),
+}
+_RAW_MAP: Dict[str, str] = {
+    alias: cls for cls, aliases in _RAW_CLASS_ALIASES.items() for alias in aliases
+}
+# Sufixos de ticker resolvidos numa unica busca; o grupo casado define a classe
+_SUFFIX_RE = re.compile(r"(?P<fii>11)$|(?P<bdr>34|\.SA)$|(?P<cripto>-USDT?)$")
+
+
+# Funcao pura sobre (simbolo, classe) que se repetem entre usuarios e turnos;
+# o cache poupa o regex de sufixo no loop de posicoes do chat e da carteira
+@lru_cache(maxsize=4096)
 def normalize_asset_class(symbol: str, raw_class: str | None) -> str:
     raw = (raw_class or "").strip().lower()
-    if raw in ("acao", "stock", "equity", "ações", "bdr"):
-        return "acao"
-    if raw in ("etf", "exchange traded fund", "fund etf"):
-        return "etf"
-    if raw in ("fii", "fundo imobiliario", "fundo imobiliário", "fundo", "reit"):
-        return "fii"
-    if raw in ("fund",):
-        symbol_upper = (symbol or "").upper()
-        if symbol_upper.endswith("11"):
-            return "fii"
-        return "etf"
-    if raw in ("cripto", "crypto", "cryptocurrency"):
-        return "cripto"
+    mapped = _RAW_MAP.get(raw)
+    if mapped is not None:
+        return mapped
 
     symbol_upper = (symbol or "").upper()
-    if symbol_upper.endswith("11"):
-        return "fii"
-    if symbol_upper.endswith("F11"):
+    match = _SUFFIX_RE.search(symbol_upper)
+    suffix = match.lastgroup if match else None
+    if raw == "fund":
+        return "fii" if suffix == "fii" else "etf"
+
+    if suffix == "fii":
         return "fii"
-    if symbol_upper.endswith("34") or symbol_upper.endswith(".SA"):
+    if suffix == "bdr":
         # ETFs B3 e BDRs geralmente ficam em ETF/ação
-        if symbol_upper.startswith("ETF") or symbol_upper.endswith("11"):
+        if symbol_upper.startswith("ETF"):
             return "etf"
-    if symbol_upper.endswith("-USD") or symbol_upper.endswith("-USDT"):
+        return "acao"
+    if suffix == "cripto":
         return "cripto"
     return "acao"
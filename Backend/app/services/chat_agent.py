@@ -1,27 +1,35 @@
 ﻿from __future__ import annotations
 
-import json
+import importlib.util
 import logging
+import math
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from functools import cached_property, lru_cache
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import httpx
-from sqlalchemy.orm import Session, joinedload
-
-try:  # LangChain is optional at import time (e.g., during unit tests before deps install)
-    from langchain_core.messages import (
-        AIMessage,
-        HumanMessage,
-        SystemMessage,
-        BaseMessage,
-    )
-    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-except Exception:  # pragma: no cover - defensive fallback when package missing
-    AIMessage = HumanMessage = SystemMessage = BaseMessage = object  # type: ignore
-    ChatPromptTemplate = MessagesPlaceholder = object  # type: ignore
+import numpy as np
+import orjson
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session, load_only
 
 from app.db.models import (
+    Asset,
     ChatMessage as ChatMessageModel,
     Holding,
     Portfolio,
@@ -30,12 +38,11 @@ from app.db.models import (
     User,
 )
 from app.services import news
-from app.services.allocations import CLASS_LABELS, normalize_asset_class
+from app.services.allocations import class_label, normalize_asset_class
 from app.services.currency import normalize_currency_code
 from app.services.fx import get_fx_rate
 from app.settings import get_settings
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -51,11 +58,91 @@ Regras:
 - Atenda apenas perguntas relacionadas a investimentos/financas/carteira.
 - Para outros temas, explique que nao pode ajudar e sugira buscar uma fonte especializada.
 """.strip()
+SYSTEM_PROMPT = sys.intern(SYSTEM_PROMPT)
+
+# Mensagens fixas do prompt, prontas no formato do /chat/completions
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+_CONTEXT_HEADER = "Contexto estruturado coletado:\n\n"
+# Ordem fixa do contexto: segmentos estaveis primeiro e noticias (que mudam com
+# mais frequencia) por ultimo, para o prefixo do prompt se repetir entre turnos
+_CONTEXT_ORDER = {
+    name: rank
+    for rank, name in enumerate(
+        ("portfolio_overview", "risk_profile", "transactions_summary", "market_news")
+    )
+}
+_HISTORY_ROLES = frozenset({"user", "assistant", "system"})
+
+# Um cliente HTTP por configuracao de LLM, compartilhado entre agentes: as
+# conexoes keep-alive (e o TLS) sobrevivem a recriacao do ChatAgent. HTTP/2
+# so e ligado quando o pacote h2 (extra httpx[http2]) esta instalado.
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+_LLM_CLIENT_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+_LLM_CLIENTS: Dict[Tuple[str, str, float], httpx.Client] = {}
+_LLM_CLIENTS_LOCK = threading.Lock()
 
 NEWS_OBSERVATION_DESCRIPTION = "Noticias recentes relacionadas aos ativos do usuario."
 
 
-@dataclass
+class _TtlCache:
+    """
+    Dict em memoria com expiracao e tamanho maximo, seguro entre threads
+    (mesma politica do cache de cambio: expira por idade, despeja o mais antigo).
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self._entries: Dict[Any, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._maxsize = maxsize
+        self._ttl = ttl_seconds
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: Any, now_ts: float) -> Any:
+        with self._lock:
+            cached = self._entries.get(key)
+            if not cached:
+                return None
+            cached_ts, value = cached
+            if now_ts - cached_ts > self._ttl:
+                self._entries.pop(key, None)
+                return None
+            return value
+
+    def store(self, key: Any, value: Any, now_ts: float) -> None:
+        with self._lock:
+            entries = self._entries
+            if key not in entries and len(entries) >= self._maxsize:
+                expired = [
+                    k
+                    for k, (cached_ts, _) in entries.items()
+                    if now_ts - cached_ts > self._ttl
+                ]
+                for k in expired:
+                    entries.pop(k, None)
+                if len(entries) >= self._maxsize:
+                    oldest = min(entries, key=lambda k: entries[k][0])
+                    entries.pop(oldest, None)
+            entries[key] = (now_ts, value)
+
+
+# Turnos seguidos (e usuarios com ativos em comum) repetem o mesmo conjunto de
+# simbolos; a observacao de noticias fica em memoria por alguns minutos.
+_NEWS_CACHE = _TtlCache(maxsize=1024, ttl_seconds=5 * 60)
+
+# Mesma pergunta (normalizada) do mesmo usuario sobre o mesmo contexto coletado
+# reaproveita a resposta do modelo em vez de outra chamada ao /chat/completions
+_REPLY_CACHE = _TtlCache(maxsize=1024, ttl_seconds=5 * 60)
+# (usuario, mensagem normalizada, contexto composto, historico (papel, texto))
+_ReplyCacheKey = Tuple[int, str, str, Tuple[Tuple[str, str], ...]]
+
+
+@dataclass(slots=True)
 class ToolObservation:
     """Representa o retorno estruturado de uma coleta de dados usada pelo agente."""
 
@@ -65,7 +152,7 @@ class ToolObservation:
     data: Dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True)
 class ChatAgentResponse:
     reply: str
     observations: List[ToolObservation]
@@ -73,27 +160,161 @@ class ChatAgentResponse:
     error: Optional[str] = None
 
 
+@dataclass(slots=True)
+class ChatAgentStream:
+    """Resposta em partes: observacoes prontas antes do primeiro token do modelo."""
+
+    observations: List[ToolObservation]
+    chunks: Iterator[str]
+    used_fallback: bool
+    error: Optional[str] = None
+
+
+EMPTY_MESSAGE_REPLY = (
+    "Poderia reformular sua pergunta? Preciso de uma mensagem com conteudo."
+)
+
+
+# Troca separadores do formato en-US para pt-BR numa unica passada
+_BRL_SEPARATORS = str.maketrans({",": ".", ".": ","})
+
+
 def _format_currency_brl(value: float) -> str:
-    formatted = f"{value:,.2f}"
-    return f"R$ {formatted.replace(',', 'X').replace('.', ',').replace('X', '.')}"
+    # "R$ " nao tem separadores, entao o translate pode cobrir a string inteira
+    return f"R$ {value:,.2f}".translate(_BRL_SEPARATORS)
 
 
 def _format_percentage(value: float) -> str:
     return f"{value:.2f}%"
 
 
+# load_only traz so as colunas da carteira usadas nos resumos; as posicoes vem
+# a parte, como tuplas de colunas (_load_holding_rows)
+_PORTFOLIO_LOAD_OPTIONS = (
+    load_only(Portfolio.id, Portfolio.user_id, Portfolio.name, Portfolio.created_at),
+)
+
+# Colunas das posicoes lidas pelo resumo da carteira. Todas sao Float no modelo,
+# entao o driver ja entrega floats e nenhuma instancia Holding/Asset e montada
+_HOLDING_COLUMNS = (
+    Holding.id,
+    Holding.quantity,
+    Holding.avg_price,
+    Asset.symbol,
+    Asset.name,
+    Asset.class_,
+    Asset.currency,
+    Asset.last_quote_price,
+    Asset.last_quote_at,
+)
+
+# Colunas das transacoes lidas pelo resumo (mais o simbolo do ativo)
+_TRANSACTION_COLUMNS = (
+    Transaction.id,
+    Transaction.asset_id,
+    Transaction.type,
+    Transaction.quantity,
+    Transaction.price,
+    Transaction.total,
+    Transaction.executed_at,
+    Transaction.kind,
+    Transaction.status,
+    Asset.symbol,
+)
+
+# Sentinela para "nao carregado": None ja significa "usuario sem carteira/perfil"
+_NOT_LOADED: Any = object()
+
+_NUMBER_TYPES = (int, float)
+
+
 def _load_primary_portfolio(db: Session, user_id: int) -> Optional[Portfolio]:
     return (
         db.query(Portfolio)
-        .options(joinedload(Portfolio.holdings).joinedload(Holding.asset))
+        .options(*_PORTFOLIO_LOAD_OPTIONS)
         .filter(Portfolio.user_id == user_id)
         .order_by(Portfolio.created_at.asc())
         .first()
     )
 
 
-def _build_portfolio_observation(db: Session, user: User) -> ToolObservation:
-    portfolio = _load_primary_portfolio(db, user.id)
+def _collect_context(
+    db: Session, user_id: int
+) -> Tuple[Optional[Portfolio], Optional[RiskProfile]]:
+    """Carteira principal e perfil de risco do usuario numa unica consulta."""
+    row = db.execute(
+        select(Portfolio, RiskProfile)
+        .select_from(User)
+        .outerjoin(Portfolio, Portfolio.user_id == User.id)
+        .outerjoin(RiskProfile, RiskProfile.user_id == User.id)
+        .where(User.id == user_id)
+        .options(*_PORTFOLIO_LOAD_OPTIONS)
+        .order_by(Portfolio.created_at.asc())
+        .limit(1)
+    ).first()
+    if row is None:
+        return None, None
+    return row[0], row[1]
+
+
+def _load_holding_rows(db: Session, portfolio_id: int) -> List[Row]:
+    """Posicoes da carteira com os dados do ativo, em tuplas na ordem de cadastro."""
+    return db.execute(
+        select(*_HOLDING_COLUMNS)
+        .join(Asset, Holding.asset_id == Asset.id)
+        .where(Holding.portfolio_id == portfolio_id)
+        .order_by(Holding.id)
+    ).all()
+
+
+def _portfolio_symbols(holding_rows: Iterable[Row]) -> List[str]:
+    """Simbolos distintos das posicoes, na ordem da carteira."""
+    # dict mantem a ordem de insercao: um unico hash por posicao deduplica
+    symbols: Dict[str, None] = {}
+    for row in holding_rows:
+        symbol = row.symbol
+        if symbol:
+            symbols[symbol] = None
+    return list(symbols)
+
+
+def _aggregate_holdings(
+    qty: np.ndarray,
+    avg: np.ndarray,
+    price: np.ndarray,
+    class_idx: np.ndarray,
+    n_classes: int,
+) -> Tuple[float, float, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Kernel vetorizado da carteira (colunas ja em BRL): totais investido/atual,
+    valor atual por classe e PnL absoluto/percentual por posicao.
+    """
+    invested = qty * avg
+    current = qty * price
+    pnl_abs = current - invested
+    pnl_pct = (
+        np.divide(pnl_abs, invested, out=np.zeros_like(pnl_abs), where=invested > 0)
+        * 100.0
+    )
+    per_class = np.bincount(class_idx, weights=current, minlength=n_classes)
+    return (
+        math.fsum(invested),
+        math.fsum(current),
+        per_class,
+        current,
+        pnl_abs,
+        pnl_pct,
+    )
+
+
+def _build_portfolio_observation(
+    db: Session,
+    user: User,
+    portfolio: Optional[Portfolio] = _NOT_LOADED,
+    holding_rows: Optional[Sequence[Row]] = None,
+) -> ToolObservation:
+    if portfolio is _NOT_LOADED:
+        portfolio = _load_primary_portfolio(db, user.id)
     if not portfolio:
         return ToolObservation(
             name="portfolio_overview",
@@ -110,117 +331,138 @@ def _build_portfolio_observation(db: Session, user: User) -> ToolObservation:
             },
         )
 
-    holdings_summary: List[Dict[str, Any]] = []
-    totals = {
-        "current_value": 0.0,
-        "invested_value": 0.0,
-    }
-    class_totals: Dict[str, float] = {}
+    if holding_rows is None:
+        holding_rows = _load_holding_rows(db, portfolio.id)
+
+    # Primeira passada so extrai colunas (SoA); a aritmetica vai para o NumPy
+    rows: List[Tuple[int, str, str, str]] = []
+    qty_col: List[float] = []
+    avg_col: List[float] = []
+    price_col: List[float] = []
+    class_col: List[int] = []
+    class_index: Dict[str, int] = {}
+    symbols_seen: Dict[str, None] = {}
+    # Uma consulta de cambio por moeda distinta, nao por posicao
+    fx_rates: Dict[str, float] = {}
     latest_quote_at: Optional[datetime] = None
-    symbols: List[str] = []
-
-    for holding in portfolio.holdings:
-        asset = holding.asset
-        if not asset:
-            continue
-        raw_price = (
-            float(asset.last_quote_price)
-            if asset.last_quote_price is not None
-            else float(holding.avg_price)
-        )
+
+    for (
+        holding_id,
+        quantity,
+        avg_price,
+        symbol,
+        name,
+        raw_class,
+        raw_currency,
+        last_price,
+        quote_at,
+    ) in holding_rows:
+        avg = float(avg_price)
+        price = float(last_price) if last_price is not None else avg
 
         # Converte para BRL quando necessario
-        currency = normalize_currency_code(
-            getattr(asset, "currency", None), asset.symbol
-        )
-        conv_price = float(raw_price)
-        conv_avg = float(holding.avg_price)
+        currency = normalize_currency_code(raw_currency, symbol)
         if currency != "BRL":
-            try:
-                rate, _ts = get_fx_rate(currency, "BRL")
-                conv_price = float(raw_price) * float(rate)
-                conv_avg = float(holding.avg_price) * float(rate)
-            except Exception:
-                # Se FX falhar, cai no preco original sem conversao (melhor que travar)
-                pass
-
-        invested = float(holding.quantity) * conv_avg
-        current_value = float(holding.quantity) * conv_price
-        pnl_abs = current_value - invested
-        pnl_pct = (pnl_abs / invested * 100.0) if invested > 0 else 0.0
-
-        totals["current_value"] += current_value
-        totals["invested_value"] += invested
-        class_key = normalize_asset_class(asset.symbol or "", asset.class_)
-        class_totals[class_key] = class_totals.get(class_key, 0.0) + current_value
-        if asset.symbol:
-            symbols.append(asset.symbol)
-
-        if asset.last_quote_at and (
-            latest_quote_at is None or asset.last_quote_at > latest_quote_at
-        ):
-            latest_quote_at = asset.last_quote_at
-
+            rate = fx_rates.get(currency)
+            if rate is None:
+                try:
+                    rate = float(get_fx_rate(currency, "BRL")[0])
+                except Exception:
+                    # Se FX falhar, cai no preco original sem conversao (melhor que travar)
+                    rate = 1.0
+                fx_rates[currency] = rate
+            price *= rate
+            avg *= rate
+
+        if symbol:
+            symbols_seen[symbol] = None
+
+        class_key = normalize_asset_class(symbol or "", raw_class)
+        rows.append((holding_id, symbol, name, class_key))
+        qty_col.append(float(quantity))
+        avg_col.append(avg)
+        price_col.append(price)
+        class_col.append(class_index.setdefault(class_key, len(class_index)))
+
+        if quote_at and (latest_quote_at is None or quote_at > latest_quote_at):
+            latest_quote_at = quote_at
+
+    (
+        total_invested,
+        total_current,
+        class_sums,
+        current_arr,
+        pnl_abs_arr,
+        pnl_pct_arr,
+    ) = _aggregate_holdings(
+        np.asarray(qty_col, dtype=np.float64),
+        np.asarray(avg_col, dtype=np.float64),
+        np.asarray(price_col, dtype=np.float64),
+        np.asarray(class_col, dtype=np.intp),
+        len(class_index),
+    )
+    # Ordem decrescente direto dos arrays; o argsort estavel desempata pela ordem
+    # da carteira, igual ao sort(reverse=True) sobre as listas de dicts
+    current_values = current_arr.tolist()
+    pnl_abs_values = pnl_abs_arr.tolist()
+    pnl_pct_values = pnl_pct_arr.tolist()
+    holdings_summary: List[Dict[str, Any]] = []
+    for i in np.argsort(-current_arr, kind="stable").tolist():
+        holding_id, symbol, name, class_key = rows[i]
         holdings_summary.append(
             {
-                "holding_id": holding.id,
-                "symbol": asset.symbol,
-                "name": asset.name,
+                "holding_id": holding_id,
+                "symbol": symbol,
+                "name": name,
                 "class": class_key,
-                "quantity": float(holding.quantity),
-                "avg_price": conv_avg,
-                "last_price": conv_price,
-                "current_value": current_value,
-                "pnl_abs": pnl_abs,
-                "pnl_pct": pnl_pct,
+                "quantity": qty_col[i],
+                "avg_price": avg_col[i],
+                "last_price": price_col[i],
+                "current_value": current_values[i],
+                "pnl_abs": pnl_abs_values[i],
+                "pnl_pct": pnl_pct_values[i],
             }
         )
 
-    symbols = list(dict.fromkeys(symbols))
-
-    pnl_abs_total = totals["current_value"] - totals["invested_value"]
+    pnl_abs_total = total_current - total_invested
     pnl_pct_total = (
-        (pnl_abs_total / totals["invested_value"] * 100.0)
-        if totals["invested_value"] > 0
-        else 0.0
+        (pnl_abs_total / total_invested * 100.0) if total_invested > 0 else 0.0
     )
 
+    class_keys = list(class_index)
+    class_values = class_sums.tolist()
+    if total_current > 0:
+        class_shares = (class_sums / total_current * 100.0).tolist()
+    else:
+        class_shares = [0.0] * len(class_keys)
     class_breakdown: List[Dict[str, Any]] = []
-    for class_key, amount in class_totals.items():
-        share = (
-            (amount / totals["current_value"] * 100.0)
-            if totals["current_value"] > 0
-            else 0.0
-        )
+    for i in np.argsort(-class_sums, kind="stable").tolist():
+        class_key = class_keys[i]
         class_breakdown.append(
             {
                 "class": class_key,
-                "label": CLASS_LABELS.get(class_key, class_key.title()),
-                "value": amount,
-                "share_pct": share,
+                "label": class_label(class_key),
+                "value": class_values[i],
+                "share_pct": class_shares[i],
             }
         )
 
-    class_breakdown.sort(key=lambda item: item["value"], reverse=True)
-    holdings_summary.sort(key=lambda item: item["current_value"], reverse=True)
-
-    lines: List[str] = []
-    lines.append(
-        f"Carteira '{portfolio.name}': valor atual {_format_currency_brl(totals['current_value'])} "
+    lines: List[str] = [
+        f"Carteira '{portfolio.name}': valor atual {_format_currency_brl(total_current)} "
         f"(resultado acumulado {_format_currency_brl(pnl_abs_total)} | {_format_percentage(pnl_pct_total)})."
-    )
+    ]
 
     if holdings_summary:
         lines.append("Principais posicoes (top 5 por valor atual):")
-        for row in holdings_summary[:5]:
-            pnl_label = (
+        lines.extend(
+            f"- {row['symbol']}: {row['class']} | {_format_currency_brl(row['current_value'])} | "
+            + (
                 f"{_format_currency_brl(row['pnl_abs'])} ({_format_percentage(row['pnl_pct'])})"
-                if totals["invested_value"] > 0
-                else f"{_format_currency_brl(row['current_value'])}"
-            )
-            lines.append(
-                f"- {row['symbol']}: {row['class']} | {_format_currency_brl(row['current_value'])} | {pnl_label}"
+                if total_invested > 0
+                else _format_currency_brl(row["current_value"])
             )
+            for row in holdings_summary[:5]
+        )
     else:
         lines.append("Nenhuma posicao cadastrada ate o momento.")
 
@@ -231,10 +473,9 @@ def _build_portfolio_observation(db: Session, user: User) -> ToolObservation:
         )
         lines.append(f"Distribuicao por classe: {share_text}.")
 
-    if latest_quote_at:
-        lines.append(
-            f"Ultima atualizacao de precos: {latest_quote_at.isoformat()} (UTC)."
-        )
+    updated_at = latest_quote_at.isoformat() if latest_quote_at else None
+    if updated_at:
+        lines.append(f"Ultima atualizacao de precos: {updated_at} (UTC).")
 
     return ToolObservation(
         name="portfolio_overview",
@@ -244,12 +485,12 @@ def _build_portfolio_observation(db: Session, user: User) -> ToolObservation:
             "portfolio": {
                 "id": portfolio.id,
                 "name": portfolio.name,
-                "updated_at": latest_quote_at.isoformat() if latest_quote_at else None,
-                "symbols": symbols,
+                "updated_at": updated_at,
+                "symbols": list(symbols_seen),
             },
             "totals": {
-                "current_value": totals["current_value"],
-                "invested_value": totals["invested_value"],
+                "current_value": total_current,
+                "invested_value": total_invested,
                 "pnl_abs": pnl_abs_total,
                 "pnl_pct": pnl_pct_total,
             },
@@ -260,9 +501,13 @@ def _build_portfolio_observation(db: Session, user: User) -> ToolObservation:
 
 
 def _build_transactions_observation(
-    db: Session, user: User, limit: int = 120
+    db: Session,
+    user: User,
+    limit: int = 120,
+    portfolio: Optional[Portfolio] = _NOT_LOADED,
 ) -> ToolObservation:
-    portfolio = _load_primary_portfolio(db, user.id)
+    if portfolio is _NOT_LOADED:
+        portfolio = _load_primary_portfolio(db, user.id)
     if not portfolio:
         return ToolObservation(
             name="transactions_summary",
@@ -271,16 +516,14 @@ def _build_transactions_observation(
             data={"transactions": []},
         )
 
-    rows: List[Transaction] = (
-        db.query(Transaction)
-        .options(joinedload(Transaction.asset))
-        .filter(
-            Transaction.portfolio_id == portfolio.id, Transaction.status == "active"
-        )
+    # As linhas alimentam o payload e a agregacao: so as colunas usadas, em tuplas
+    rows = db.execute(
+        select(*_TRANSACTION_COLUMNS)
+        .outerjoin(Asset, Transaction.asset_id == Asset.id)
+        .where(Transaction.portfolio_id == portfolio.id, Transaction.status == "active")
         .order_by(Transaction.executed_at.desc(), Transaction.id.desc())
         .limit(limit)
-        .all()
-    )
+    ).all()
 
     if not rows:
         return ToolObservation(
@@ -290,37 +533,38 @@ def _build_transactions_observation(
             data={"transactions": []},
         )
 
-    symbol_totals: Dict[str, Dict[str, float]] = {}
-    buys_by_date: Dict[str, Dict[str, float]] = {}  # date -> symbol -> total buy
-    sells_by_date: Dict[str, Dict[str, float]] = {}  # date -> symbol -> total sell
+    symbol_totals: Dict[str, Dict[str, float]] = defaultdict(
+        lambda: {
+            "buys_total": 0.0,
+            "buys_qty": 0.0,
+            "sells_total": 0.0,
+            "sells_qty": 0.0,
+        }
+    )
+    # date -> symbol -> total comprado/vendido
+    buys_by_date: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    sells_by_date: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
     tx_payload: List[Dict[str, Any]] = []
 
     for tx in rows:
-        symbol = tx.asset.symbol if tx.asset else (tx.asset_id or "ativo")
+        symbol = tx.symbol if tx.symbol is not None else (tx.asset_id or "ativo")
         date_key = (
             tx.executed_at.date().isoformat() if tx.executed_at else "desconhecida"
         )
+        # Colunas Float ja chegam como float; cada uma e convertida uma vez so
         qty = float(tx.quantity)
-        total = float(tx.total) if tx.total is not None else float(tx.price) * qty
+        price = float(tx.price) if tx.price is not None else None
+        total = float(tx.total) if tx.total is not None else price * qty
         typ = (tx.type or "").lower()
 
-        if symbol not in symbol_totals:
-            symbol_totals[symbol] = {
-                "buys_total": 0.0,
-                "buys_qty": 0.0,
-                "sells_total": 0.0,
-                "sells_qty": 0.0,
-            }
         agg = symbol_totals[symbol]
         if typ == "buy":
             agg["buys_total"] += total
             agg["buys_qty"] += qty
-            buys_by_date.setdefault(date_key, {}).setdefault(symbol, 0.0)
             buys_by_date[date_key][symbol] += total
         elif typ == "sell":
             agg["sells_total"] += total
             agg["sells_qty"] += qty
-            sells_by_date.setdefault(date_key, {}).setdefault(symbol, 0.0)
             sells_by_date[date_key][symbol] += total
 
         tx_payload.append(
@@ -330,7 +574,7 @@ def _build_transactions_observation(
                 "type": typ,
                 "quantity": qty,
                 "total": total,
-                "price": float(tx.price) if tx.price is not None else None,
+                "price": price,
                 "executed_at": tx.executed_at.isoformat() if tx.executed_at else None,
                 "kind": tx.kind,
                 "status": tx.status,
@@ -361,15 +605,31 @@ def _build_transactions_observation(
         content="\n".join(lines),
         data={
             "transactions": tx_payload,
-            "symbol_totals": symbol_totals,
-            "buys_by_date": buys_by_date,
-            "sells_by_date": sells_by_date,
+            "symbol_totals": dict(symbol_totals),
+            "buys_by_date": {day: dict(v) for day, v in buys_by_date.items()},
+            "sells_by_date": {day: dict(v) for day, v in sells_by_date.items()},
         },
     )
 
 
-def _build_risk_profile_observation(db: Session, user: User) -> ToolObservation:
-    profile = db.query(RiskProfile).filter(RiskProfile.user_id == user.id).first()
+@lru_cache(maxsize=1024)
+def _parse_rules(rules_text: str) -> Optional[Tuple[str, ...]]:
+    """
+    Regras salvas no perfil, memoizadas pelo texto (mudam raramente entre turnos).
+    None indica JSON invalido; qualquer valor que nao seja lista vira tupla vazia.
+    """
+    try:
+        parsed = orjson.loads(rules_text)
+    except orjson.JSONDecodeError:
+        return None
+    return tuple(parsed) if isinstance(parsed, list) else ()
+
+
+def _build_risk_profile_observation(
+    db: Session, user: User, profile: Optional[RiskProfile] = _NOT_LOADED
+) -> ToolObservation:
+    if profile is _NOT_LOADED:
+        profile = db.query(RiskProfile).filter(RiskProfile.user_id == user.id).first()
     if not profile:
         return ToolObservation(
             name="risk_profile",
@@ -383,12 +643,11 @@ def _build_risk_profile_observation(db: Session, user: User) -> ToolObservation:
         f"Ultima atualizacao: {profile.last_updated.isoformat() if profile.last_updated else 'desconhecida'}.",
     ]
     if profile.rules:
-        try:
-            parsed_rules = json.loads(profile.rules)
-            if isinstance(parsed_rules, list) and parsed_rules:
-                details.append("Regras aplicadas: " + ", ".join(parsed_rules))
-        except json.JSONDecodeError:
+        parsed_rules = _parse_rules(profile.rules)
+        if parsed_rules is None:
             details.append(f"Regras aplicadas (texto): {profile.rules}")
+        elif parsed_rules:
+            details.append("Regras aplicadas: " + ", ".join(parsed_rules))
 
     return ToolObservation(
         name="risk_profile",
@@ -417,6 +676,19 @@ def _build_news_observation(symbols: Iterable[str]) -> ToolObservation:
             data={"items": []},
         )
 
+    key = frozenset(symbols_list)
+    now_ts = time.time()
+    cached = _NEWS_CACHE.get(key, now_ts)
+    if cached is not None:
+        return cached
+    observation = _fetch_news_observation(symbols_list)
+    # Falhas de rede nao entram no cache para a proxima rodada tentar de novo
+    if "error" not in observation.data:
+        _NEWS_CACHE.store(key, observation, now_ts)
+    return observation
+
+
+def _fetch_news_observation(symbols_list: List[str]) -> ToolObservation:
     try:
         payload = news.fetch_news_for_symbols(
             symbols_list,
@@ -468,26 +740,19 @@ def _build_news_observation(symbols: Iterable[str]) -> ToolObservation:
     )
 
 
-def _convert_history_to_messages(history: Sequence[Any]) -> List[Any]:
-    if AIMessage is object:  # LangChain nao disponivel
-        return []
-
-    messages: List[Any] = []
+def _convert_history_to_payload(history: Sequence[Any]) -> List[Dict[str, str]]:
+    """Historico (ORM ou dicts) ja no formato de mensagens do /chat/completions."""
+    payload: List[Dict[str, str]] = []
     for item in history:
-        role = getattr(item, "role", None)
-        content = getattr(item, "content", "")
         if isinstance(item, dict):
-            role = item.get("role", role)
-            content = item.get("content", content)
-        if not content:
-            continue
-        if role == "user":
-            messages.append(HumanMessage(content=content))
-        elif role == "assistant":
-            messages.append(AIMessage(content=content))
-        elif role == "system":
-            messages.append(SystemMessage(content=content))
-    return messages
+            role = item.get("role")
+            content = item.get("content", "")
+        else:
+            role = getattr(item, "role", None)
+            content = getattr(item, "content", "")
+        if content and role in _HISTORY_ROLES:
+            payload.append({"role": role, "content": content})
+    return payload
 
 
 class ChatAgent:
@@ -500,7 +765,6 @@ class ChatAgent:
             # Fail-safe: keep server up e cair no fallback se o HTTP client nao subir
             logger.exception("Failed to initialize HTTP client for LLM: %s", exc)
             self._http_client = None
-        self._prompt = None if ChatPromptTemplate is object else self._build_prompt()
 
     def _create_http_client(self) -> Optional[httpx.Client]:
         llm_settings = self._settings.llm
@@ -517,39 +781,108 @@ class ChatAgent:
             return None
 
         base_url = (llm_settings.api_base or "https://api.openai.com/v1").rstrip("/")
-        headers = {
-            "Authorization": f"Bearer {llm_settings.api_key}",
-            "Content-Type": "application/json",
-        }
-        logger.info(
-            "Inicializando cliente HTTP para OpenAI com base '%s' e modelo '%s'",
-            base_url,
-            llm_settings.model,
+        key = (base_url, llm_settings.api_key, float(llm_settings.request_timeout))
+        with _LLM_CLIENTS_LOCK:
+            client = _LLM_CLIENTS.get(key)
+            if client is None:
+                logger.info(
+                    "Inicializando cliente HTTP para OpenAI com base '%s' e modelo '%s'",
+                    base_url,
+                    llm_settings.model,
+                )
+                client = httpx.Client(
+                    base_url=base_url,
+                    headers={
+                        "Authorization": f"Bearer {llm_settings.api_key}",
+                        "Content-Type": "application/json",
+                    },
+                    timeout=llm_settings.request_timeout,
+                    http2=_HTTP2_AVAILABLE,
+                    limits=_LLM_CLIENT_LIMITS,
+                    trust_env=False,
+                )
+                _LLM_CLIENTS[key] = client
+        return client
+
+    def _reply_cache_key(
+        self,
+        user: User,
+        message: str,
+        observations: Sequence[ToolObservation],
+        history_messages: Sequence[Dict[str, str]],
+    ) -> _ReplyCacheKey:
+        # O contexto composto ja resume carteira, perfil, transacoes e noticias:
+        # qualquer mudanca nesses dados gera outra chave (sem contador de versao).
+        # O historico enviado ao modelo tambem entra: follow-ups curtos
+        # ("pode detalhar?") dependem da conversa em que aparecem.
+        normalized = " ".join(message.lower().split())
+        history_key = tuple((msg["role"], msg["content"]) for msg in history_messages)
+        return (
+            user.id,
+            normalized,
+            self._compose_context(observations),
+            history_key,
         )
-        return httpx.Client(
-            base_url=base_url,
-            headers=headers,
-            timeout=llm_settings.request_timeout,
-            trust_env=False,
+
+    def _compose_context(self, observations: Sequence[ToolObservation]) -> str:
+        # Ordem canonica (_CONTEXT_ORDER): o prefixo do prompt (sistema + contexto)
+        # sai identico entre turnos e aproveita o cache de prefixo do provedor
+        return "\n\n".join(
+            f"[{obs.name}] {obs.description}\n{obs.content}"
+            for obs in sorted(
+                observations,
+                key=lambda obs: (
+                    _CONTEXT_ORDER.get(obs.name, len(_CONTEXT_ORDER)),
+                    obs.name,
+                ),
+            )
         )
 
-    def _build_prompt(self) -> Optional[Any]:
-        if ChatPromptTemplate is object:
-            return None
-        return ChatPromptTemplate.from_messages(
-            [
-                ("system", SYSTEM_PROMPT),
-                ("system", "Contexto estruturado coletado:\n\n{context}"),
-                MessagesPlaceholder("history"),
-                ("human", "{input}"),
+    def _prepare_turn(
+        self,
+        db: Session,
+        user: User,
+        message: str,
+        history: Sequence[ChatMessageModel] | Sequence[Dict[str, Any]] | None,
+    ) -> Tuple[List[ToolObservation], List[Dict[str, str]]]:
+        """Coleta as observacoes do turno e converte o historico para o prompt."""
+        portfolio, risk_profile = _collect_context(db, user.id)
+        holding_rows = _load_holding_rows(db, portfolio.id) if portfolio else []
+        # Noticias (rede) correm em paralelo com o FX e as consultas restantes;
+        # a Session nao e thread-safe, entao o trabalho de banco fica nesta thread
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            news_future = pool.submit(
+                _build_news_observation, _portfolio_symbols(holding_rows)
+            )
+            observations: List[ToolObservation] = [
+                _build_portfolio_observation(db, user, portfolio, holding_rows),
+                _build_risk_profile_observation(db, user, risk_profile),
+                _build_transactions_observation(db, user, portfolio=portfolio),
             ]
-        )
+            history_messages = _convert_history_to_payload(history or [])
+            observations.append(news_future.result())
 
-    def _compose_context(self, observations: Sequence[ToolObservation]) -> str:
-        segments = []
-        for obs in observations:
-            segments.append(f"[{obs.name}] {obs.description}\n{obs.content}")
-        return "\n\n".join(segments)
+        return observations, history_messages
+
+    def _llm_ready(self) -> bool:
+        return self._http_client is not None
+
+    def _format_prompt(
+        self,
+        observations: Sequence[ToolObservation],
+        history_messages: List[Dict[str, str]],
+        message: str,
+    ) -> List[Dict[str, str]]:
+        """Mensagens do /chat/completions montadas direto, sem template."""
+        return [
+            _SYSTEM_MESSAGE,
+            {
+                "role": "system",
+                "content": _CONTEXT_HEADER + self._compose_context(observations),
+            },
+            *history_messages,
+            {"role": "user", "content": message},
+        ]
 
     def generate_reply(
         self,
@@ -560,40 +893,28 @@ class ChatAgent:
     ) -> ChatAgentResponse:
         if not message.strip():
             return ChatAgentResponse(
-                reply="Poderia reformular sua pergunta? Preciso de uma mensagem com conteudo.",
+                reply=EMPTY_MESSAGE_REPLY,
                 observations=[],
                 used_fallback=True,
             )
 
-        portfolio_obs = _build_portfolio_observation(db, user)
-        observations: List[ToolObservation] = [
-            portfolio_obs,
-            _build_risk_profile_observation(db, user),
-            _build_transactions_observation(db, user),
-        ]
-        portfolio_data = portfolio_obs.data.get("portfolio")
-        symbols = (
-            portfolio_data.get("symbols", [])
-            if isinstance(portfolio_data, dict)
-            else []
-        )
-        news_obs = _build_news_observation(symbols)
-        observations.append(news_obs)
-
-        history_messages = _convert_history_to_messages(history or [])
-        context = self._compose_context(observations)
-
-        if not self._http_client or not self._prompt or AIMessage is object:
+        observations, history_messages = self._prepare_turn(db, user, message, history)
+        if not self._llm_ready():
             reply = self._fallback_reply(message, observations)
             return ChatAgentResponse(
                 reply=reply, observations=observations, used_fallback=True
             )
 
-        try:
-            prompt_value = self._prompt.format_prompt(
-                context=context, history=history_messages, input=message
+        cache_key = self._reply_cache_key(user, message, observations, history_messages)
+        cached_reply = _REPLY_CACHE.get(cache_key, time.time())
+        if cached_reply is not None:
+            return ChatAgentResponse(
+                reply=cached_reply, observations=observations, used_fallback=False
             )
-            reply_text = self._invoke_openai(prompt_value)
+
+        try:
+            messages = self._format_prompt(observations, history_messages, message)
+            reply_text = self._invoke_openai(messages)
         except Exception as exc:  # pragma: no cover - fallback se modelo falhar
             reply_text = self._fallback_reply(message, observations)
             return ChatAgentResponse(
@@ -603,44 +924,96 @@ class ChatAgent:
                 error=str(exc),
             )
 
+        _REPLY_CACHE.store(cache_key, reply_text, time.time())
         return ChatAgentResponse(
             reply=reply_text,
             observations=observations,
             used_fallback=False,
         )
 
-    def _invoke_openai(self, prompt_value: Any) -> str:
-        if not self._http_client:
-            raise RuntimeError("HTTP client for OpenAI not configured")
+    def stream_reply(
+        self,
+        db: Session,
+        user: User,
+        message: str,
+        history: Sequence[ChatMessageModel] | Sequence[Dict[str, Any]] | None = None,
+    ) -> ChatAgentStream:
+        """
+        Variante de generate_reply que entrega o texto do modelo conforme chega.
+        Se o streaming falhar antes do primeiro trecho, envia o resumo local.
+        """
+        if not message.strip():
+            return ChatAgentStream(
+                observations=[], chunks=iter([EMPTY_MESSAGE_REPLY]), used_fallback=True
+            )
 
-        messages = getattr(prompt_value, "to_messages", lambda: [])()
-        payload: List[Dict[str, str]] = []
-        for msg in messages:
-            role = None
-            content = getattr(msg, "content", "")
-            if isinstance(msg, HumanMessage):
-                role = "user"
-            elif isinstance(msg, AIMessage):
-                role = "assistant"
-            elif isinstance(msg, SystemMessage):
-                role = "system"
-            elif BaseMessage is not object and isinstance(msg, BaseMessage):
-                role = getattr(msg, "type", "user")
-            if role and content:
-                payload.append({"role": role, "content": content})
-
-        if not payload:
-            raise ValueError("Prompt vazio para o modelo.")
+        observations, history_messages = self._prepare_turn(db, user, message, history)
+        if not self._llm_ready():
+            reply = self._fallback_reply(message, observations)
+            return ChatAgentStream(
+                observations=observations, chunks=iter([reply]), used_fallback=True
+            )
 
+        cache_key = self._reply_cache_key(user, message, observations, history_messages)
+        cached_reply = _REPLY_CACHE.get(cache_key, time.time())
+        if cached_reply is not None:
+            return ChatAgentStream(
+                observations=observations,
+                chunks=iter([cached_reply]),
+                used_fallback=False,
+            )
+
+        stream = ChatAgentStream(
+            observations=observations, chunks=iter(()), used_fallback=False
+        )
+        stream.chunks = self._stream_with_fallback(
+            stream, history_messages, message, observations, cache_key
+        )
+        return stream
+
+    def _stream_with_fallback(
+        self,
+        stream: ChatAgentStream,
+        history_messages: List[Dict[str, str]],
+        message: str,
+        observations: Sequence[ToolObservation],
+        cache_key: _ReplyCacheKey,
+    ) -> Iterator[str]:
+        sent: List[str] = []
+        try:
+            messages = self._format_prompt(observations, history_messages, message)
+            for chunk in self._stream_openai(messages):
+                sent.append(chunk)
+                yield chunk
+        except Exception as exc:
+            logger.warning("Falha no streaming do modelo: %s", exc)
+            stream.used_fallback = True
+            stream.error = str(exc)
+            if not sent:
+                yield self._fallback_reply(message, observations)
+        else:
+            # So respostas completas do modelo entram no cache
+            reply_text = "".join(sent).strip()
+            if reply_text:
+                _REPLY_CACHE.store(cache_key, reply_text, time.time())
+
+    @cached_property
+    def _completion_params(self) -> Dict[str, Any]:
+        # Parte fixa do corpo do /chat/completions, montada uma vez por agente
         llm_settings = self._settings.llm
+        return {
+            "model": llm_settings.model,
+            "temperature": llm_settings.temperature,
+            "max_tokens": llm_settings.max_output_tokens,
+        }
+
+    def _invoke_openai(self, messages: List[Dict[str, str]]) -> str:
+        if not self._http_client:
+            raise RuntimeError("HTTP client for OpenAI not configured")
+
         response = self._http_client.post(
             "/chat/completions",
-            json={
-                "model": llm_settings.model,
-                "messages": payload,
-                "temperature": llm_settings.temperature,
-                "max_tokens": llm_settings.max_output_tokens,
-            },
+            json={**self._completion_params, "messages": messages},
         )
         response.raise_for_status()
         data = response.json()
@@ -651,6 +1024,30 @@ class ChatAgent:
         content = message.get("content") or ""
         return content.strip()
 
+    def _stream_openai(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Le o SSE do /chat/completions (stream=true) e devolve os deltas de texto."""
+        if not self._http_client:
+            raise RuntimeError("HTTP client for OpenAI not configured")
+
+        with self._http_client.stream(
+            "POST",
+            "/chat/completions",
+            json={**self._completion_params, "messages": messages, "stream": True},
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices") or []
+                if not choices:
+                    continue
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
     def _fallback_reply(
         self, message: str, observations: Sequence[ToolObservation]
     ) -> str:
@@ -661,31 +1058,33 @@ class ChatAgent:
             ),
         ]
 
-        portfolio_obs = next(
-            (obs for obs in observations if obs.name == "portfolio_overview"), None
-        )
-        if portfolio_obs and isinstance(portfolio_obs.data, dict):
-            totals = portfolio_obs.data.get("totals") or {}
+        # Uma passada indexa as observacoes; a primeira de cada nome prevalece
+        by_name: Dict[str, ToolObservation] = {}
+        for obs in observations:
+            by_name.setdefault(obs.name, obs)
+        fmt_brl = _format_currency_brl
+        fmt_pct = _format_percentage
+
+        portfolio_obs = by_name.get("portfolio_overview")
+        portfolio_data = portfolio_obs.data if portfolio_obs else None
+        if isinstance(portfolio_data, dict):
+            totals = portfolio_data.get("totals") or {}
             current_value = totals.get("current_value")
             pnl_abs = totals.get("pnl_abs")
             pnl_pct = totals.get("pnl_pct")
             resumo = []
-            if isinstance(current_value, (int, float)):
-                resumo.append(
-                    f"valor atual {_format_currency_brl(float(current_value))}"
-                )
-            if isinstance(pnl_abs, (int, float)):
-                delta = _format_currency_brl(float(pnl_abs))
-                if isinstance(pnl_pct, (int, float)):
-                    resumo.append(
-                        f"resultado {delta} ({_format_percentage(float(pnl_pct))})"
-                    )
+            if isinstance(current_value, _NUMBER_TYPES):
+                resumo.append(f"valor atual {fmt_brl(float(current_value))}")
+            if isinstance(pnl_abs, _NUMBER_TYPES):
+                delta = fmt_brl(float(pnl_abs))
+                if isinstance(pnl_pct, _NUMBER_TYPES):
+                    resumo.append(f"resultado {delta} ({fmt_pct(float(pnl_pct))})")
                 else:
                     resumo.append(f"resultado {delta}")
             if resumo:
                 lines.append(f"- Carteira: {' | '.join(resumo)}.")
 
-            holdings = portfolio_obs.data.get("holdings") or []
+            holdings = portfolio_data.get("holdings") or []
             if isinstance(holdings, list) and holdings:
                 top_holdings = holdings[:3]
                 linhas_holdings = []
@@ -694,49 +1093,45 @@ class ChatAgent:
                     value = item.get("current_value")
                     pnl = item.get("pnl_pct")
                     partes = []
-                    if isinstance(value, (int, float)):
-                        partes.append(_format_currency_brl(float(value)))
-                    if isinstance(pnl, (int, float)):
-                        partes.append(_format_percentage(float(pnl)))
+                    if isinstance(value, _NUMBER_TYPES):
+                        partes.append(fmt_brl(float(value)))
+                    if isinstance(pnl, _NUMBER_TYPES):
+                        partes.append(fmt_pct(float(pnl)))
                     resumo_item = " | ".join(partes) if partes else "sem dados"
                     linhas_holdings.append(f"  - {symbol}: {resumo_item}")
                 if linhas_holdings:
                     lines.append("- Principais posicoes:")
                     lines.extend(linhas_holdings)
 
-            classes = portfolio_obs.data.get("class_breakdown") or []
+            classes = portfolio_data.get("class_breakdown") or []
             if isinstance(classes, list) and classes:
                 top_classes = classes[:3]
                 resumo_classes: List[str] = []
                 for item in top_classes:
                     share = item.get("share_pct")
-                    if not isinstance(share, (int, float)):
+                    if not isinstance(share, _NUMBER_TYPES):
                         continue
                     label = item.get("label", item.get("class", "Classe"))
-                    resumo_classes.append(
-                        f"  - {label}: {_format_percentage(float(share))}"
-                    )
+                    resumo_classes.append(f"  - {label}: {fmt_pct(float(share))}")
                 if resumo_classes:
                     lines.append("- Distribuicao por classe:")
                     lines.extend(resumo_classes)
 
-        risk_obs = next(
-            (obs for obs in observations if obs.name == "risk_profile"), None
-        )
-        if risk_obs and isinstance(risk_obs.data, dict):
-            profile = risk_obs.data.get("profile")
-            score = risk_obs.data.get("score")
+        risk_obs = by_name.get("risk_profile")
+        risk_data = risk_obs.data if risk_obs else None
+        if isinstance(risk_data, dict):
+            profile = risk_data.get("profile")
+            score = risk_data.get("score")
             if profile:
                 trecho = f"perfil {profile}"
-                if isinstance(score, (int, float)):
+                if isinstance(score, _NUMBER_TYPES):
                     trecho += f" (score {score})"
                 lines.append(f"- Perfil de risco: {trecho}.")
 
-        news_obs = next(
-            (obs for obs in observations if obs.name == "market_news"), None
-        )
-        if news_obs and isinstance(news_obs.data, dict):
-            itens = news_obs.data.get("items") or []
+        news_obs = by_name.get("market_news")
+        news_data = news_obs.data if news_obs else None
+        if isinstance(news_data, dict):
+            itens = news_data.get("items") or []
             if isinstance(itens, list) and itens:
                 lines.append("- Noticias recentes:")
                 for item in itens[:2]:
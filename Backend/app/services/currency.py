@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Optional
 
 ALIASES = {
@@ -10,7 +11,26 @@ ALIASES = {
     "BR$": "BRL",
 }
 
+# Sufixo do ticker -> moeda; os sufixos tem tamanhos distintos e sao testados do
+# mais longo ao mais curto (um "-BTC" ganha de "BTC", que por sua vez nao colide)
+_SUFFIX_MAP = {
+    "-USD": "USD",
+    "=USD": "USD",
+    "/USD": "USD",
+    "-EUR": "EUR",
+    "=EUR": "EUR",
+    "/EUR": "EUR",
+    "-BTC": "BTC",
+    "BTC": "BTC",
+    ".SA": "BRL",
+    "-BRL": "BRL",
+    "-CAD": "CAD",
+    "-GBP": "GBP",
+}
+_SUFFIX_LENS = sorted({len(suffix) for suffix in _SUFFIX_MAP}, reverse=True)
+
 
+@lru_cache(maxsize=4096)
 def normalize_currency_code(
     raw: Optional[str],
     symbol: Optional[str] = None,
@@ -30,17 +50,9 @@ def normalize_currency_code(
 
     if symbol:
         sym = symbol.strip().upper()
-        if sym.endswith("-USD") or sym.endswith("=USD") or sym.endswith("/USD"):
-            return "USD"
-        if sym.endswith("-EUR") or sym.endswith("=EUR") or sym.endswith("/EUR"):
-            return "EUR"
-        if sym.endswith("-BTC") or sym.endswith("BTC"):
-            return "BTC"
-        if sym.endswith(".SA") or sym.endswith("-BRL"):
-            return "BRL"
-        if sym.endswith("-CAD"):
-            return "CAD"
-        if sym.endswith("-GBP"):
-            return "GBP"
+        for length in _SUFFIX_LENS:
+            currency = _SUFFIX_MAP.get(sym[-length:])
+            if currency:
+                return currency
 
     return default.upper()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import threading
 import time
 from datetime import datetime, timezone
 from typing import Dict, Tuple
@@ -9,7 +10,11 @@ import yfinance as yf
 
 logger = logging.getLogger(__name__)
 
+# Cache compartilhado entre requisicoes (threads do FastAPI); o fx_cache das rotas
+# continua como atalho por requisicao, mas os misses caem aqui e nao na rede.
 _FX_CACHE: Dict[str, Tuple[float, float, datetime]] = {}
+_FX_CACHE_LOCK = threading.Lock()
+_FX_CACHE_MAXSIZE = 64
 _FX_TTL_SECONDS = 5 * 60  # 5 minutes
 
 
@@ -25,6 +30,34 @@ def _now_utc() -> datetime:
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
+def _cache_get(key: str, now_ts: float) -> Tuple[float, datetime] | None:
+    with _FX_CACHE_LOCK:
+        cached = _FX_CACHE.get(key)
+        if not cached:
+            return None
+        rate, cached_ts, ts = cached
+        if now_ts - cached_ts > _FX_TTL_SECONDS:
+            _FX_CACHE.pop(key, None)
+            return None
+        return rate, ts
+
+
+def _cache_store(key: str, rate: float, now_ts: float, retrieved_at: datetime) -> None:
+    with _FX_CACHE_LOCK:
+        if key not in _FX_CACHE and len(_FX_CACHE) >= _FX_CACHE_MAXSIZE:
+            expired = [
+                k
+                for k, (_, cached_ts, _) in _FX_CACHE.items()
+                if now_ts - cached_ts > _FX_TTL_SECONDS
+            ]
+            for k in expired:
+                _FX_CACHE.pop(k, None)
+            if len(_FX_CACHE) >= _FX_CACHE_MAXSIZE:
+                oldest = min(_FX_CACHE, key=lambda k: _FX_CACHE[k][1])
+                _FX_CACHE.pop(oldest, None)
+        _FX_CACHE[key] = (rate, now_ts, retrieved_at)
+
+
 def get_fx_rate(base: str, quote: str) -> Tuple[float, datetime]:
     """
     Returns the conversion rate to convert 1 unit of `base` into `quote`.
@@ -35,12 +68,10 @@ def get_fx_rate(base: str, quote: str) -> Tuple[float, datetime]:
         return 1.0, _now_utc()
 
     key = _cache_key(base, quote)
-    cached = _FX_CACHE.get(key)
     now_ts = time.time()
+    cached = _cache_get(key, now_ts)
     if cached:
-        rate, cached_ts, ts = cached
-        if now_ts - cached_ts <= _FX_TTL_SECONDS:
-            return rate, ts
+        return cached
 
     ticker_symbol = f"{base}{quote}=X"
     ticker = yf.Ticker(ticker_symbol)
@@ -62,5 +93,5 @@ def get_fx_rate(base: str, quote: str) -> Tuple[float, datetime]:
         raise FxRateNotFoundError(ticker_symbol)
 
     retrieved_at = _now_utc()
-    _FX_CACHE[key] = (float(rate), now_ts, retrieved_at)
+    _cache_store(key, float(rate), now_ts, retrieved_at)
     return float(rate), retrieved_at
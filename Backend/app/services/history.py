@@ -1,33 +1,39 @@
 from __future__ import annotations
 
 from datetime import date, timedelta
-from typing import Iterable
+from typing import Iterable, Optional
 
+import numpy as np
 import yfinance as yf
-from sqlalchemy import and_
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
 
 from app.db.models import Asset, AssetPrice
 
 
-def _upsert_price_row(
+def _existing_price_ids(
     db: Session,
-    asset_id: int,
-    target_date: date,
-    close_value: float,
-) -> AssetPrice:
-    row = (
-        db.query(AssetPrice)
-        .filter(and_(AssetPrice.asset_id == asset_id, AssetPrice.date == target_date))
-        .first()
+    asset_ids: list[int],
+    start_date: date,
+    end_date: date,
+) -> dict[int, dict[date, int]]:
+    """
+    Carrega em um unico SELECT ... IN (...) os ids das cotacoes ja gravadas no
+    intervalo, agrupados por ativo e data.
+    """
+    existing: dict[int, dict[date, int]] = {asset_id: {} for asset_id in asset_ids}
+    if not asset_ids:
+        return existing
+    rows = db.execute(
+        select(AssetPrice.id, AssetPrice.asset_id, AssetPrice.date).where(
+            AssetPrice.asset_id.in_(asset_ids),
+            AssetPrice.date >= start_date,
+            AssetPrice.date <= end_date,
+        )
     )
-    if row:
-        row.close = close_value
-        return row
-
-    row = AssetPrice(asset_id=asset_id, date=target_date, close=close_value)
-    db.add(row)
-    return row
+    for pk, asset_id, d in rows:
+        existing[asset_id][d] = pk
+    return existing
 
 
 def ensure_price_history(
@@ -35,6 +41,7 @@ def ensure_price_history(
     asset: Asset,
     start_date: date,
     end_date: date,
+    existing: Optional[dict[date, int]] = None,
 ) -> None:
     """
     Garante que existam cotações diárias para o ativo no intervalo solicitado.
@@ -44,21 +51,13 @@ def ensure_price_history(
         return
 
     # Já existe histórico suficiente?
+    if existing is None:
+        existing = _existing_price_ids(db, [asset.id], start_date, end_date)[asset.id]
     missing_dates: set[date] = set()
-    existing_rows = (
-        db.query(AssetPrice.date)
-        .filter(
-            AssetPrice.asset_id == asset.id,
-            AssetPrice.date >= start_date,
-            AssetPrice.date <= end_date,
-        )
-        .all()
-    )
-    existing_dates = {row.date for row in existing_rows}
 
     current = start_date
     while current <= end_date:
-        if current not in existing_dates:
+        if current not in existing:
             missing_dates.add(current)
         current += timedelta(days=1)
 
@@ -72,21 +71,30 @@ def ensure_price_history(
         auto_adjust=False,
     )
 
-    if history.empty:
+    if history.empty or "Close" not in history:
         return
 
-    for idx, row in history.iterrows():
-        dt = idx.to_pydatetime().date()
-        if dt < start_date or dt > end_date:
-            continue
-        close_val = row.get("Close")
-        if close_val is None:
-            continue
-        try:
-            close = float(close_val)
-        except (TypeError, ValueError):
-            continue
-        _upsert_price_row(db, asset.id, dt, close)
+    # Extracao vetorizada da coluna Close (sem iterrows): NaN e datas fora do
+    # intervalo sao descartados em uma unica mascara.
+    dates = history.index.date
+    values = history["Close"].to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = np.isfinite(values) & (dates >= start_date) & (dates <= end_date)
+    closes = dict(zip(dates[mask].tolist(), values[mask].tolist()))
+
+    # Grava em lote: UPDATE por chave primaria para as datas existentes e
+    # INSERT (executemany) para as novas, sem um SELECT por linha.
+    updates = [
+        {"id": existing[d], "close": c} for d, c in closes.items() if d in existing
+    ]
+    inserts = [
+        {"asset_id": asset.id, "date": d, "close": c}
+        for d, c in closes.items()
+        if d not in existing
+    ]
+    if updates:
+        db.execute(update(AssetPrice), updates)
+    if inserts:
+        db.execute(insert(AssetPrice), inserts)
 
 
 def ensure_history_for_assets(
@@ -95,5 +103,14 @@ def ensure_history_for_assets(
     start_date: date,
     end_date: date,
 ) -> None:
-    for asset in assets:
-        ensure_price_history(db, asset, start_date, end_date)
+    # Um ativo repetido reutilizaria o mapa de datas ja desatualizado
+    unique = list({asset.id: asset for asset in assets}.values())
+    if start_date > end_date or not unique:
+        return
+    existing = _existing_price_ids(
+        db, [asset.id for asset in unique], start_date, end_date
+    )
+    for asset in unique:
+        ensure_price_history(
+            db, asset, start_date, end_date, existing=existing[asset.id]
+        )
@@ -3,8 +3,11 @@ import logging
 import math
 import re
 import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, List, Optional, Sequence, Set
 
 import yfinance as yf
@@ -16,50 +19,55 @@ _CACHE_LOCK = threading.RLock()
 _CACHE_TTL = timedelta(minutes=30)
 _CacheEntry = tuple[datetime, list[dict]]
 _CACHE: Dict[str, _CacheEntry] = {}
+NEWS_FETCH_WORKERS = 8
 
 # Basic lexicon for quick rule-based sentiment detection (pt/en blended)
-POSITIVE_WORDS = {
-    "alta",
-    "ganho",
-    "otimista",
-    "positivo",
-    "subida",
-    "recorde",
-    "avanca",
-    "forte",
-    "melhora",
-    "acima",
-    "cresce",
-    "surge",
-    "bull",
-    "rally",
-    "valorizacao",
-    "expande",
-    "supera",
-    "progresso",
-    "sucesso",
-    "lucro",
-    "profit",
-    "up",
-    "beat",
-}
-NEGATIVE_WORDS = {
-    "queda",
-    "cai",
-    "despenca",
-    "negativo",
-    "perda",
-    "risco",
-    "alerta",
-    "crise",
-    "abaixo",
-    "derrota",
-    "fraqueza",
-    "baixa",
-    "pressao",
-    "volatil",
-    "recuo",
-}
+POSITIVE_WORDS = frozenset(
+    {
+        "alta",
+        "ganho",
+        "otimista",
+        "positivo",
+        "subida",
+        "recorde",
+        "avanca",
+        "forte",
+        "melhora",
+        "acima",
+        "cresce",
+        "surge",
+        "bull",
+        "rally",
+        "valorizacao",
+        "expande",
+        "supera",
+        "progresso",
+        "sucesso",
+        "lucro",
+        "profit",
+        "up",
+        "beat",
+    }
+)
+NEGATIVE_WORDS = frozenset(
+    {
+        "queda",
+        "cai",
+        "despenca",
+        "negativo",
+        "perda",
+        "risco",
+        "alerta",
+        "crise",
+        "abaixo",
+        "derrota",
+        "fraqueza",
+        "baixa",
+        "pressao",
+        "volatil",
+        "recuo",
+    }
+)
 
 SOURCE_CONFIDENCE = {
     "reuters": 1.0,
@@ -279,14 +287,18 @@ def _merge_news(existing: NormalizedNews, incoming: NormalizedNews) -> Normalize
     return existing
 
 
+@lru_cache(maxsize=1024)
 def _analyse_sentiment(title: str, summary: Optional[str]) -> tuple[str, float, float]:
     text = f"{title or ''} {summary or ''}".lower()
     tokens = WORD_RE.findall(text)
     if not tokens:
         return "neutro", 0.5, 0.0
 
-    positives = sum(1 for token in tokens if token in POSITIVE_WORDS)
-    negatives = sum(1 for token in tokens if token in NEGATIVE_WORDS)
+    # Contagem em uma unica passada; so os termos do lexico presentes no texto
+    counts = Counter(tokens)
+    present = counts.keys()
+    positives = sum(counts[word] for word in POSITIVE_WORDS & present)
+    negatives = sum(counts[word] for word in NEGATIVE_WORDS & present)
     hits = positives + negatives
     if hits == 0:
         return "neutro", 0.5, 0.0
@@ -333,6 +345,18 @@ def _symbol_variants(symbol: str) -> List[str]:
     return list(dict.fromkeys(v for v in variants if v))
 
 
+def _fetch_variants(
+    variants: Sequence[str], max_workers: int = NEWS_FETCH_WORKERS
+) -> Dict[str, list[dict]]:
+    # Busca cada variante distinta uma unica vez, em paralelo (I/O bound)
+    if not variants:
+        return {}
+    workers = max(1, min(max_workers, len(variants)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_safe_fetch_symbol_news, variants))
+    return dict(zip(variants, results))
+
+
 def fetch_news_for_symbols(
     symbols: Sequence[str],
     *,
@@ -363,10 +387,21 @@ def fetch_news_for_symbols(
     stats_raw: Dict[str, int] = {}
     stats_after_cutoff: Dict[str, int] = {}
 
+    variants_by_symbol = {sym: _symbol_variants(sym) for sym in symbols_upper}
+    fetched = _fetch_variants(
+        list(
+            dict.fromkeys(
+                variant
+                for variants in variants_by_symbol.values()
+                for variant in variants
+            )
+        )
+    )
+
     for sym in symbols_upper:
         total_raw = 0
-        for variant in _symbol_variants(sym):
-            raw_items = _safe_fetch_symbol_news(variant)
+        for variant in variants_by_symbol[sym]:
+            raw_items = fetched[variant]
             total_raw += len(raw_items)
             for payload in raw_items:
                 normalized = _normalize_single(sym, payload)
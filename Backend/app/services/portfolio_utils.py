@@ -1,4 +1,5 @@
 from datetime import datetime, timezone
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from app.db.models import Portfolio, Transaction
@@ -21,8 +22,7 @@ def get_or_create_default_portfolio(db: Session, user_id: int) -> Portfolio:
     return portfolio
 
 
-def record_transaction(
-    db: Session,
+def transaction_row(
     portfolio_id: int,
     asset_id: int,
     tx_type: str,
@@ -34,27 +34,62 @@ def record_transaction(
     source: str = "auto",
     note: str | None = None,
     status: str = "active",
-) -> None:
+) -> dict | None:
+    """Monta os valores de uma transacao; None quando a quantidade e nula."""
     qty = abs(float(quantity))
     if qty <= 0:
-        return
+        return None
 
     price = float(price)
     when = executed_at or datetime.now(timezone.utc)
     if when.tzinfo is not None:
         when = when.astimezone(timezone.utc).replace(tzinfo=None)
-    db.add(
-        Transaction(
-            portfolio_id=portfolio_id,
-            asset_id=asset_id,
-            type=tx_type,
-            quantity=qty,
-            price=price,
-            total=price * qty,
-            executed_at=when,
-            kind=kind,
-            source=source,
-            note=note,
-            status=status,
-        )
+    return {
+        "portfolio_id": portfolio_id,
+        "asset_id": asset_id,
+        "type": tx_type,
+        "quantity": qty,
+        "price": price,
+        "total": price * qty,
+        "executed_at": when,
+        "kind": kind,
+        "source": source,
+        "note": note,
+        "status": status,
+    }
+
+
+def record_transaction(
+    db: Session,
+    portfolio_id: int,
+    asset_id: int,
+    tx_type: str,
+    quantity: float,
+    price: float,
+    *,
+    executed_at: datetime | None = None,
+    kind: str = "trade",
+    source: str = "auto",
+    note: str | None = None,
+    status: str = "active",
+) -> None:
+    row = transaction_row(
+        portfolio_id,
+        asset_id,
+        tx_type,
+        quantity,
+        price,
+        executed_at=executed_at,
+        kind=kind,
+        source=source,
+        note=note,
+        status=status,
     )
+    if row is not None:
+        db.add(Transaction(**row))
+
+
+def record_transactions(db: Session, rows: list[dict]) -> None:
+    """Insere varias transacoes (vindas de transaction_row) em um unico INSERT."""
+    if rows:
+        db.execute(insert(Transaction), rows)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Iterable, Optional
 
 import yfinance as yf
 from sqlalchemy import and_
@@ -16,6 +17,7 @@ class QuoteNotFoundError(Exception):
 
 
 QUOTE_TTL = timedelta(minutes=5)
+QUOTE_FETCH_WORKERS = 8
 
 
 def _now_utc() -> datetime:
@@ -88,6 +90,17 @@ def needs_refresh(asset: Asset, force: bool = False) -> bool:
     return now_naive - asset.last_quote_at > QUOTE_TTL
 
 
+def _apply_quote(
+    db: Session, asset: Asset, quote: tuple[float, datetime, Optional[str]]
+) -> None:
+    price, retrieved_at, currency = quote
+    asset.last_quote_price = price
+    asset.last_quote_at = retrieved_at
+    normalized_currency = normalize_currency_code(currency, asset.symbol)
+    asset.currency = normalized_currency
+    _upsert_price_row(db, asset.id, retrieved_at, price)
+
+
 def refresh_asset_quote(db: Session, asset: Asset, *, force: bool = False) -> bool:
     """
     Refresh the stored quote for an asset if needed.
@@ -96,10 +109,39 @@ def refresh_asset_quote(db: Session, asset: Asset, *, force: bool = False) -> bo
     if not needs_refresh(asset, force=force):
         return False
 
-    price, retrieved_at, currency = fetch_latest_quote(asset.symbol)
-    asset.last_quote_price = price
-    asset.last_quote_at = retrieved_at
-    normalized_currency = normalize_currency_code(currency, asset.symbol)
-    asset.currency = normalized_currency
-    _upsert_price_row(db, asset.id, retrieved_at, price)
+    _apply_quote(db, asset, fetch_latest_quote(asset.symbol))
+    return True
+
+
+def refresh_asset_quotes(
+    db: Session,
+    assets: Iterable[Asset],
+    *,
+    force: bool = False,
+    max_workers: int = QUOTE_FETCH_WORKERS,
+) -> bool:
+    """
+    Refresh several assets at once: quotes are fetched concurrently and then
+    persisted sequentially on the caller's session (which is not thread-safe).
+    Raises QuoteNotFoundError for the first asset, in input order, without quote.
+    Returns True when at least one new fetch was performed.
+    """
+    pending = [asset for asset in assets if needs_refresh(asset, force=force)]
+    if not pending:
+        return False
+
+    def _fetch(symbol: str):
+        try:
+            return fetch_latest_quote(symbol)
+        except QuoteNotFoundError as exc:
+            return exc
+
+    workers = max(1, min(max_workers, len(pending)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_fetch, [asset.symbol for asset in pending]))
+
+    for asset, result in zip(pending, results):
+        if isinstance(result, QuoteNotFoundError):
+            raise result
+        _apply_quote(db, asset, result)
     return True
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
+from bisect import bisect_left
 from dataclasses import dataclass
 from typing import Dict, List, Sequence, Tuple
 
-
 QUESTIONNAIRE_VERSION = "2025-10-31"
 SCORE_VERSION = "2025-10-31"
 GROUP_TOLERANCE = "Tolerância a risco"
@@ -201,6 +201,8 @@ QUESTION_IDS = {q.id for q in QUESTIONS}
 TOTAL_WEIGHT = sum(q.weight for q in QUESTIONS)
 
 PROFILE_ORDER = ("conservador", "moderado", "arrojado")
+# Limites superiores (inclusivos) de score para cada perfil em PROFILE_ORDER
+PROFILE_SCORE_THRESHOLDS = (40, 70)
 
 
 @dataclass
@@ -220,11 +222,7 @@ def _normalize_answer(value: int) -> float:
 
 
 def _score_to_profile(score: int) -> str:
-    if score <= 40:
-        return "conservador"
-    if score <= 70:
-        return "moderado"
-    return "arrojado"
+    return PROFILE_ORDER[bisect_left(PROFILE_SCORE_THRESHOLDS, score)]
 
 
 def _clamp_profile(profile: str, max_profile: str) -> str:
@@ -239,8 +237,9 @@ def _clamp_profile(profile: str, max_profile: str) -> str:
 
 
 def compute_risk_profile(answers: Dict[str, int]) -> RiskComputation:
-    missing = QUESTION_IDS - set(answers.keys())
-    extra = set(answers.keys()) - QUESTION_IDS
+    provided = answers.keys()
+    missing = QUESTION_IDS - provided
+    extra = provided - QUESTION_IDS
     if missing or extra:
         raise InvalidRiskAnswer(
             f"Respostas inválidas. Faltando: {sorted(missing)}. Desconhecidas: {sorted(extra)}"
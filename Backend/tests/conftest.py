@@ -58,6 +58,27 @@ def _override_get_db(db_session):
     return _get_db
 
 
+@pytest.fixture(autouse=True)
+def _reset_rebalance_cache():
+    # O plano memoizado e global ao processo; cada teste parte do zero
+    from app.routes import portfolio as portfolio_route
+
+    portfolio_route._REBALANCE_CACHE.clear()
+    yield
+    portfolio_route._REBALANCE_CACHE.clear()
+
+
+@pytest.fixture(autouse=True)
+def _reset_chat_agent_caches():
+    from app.services import chat_agent
+
+    chat_agent._NEWS_CACHE.clear()
+    chat_agent._REPLY_CACHE.clear()
+    yield
+    chat_agent._NEWS_CACHE.clear()
+    chat_agent._REPLY_CACHE.clear()
+
+
 @pytest.fixture
 def db_session():
     Base.metadata.drop_all(bind=engine)
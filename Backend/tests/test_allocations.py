@@ -2,7 +2,10 @@ import pytest
 
 from app.services.allocations import (
     _normalize,
+    class_label,
     get_allocation_profile,
+    get_allocation_response,
+    list_allocation_profiles,
     normalize_asset_class,
 )
 
@@ -27,13 +30,51 @@ def test_normalize_weights_rejects_invalid():
         ("XPML11", "", "fii"),  # empty class but endswith 11
         ("BTC", "crypto", "cripto"),
         ("AAPL", "stock", "acao"),
+        ("SPY", "fund", "etf"),
+        ("ETFX34", None, "etf"),
+        ("AAPL34", None, "acao"),
+        ("PETR4.SA", "", "acao"),
+        ("ETH-USDT", None, "cripto"),
+        ("btc-usd", "", "cripto"),
     ],
 )
 def test_normalize_asset_class(symbol: str, raw_class: str, expected: str):
     assert normalize_asset_class(symbol, raw_class) == expected
 
 
+def test_class_label_uses_registered_label_or_title_case():
+    assert class_label("fii") == "FIIs"
+    assert class_label("renda_fixa") == "Renda_Fixa"
+
+
+def test_normalize_asset_class_is_memoized():
+    normalize_asset_class.cache_clear()
+    assert normalize_asset_class("HGLG11", None) == "fii"
+    assert normalize_asset_class("HGLG11", None) == "fii"
+    assert normalize_asset_class.cache_info().hits == 1
+
+
 def test_get_allocation_profile_fallbacks_to_moderate():
     profile = get_allocation_profile("perfil-invalido")
     assert profile.profile == "moderado"
     assert set(profile.weights.keys()) == {"etf", "acao", "fii", "cripto"}
+
+
+def test_allocation_response_matches_profile_and_falls_back():
+    profile = get_allocation_profile("arrojado")
+    response = get_allocation_response("ARROJADO")
+    assert response == {
+        "profile": profile.profile,
+        "weights": profile.weights,
+        "bands": profile.bands,
+        "description": profile.description,
+    }
+    assert get_allocation_response("arrojado") is get_allocation_response("arrojado")
+    assert get_allocation_response("desconhecido")["profile"] == "moderado"
+    assert get_allocation_response(None)["profile"] == "moderado"
+
+
+def test_profile_weights_are_already_normalized():
+    for profile in list_allocation_profiles():
+        assert sum(profile.weights.values()) == pytest.approx(1.0, abs=1e-9)
+        assert _normalize(profile.weights) == pytest.approx(profile.weights)
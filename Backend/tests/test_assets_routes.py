@@ -16,6 +16,8 @@ def test_create_and_get_asset(client):
     payload = resp.json()
     assert payload["symbol"] == "TEST3"
     assert payload["currency"] == "USD"
+    assert isinstance(payload["id"], int)
+    assert (payload["lot_size"], payload["supports_fractional"]) == (1.0, True)
 
     # list all
     listing = client.get("/api/assets")
@@ -1,7 +1,8 @@
+import threading
 from types import SimpleNamespace
 
 from app.services import chat_agent
-from app.db.models import User
+from app.db.models import Asset, Holding, Portfolio, User
 
 
 def test_generate_reply_fallback_without_llm(db_session, monkeypatch):
@@ -16,9 +17,79 @@ def test_generate_reply_fallback_without_llm(db_session, monkeypatch):
     )
     # remove LLM to force fallback
     agent = chat_agent.ChatAgent()
-    agent._llm = None  # type: ignore
-    agent._prompt = None  # type: ignore
+    agent._http_client = None
 
     resp = agent.generate_reply(db=db_session, user=user, message="oi", history=[])
     assert resp.reply
     assert resp.used_fallback is True
+
+
+def test_generate_reply_fetches_news_off_the_request_thread(db_session, monkeypatch):
+    user = User(name="Chat", email="chat-news@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    portfolio = Portfolio(user_id=user.id, name="P")
+    assets = [Asset(symbol=s, name=s, class_="acao") for s in ("NWS1", "NWS2")]
+    db_session.add_all(
+        [portfolio, *assets]
+        + [
+            Holding(portfolio=portfolio, asset=a, quantity=1.0, avg_price=1.0)
+            for a in assets + assets[:1]
+        ]
+    )
+    db_session.commit()
+
+    seen = {}
+
+    def fake_news(symbols):
+        seen["symbols"] = symbols
+        seen["thread"] = threading.get_ident()
+        return chat_agent.ToolObservation(
+            name="market_news", description="", content="", data={"items": []}
+        )
+
+    monkeypatch.setattr(chat_agent, "_build_news_observation", fake_news)
+    agent = chat_agent.ChatAgent()
+    agent._http_client = None
+
+    resp = agent.generate_reply(db=db_session, user=user, message="oi", history=[])
+    assert [obs.name for obs in resp.observations] == [
+        "portfolio_overview",
+        "risk_profile",
+        "transactions_summary",
+        "market_news",
+    ]
+    assert seen["symbols"] == ["NWS1", "NWS2"]
+    assert resp.observations[0].data["portfolio"]["symbols"] == ["NWS1", "NWS2"]
+    assert seen["thread"] != threading.get_ident()
+
+
+def test_fallback_reply_summarizes_first_observation_of_each_kind():
+    obs = chat_agent.ToolObservation
+    observations = [
+        obs(
+            name="portfolio_overview",
+            description="",
+            content="",
+            data={
+                "totals": {"current_value": 1500.0, "pnl_abs": 50, "pnl_pct": 3.5},
+                "holdings": [{"symbol": "AAA", "current_value": 1000.0}],
+                "class_breakdown": [{"label": "Acoes", "share_pct": 100.0}],
+            },
+        ),
+        obs(name="risk_profile", description="", content="", data={"profile": "x"}),
+        obs(
+            name="risk_profile",
+            description="",
+            content="",
+            data={"profile": "ignorado"},
+        ),
+        obs(name="market_news", description="", content="", data={"items": []}),
+    ]
+    reply = chat_agent.ChatAgent()._fallback_reply("oi", observations)
+    assert "- Carteira: valor atual R$ 1.500,00 | resultado R$ 50,00 (3.50%)." in reply
+    assert "  - AAA: R$ 1.000,00" in reply
+    assert "  - Acoes: 100.00%" in reply
+    assert "- Perfil de risco: perfil x." in reply
+    assert "ignorado" not in reply
+    assert "Noticias" not in reply
@@ -1,3 +1,4 @@
+import json
 from types import SimpleNamespace
 
 import pytest
@@ -5,29 +6,6 @@ import pytest
 from app.services import chat_agent
 
 
-class DummyHuman:
-    def __init__(self, content: str):
-        self.content = content
-
-
-class DummyAI:
-    def __init__(self, content: str):
-        self.content = content
-
-
-class DummySystem:
-    def __init__(self, content: str):
-        self.content = content
-
-
-class DummyPromptValue:
-    def __init__(self, messages):
-        self._messages = messages
-
-    def to_messages(self):
-        return self._messages
-
-
 class DummyResponse:
     def __init__(self, json_payload):
         self._payload = json_payload
@@ -85,36 +63,237 @@ def test_create_http_client_skips_when_api_key_missing(monkeypatch):
     assert agent._create_http_client() is None
 
 
-def test_invoke_openai_happy_path(monkeypatch):
-    # força classes de mensagens simples
-    monkeypatch.setattr(chat_agent, "HumanMessage", DummyHuman)
-    monkeypatch.setattr(chat_agent, "AIMessage", DummyAI)
-    monkeypatch.setattr(chat_agent, "SystemMessage", DummySystem)
-    monkeypatch.setattr(chat_agent, "BaseMessage", object)
+def test_create_http_client_is_shared_between_agents(monkeypatch):
+    monkeypatch.setattr(chat_agent, "_LLM_CLIENTS", {})
+    first = object.__new__(chat_agent.ChatAgent)
+    first._settings = _base_settings()
+    second = object.__new__(chat_agent.ChatAgent)
+    second._settings = _base_settings()
+
+    client = first._create_http_client()
+    try:
+        assert second._create_http_client() is client
+        assert str(client.base_url) == "https://api.test"
+        assert client.headers["Authorization"] == "Bearer test-key"
+    finally:
+        client.close()
 
+
+def test_invoke_openai_happy_path():
     agent = object.__new__(chat_agent.ChatAgent)
     agent._settings = _base_settings()
     client = DummyHttpClient({"choices": [{"message": {"content": " resposta "}}]})
     agent._http_client = client
 
-    prompt_value = DummyPromptValue([DummySystem("s"), DummyHuman("u"), DummyAI("a")])
+    messages = [
+        {"role": "system", "content": "s"},
+        {"role": "user", "content": "u"},
+        {"role": "assistant", "content": "a"},
+    ]
 
-    reply = agent._invoke_openai(prompt_value)
+    reply = agent._invoke_openai(messages)
     assert reply == "resposta"
     assert client.last_json["messages"][0]["role"] == "system"
+    assert client.last_json["model"] == "gpt-test"
+    assert client.last_json["max_tokens"] == 50
 
+    params = agent._completion_params
+    agent._invoke_openai(messages)
+    assert agent._completion_params is params
 
-def test_invoke_openai_requires_choices(monkeypatch):
-    monkeypatch.setattr(chat_agent, "HumanMessage", DummyHuman)
-    monkeypatch.setattr(chat_agent, "AIMessage", DummyAI)
-    monkeypatch.setattr(chat_agent, "SystemMessage", DummySystem)
-    monkeypatch.setattr(chat_agent, "BaseMessage", object)
 
+def test_invoke_openai_requires_choices():
     agent = object.__new__(chat_agent.ChatAgent)
     agent._settings = _base_settings()
     agent._http_client = DummyHttpClient({"choices": []})
 
-    prompt_value = DummyPromptValue([DummyHuman("hi")])
-
     with pytest.raises(ValueError):
-        agent._invoke_openai(prompt_value)
+        agent._invoke_openai([{"role": "user", "content": "hi"}])
+
+
+def test_format_prompt_builds_chat_completion_messages():
+    agent = object.__new__(chat_agent.ChatAgent)
+    observations = [
+        chat_agent.ToolObservation(
+            name="risk_profile", description="Perfil", content="moderado", data={}
+        )
+    ]
+    history = chat_agent._convert_history_to_payload(
+        [
+            {"role": "user", "content": "antes"},
+            SimpleNamespace(role="assistant", content="resposta"),
+            {"role": "tool", "content": "ignorada"},
+            {"role": "user", "content": ""},
+        ]
+    )
+
+    messages = agent._format_prompt(observations, history, "agora")
+    assert messages[0] == {"role": "system", "content": chat_agent.SYSTEM_PROMPT}
+    assert messages[1] == {
+        "role": "system",
+        "content": "Contexto estruturado coletado:\n\n[risk_profile] Perfil\nmoderado",
+    }
+    assert messages[2:] == [
+        {"role": "user", "content": "antes"},
+        {"role": "assistant", "content": "resposta"},
+        {"role": "user", "content": "agora"},
+    ]
+
+
+class DummyStreamResponse:
+    def __init__(self, lines, fail_after=None):
+        self._lines = lines
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        return None
+
+    def iter_lines(self):
+        for idx, line in enumerate(self._lines):
+            if self._fail_after is not None and idx >= self._fail_after:
+                raise RuntimeError("conexao caiu")
+            yield line
+
+
+class DummyStreamClient:
+    def __init__(self, response):
+        self.response = response
+        self.last_json = None
+
+    def stream(self, method, url, json):
+        self.last_json = json
+        return self.response
+
+
+def _streaming_agent(monkeypatch, response):
+    agent = object.__new__(chat_agent.ChatAgent)
+    agent._settings = _base_settings()
+    agent._http_client = DummyStreamClient(response)
+    monkeypatch.setattr(
+        agent, "_prepare_turn", lambda db, user, message, history: ([], [])
+    )
+    monkeypatch.setattr(agent, "_fallback_reply", lambda message, obs: "resumo local")
+    return agent
+
+
+def _sse(content):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+def test_stream_reply_yields_model_deltas(monkeypatch):
+    response = DummyStreamResponse(
+        [_sse("Ol"), "", ": keep-alive", _sse("a!"), "data: [DONE]", _sse("x")]
+    )
+    agent = _streaming_agent(monkeypatch, response)
+
+    stream = agent.stream_reply(db=None, user=SimpleNamespace(id=1), message="oi")
+    assert list(stream.chunks) == ["Ol", "a!"]
+    assert stream.used_fallback is False
+    assert agent._http_client.last_json["stream"] is True
+    assert agent._http_client.last_json["messages"][-1] == {
+        "role": "user",
+        "content": "oi",
+    }
+
+
+def test_stream_reply_falls_back_when_stream_fails_early(monkeypatch):
+    agent = _streaming_agent(monkeypatch, DummyStreamResponse([_sse("a")], 0))
+
+    stream = agent.stream_reply(db=None, user=SimpleNamespace(id=1), message="oi")
+    assert list(stream.chunks) == ["resumo local"]
+    assert stream.used_fallback is True
+    assert stream.error == "conexao caiu"
+
+    agent = _streaming_agent(monkeypatch, DummyStreamResponse([_sse("a"), ""], 1))
+    stream = agent.stream_reply(db=None, user=SimpleNamespace(id=1), message="oi")
+    assert list(stream.chunks) == ["a"]
+    assert stream.used_fallback is True
+    assert len(chat_agent._REPLY_CACHE) == 0
+
+
+def test_repeated_question_on_same_context_reuses_model_reply(monkeypatch):
+    agent = object.__new__(chat_agent.ChatAgent)
+    agent._settings = _base_settings()
+    agent._http_client = DummyHttpClient({"choices": [{"message": {"content": "r"}}]})
+    observations = [
+        chat_agent.ToolObservation(
+            name="risk_profile", description="P", content="moderado", data={}
+        )
+    ]
+    monkeypatch.setattr(
+        agent, "_prepare_turn", lambda db, user, message, history: (observations, [])
+    )
+    calls = []
+    monkeypatch.setattr(
+        agent, "_invoke_openai", lambda messages: calls.append(messages) or "r"
+    )
+    user = SimpleNamespace(id=1)
+
+    first = agent.generate_reply(db=None, user=user, message="Como  estou?")
+    second = agent.generate_reply(db=None, user=user, message="como estou? ")
+    assert (first.reply, second.reply, second.used_fallback) == ("r", "r", False)
+    assert len(calls) == 1
+
+    stream = agent.stream_reply(db=None, user=user, message="como estou?")
+    assert list(stream.chunks) == ["r"]
+
+    agent.generate_reply(db=None, user=SimpleNamespace(id=2), message="como estou?")
+    observations[0].content = "arrojado"
+    agent.generate_reply(db=None, user=user, message="como estou?")
+    assert len(calls) == 3
+
+
+def test_reply_cache_misses_when_history_differs(monkeypatch):
+    agent = object.__new__(chat_agent.ChatAgent)
+    agent._settings = _base_settings()
+    agent._http_client = DummyStreamClient(
+        DummyStreamResponse([_sse("s"), "data: [DONE]"])
+    )
+
+    def fake_prepare(db, user, message, history):
+        return [], chat_agent._convert_history_to_payload(history or [])
+
+    monkeypatch.setattr(agent, "_prepare_turn", fake_prepare)
+    calls = []
+    monkeypatch.setattr(
+        agent, "_invoke_openai", lambda messages: calls.append(messages) or "r"
+    )
+    user = SimpleNamespace(id=1)
+    about_risk = [
+        {"role": "user", "content": "Qual meu risco?"},
+        {"role": "assistant", "content": "Moderado."},
+    ]
+    about_news = [
+        {"role": "user", "content": "Alguma noticia?"},
+        {"role": "assistant", "content": "Petrobras em alta."},
+    ]
+
+    agent.generate_reply(None, user, "pode detalhar?", history=about_risk)
+    agent.generate_reply(None, user, "pode detalhar?", history=about_news)
+    stream = agent.stream_reply(None, user, "pode detalhar?", history=about_news[:1])
+    assert list(stream.chunks) == ["s"]
+    assert agent._http_client.last_json["messages"][2] == about_news[0]
+    assert len(calls) == 2
+
+    cached = agent.generate_reply(None, user, "pode detalhar?", history=about_risk)
+    assert cached.reply == "r"
+    assert len(calls) == 2
+
+
+def test_completed_stream_is_cached_for_the_next_turn(monkeypatch):
+    response = DummyStreamResponse([_sse("Ol"), _sse("a"), "data: [DONE]"])
+    agent = _streaming_agent(monkeypatch, response)
+
+    stream = agent.stream_reply(db=None, user=SimpleNamespace(id=1), message="oi")
+    assert list(stream.chunks) == ["Ol", "a"]
+
+    agent._http_client = DummyStreamClient(DummyStreamResponse([], 0))
+    again = agent.generate_reply(db=None, user=SimpleNamespace(id=1), message="oi")
+    assert again.reply == "Ola"
+    assert again.used_fallback is False
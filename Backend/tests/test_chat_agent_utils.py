@@ -1,9 +1,16 @@
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import event
+
 from app.services import chat_agent
-from app.db.models import User, Portfolio, Holding, Asset
+from app.db.models import User, Portfolio, Holding, Asset, RiskProfile, Transaction
 
 
 def test_format_helpers():
     assert chat_agent._format_currency_brl(1234.5).startswith("R$")
+    assert chat_agent._format_currency_brl(1234567.891) == "R$ 1.234.567,89"
+    assert chat_agent._format_currency_brl(-0.5) == "R$ -0,50"
     assert chat_agent._format_percentage(12.3) == "12.30%"
 
 
@@ -34,3 +41,283 @@ def test_build_portfolio_observation_with_holdings(db_session, monkeypatch):
 
     obs = chat_agent._build_portfolio_observation(db_session, user)
     assert "Carteira" in obs.content or obs.data["portfolio"] is not None
+
+
+def test_primary_portfolio_and_holding_rows_load_in_two_queries(db_session):
+    user = User(name="User", email="u3@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    portfolio = Portfolio(user_id=user.id, name="P")
+    assets = [Asset(symbol=f"LP{i}", name=f"LP{i}", class_="acao") for i in range(3)]
+    db_session.add_all(
+        [portfolio, *assets]
+        + [
+            Holding(portfolio=portfolio, asset=asset, quantity=1.0, avg_price=1.0)
+            for asset in assets
+        ]
+    )
+    db_session.commit()
+    user_id = user.id
+    db_session.expunge_all()
+
+    statements = []
+
+    def record_sql(conn, cursor, sql, *args):
+        statements.append(sql)
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", record_sql)
+    try:
+        loaded = chat_agent._load_primary_portfolio(db_session, user_id)
+        rows = chat_agent._load_holding_rows(db_session, loaded.id)
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", record_sql)
+
+    assert [row.symbol for row in rows] == ["LP0", "LP1", "LP2"]
+    assert (rows[0].quantity, rows[0].avg_price) == (1.0, 1.0)
+    assert len(statements) == 2
+    assert db_session.identity_map.keys() == {
+        db_session.identity_key(Portfolio, loaded.id)
+    }
+
+
+def test_collect_context_fetches_portfolio_and_profile_together(db_session):
+    with_both = User(name="A", email="ctx1@example.com", password_hash="x")
+    only_profile = User(name="B", email="ctx2@example.com", password_hash="x")
+    db_session.add_all([with_both, only_profile])
+    db_session.commit()
+    asset = Asset(symbol="CTX1", name="Ctx", class_="etf")
+    portfolio = Portfolio(user_id=with_both.id, name="Principal")
+    db_session.add_all(
+        [
+            asset,
+            portfolio,
+            Holding(portfolio=portfolio, asset=asset, quantity=2.0, avg_price=3.0),
+            RiskProfile(user_id=with_both.id, profile="arrojado", score=80),
+            RiskProfile(user_id=only_profile.id, profile="moderado", score=50),
+        ]
+    )
+    db_session.commit()
+    ids = (with_both.id, only_profile.id)
+    db_session.expunge_all()
+
+    statements = []
+
+    def record_sql(conn, cursor, sql, *args):
+        statements.append(sql)
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", record_sql)
+    try:
+        loaded, profile = chat_agent._collect_context(db_session, ids[0])
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", record_sql)
+    assert (loaded.name, profile.profile) == ("Principal", "arrojado")
+    assert len(statements) == 1
+    rows = chat_agent._load_holding_rows(db_session, loaded.id)
+    assert chat_agent._portfolio_symbols(rows) == ["CTX1"]
+
+    loaded, profile = chat_agent._collect_context(db_session, ids[1])
+    assert loaded is None and profile.profile == "moderado"
+    assert chat_agent._collect_context(db_session, 999999) == (None, None)
+
+
+def test_aggregate_holdings_kernel_sums_per_class_and_guards_zero_cost():
+    invested, current, per_class, values, pnl_abs, pnl_pct = (
+        chat_agent._aggregate_holdings(
+            np.array([2.0, 1.0, 3.0]),
+            np.array([10.0, 0.0, 5.0]),
+            np.array([12.0, 4.0, 5.0]),
+            np.array([0, 1, 0]),
+            3,
+        )
+    )
+    assert (invested, current) == (35.0, 43.0)
+    assert per_class.tolist() == [39.0, 4.0, 0.0]
+    assert values.tolist() == [24.0, 4.0, 15.0]
+    assert pnl_abs.tolist() == [4.0, 4.0, 0.0]
+    assert pnl_pct.tolist() == [20.0, 0.0, 0.0]
+
+
+def test_parse_rules_is_memoized_and_tolerates_bad_json():
+    chat_agent._parse_rules.cache_clear()
+    assert chat_agent._parse_rules('["a", "b"]') == ("a", "b")
+    assert chat_agent._parse_rules('["a", "b"]') == ("a", "b")
+    assert chat_agent._parse_rules.cache_info().hits == 1
+    assert chat_agent._parse_rules("{}") == ()
+    assert chat_agent._parse_rules("not json") is None
+
+
+def test_risk_profile_observation_lists_rules(db_session):
+    user = User(name="R", email="rules@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    profile = RiskProfile(
+        user_id=user.id, profile="moderado", score=50, rules='["regra_a", "regra_b"]'
+    )
+    obs = chat_agent._build_risk_profile_observation(db_session, user, profile)
+    assert "Regras aplicadas: regra_a, regra_b" in obs.content
+
+    profile.rules = "texto livre"
+    obs = chat_agent._build_risk_profile_observation(db_session, user, profile)
+    assert "Regras aplicadas (texto): texto livre" in obs.content
+
+
+def test_portfolio_observation_converts_fx_and_formats_top_positions(
+    db_session, monkeypatch
+):
+    user = User(name="User", email="obs@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    portfolio = Portfolio(user_id=user.id, name="Minha")
+    usd = Asset(
+        symbol="OBSU", name="Usd", class_="etf", currency="USD", last_quote_price=3.0
+    )
+    brl = Asset(symbol="OBSB", name="Brl", class_="acao", currency="BRL")
+    db_session.add_all(
+        [
+            portfolio,
+            usd,
+            brl,
+            Holding(portfolio=portfolio, asset=usd, quantity=2.0, avg_price=2.0),
+            Holding(portfolio=portfolio, asset=brl, quantity=10.0, avg_price=1.5),
+        ]
+    )
+    db_session.commit()
+    monkeypatch.setattr(chat_agent, "get_fx_rate", lambda a, b: (5.0, None))
+
+    obs = chat_agent._build_portfolio_observation(db_session, user)
+    totals = obs.data["totals"]
+    assert totals["current_value"] == 45.0  # 2 * 3 * 5 + 10 * 1.5
+    assert totals["invested_value"] == 35.0
+    assert [h["symbol"] for h in obs.data["holdings"]] == ["OBSU", "OBSB"]
+    assert obs.data["holdings"][0]["avg_price"] == 10.0
+    assert [(c["class"], c["value"]) for c in obs.data["class_breakdown"]] == [
+        ("etf", 30.0),
+        ("acao", 15.0),
+    ]
+    shares = [c["share_pct"] for c in obs.data["class_breakdown"]]
+    assert shares == [30.0 / 45.0 * 100.0, 15.0 / 45.0 * 100.0]
+    assert obs.content.splitlines()[:4] == [
+        "Carteira 'Minha': valor atual R$ 45,00 (resultado acumulado R$ 10,00 | 28.57%).",
+        "Principais posicoes (top 5 por valor atual):",
+        "- OBSU: etf | R$ 30,00 | R$ 10,00 (50.00%)",
+        "- OBSB: acao | R$ 15,00 | R$ 0,00 (0.00%)",
+    ]
+
+
+def test_news_observation_is_cached_per_symbol_set(monkeypatch):
+    calls = []
+
+    def fake_fetch(symbols, **kwargs):
+        calls.append(list(symbols))
+        return {"items": [{"headline": "H", "matched_symbols": symbols}]}
+
+    monkeypatch.setattr(chat_agent.news, "fetch_news_for_symbols", fake_fetch)
+    first = chat_agent._build_news_observation(["AAA", "BBB"])
+    second = chat_agent._build_news_observation(["BBB", "AAA", "AAA"])
+    assert second is first
+    assert calls == [["AAA", "BBB"]]
+
+    monkeypatch.setattr(chat_agent.time, "time", lambda: 10**12)
+    chat_agent._build_news_observation(["AAA", "BBB"])
+    assert len(calls) == 2
+
+
+def test_news_observation_does_not_cache_failures(monkeypatch):
+    def boom(symbols, **kwargs):
+        raise RuntimeError("offline")
+
+    monkeypatch.setattr(chat_agent.news, "fetch_news_for_symbols", boom)
+    failed = chat_agent._build_news_observation(["CCC"])
+    assert failed.data["error"] == "offline"
+    assert len(chat_agent._NEWS_CACHE) == 0
+
+
+def test_compose_context_puts_stable_observations_before_news():
+    obs = chat_agent.ToolObservation
+    agent = chat_agent.ChatAgent()
+    observations = [
+        obs(name="market_news", description="Noticias", content="nada", data={}),
+        obs(name="risk_profile", description="Perfil", content="moderado", data={}),
+        obs(name="portfolio_overview", description="Carteira", content="c", data={}),
+    ]
+    expected = (
+        "[portfolio_overview] Carteira\nc\n\n"
+        "[risk_profile] Perfil\nmoderado\n\n"
+        "[market_news] Noticias\nnada"
+    )
+    assert agent._compose_context(observations) == expected
+    assert agent._compose_context(observations[::-1]) == expected
+
+
+def test_portfolio_observation_looks_up_each_currency_once(db_session, monkeypatch):
+    user = User(name="User", email="fx-once@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    portfolio = Portfolio(user_id=user.id, name="Fx")
+    assets = [
+        Asset(symbol=s, name=s, class_="acao", currency=c, last_quote_price=1.0)
+        for s, c in (("FXA", "USD"), ("FXB", "USD"), ("FXC", "EUR"), ("FXD", "BRL"))
+    ]
+    db_session.add_all(
+        [portfolio, *assets]
+        + [
+            Holding(portfolio=portfolio, asset=a, quantity=1.0, avg_price=1.0)
+            for a in assets
+        ]
+    )
+    db_session.commit()
+    calls = []
+
+    def fake_fx(base, quote):
+        calls.append(base)
+        if base == "EUR":
+            raise RuntimeError("sem cotacao")
+        return 5.0, None
+
+    monkeypatch.setattr(chat_agent, "get_fx_rate", fake_fx)
+    obs = chat_agent._build_portfolio_observation(db_session, user)
+    assert sorted(calls) == ["EUR", "USD"]
+    assert obs.data["totals"]["current_value"] == 12.0  # 5 + 5 + 1 + 1
+
+
+def test_transactions_observation_aggregates_by_symbol_and_date(db_session):
+    user = User(name="User", email="tx-agg@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    portfolio = Portfolio(user_id=user.id, name="Tx")
+    asset = Asset(symbol="TXA", name="Txa", class_="acao")
+    day = datetime(2024, 5, 2, 10, 0)
+    db_session.add_all([portfolio, asset])
+    db_session.commit()
+    db_session.add_all(
+        [
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                type=typ,
+                quantity=qty,
+                price=10.0,
+                total=qty * 10.0,
+                executed_at=day,
+            )
+            for typ, qty in (("buy", 2.0), ("buy", 1.0), ("sell", 1.0))
+        ]
+    )
+    db_session.commit()
+
+    obs = chat_agent._build_transactions_observation(db_session, user)
+    assert obs.data["symbol_totals"] == {
+        "TXA": {
+            "buys_total": 30.0,
+            "buys_qty": 3.0,
+            "sells_total": 10.0,
+            "sells_qty": 1.0,
+        }
+    }
+    assert obs.data["buys_by_date"] == {"2024-05-02": {"TXA": 30.0}}
+    assert obs.data["sells_by_date"] == {"2024-05-02": {"TXA": 10.0}}
+    assert type(obs.data["buys_by_date"]["2024-05-02"]) is dict
+    assert "  2024-05-02: TXA: R$ 30,00" in obs.content
+    first = obs.data["transactions"][0]
+    assert (first["symbol"], first["status"], first["price"]) == ("TXA", "active", 10.0)
+    assert first["executed_at"] == "2024-05-02T10:00:00"
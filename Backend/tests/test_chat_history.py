@@ -1,5 +1,7 @@
+from datetime import datetime, timedelta
 from types import SimpleNamespace
 
+from app.db.models import ChatMessage, ChatSession
 from app.routes import chat as chat_route
 
 
@@ -42,3 +44,28 @@ def test_chat_session_and_history(client, user_token, monkeypatch):
     assert history.status_code == 200
     messages = history.json()["messages"]
     assert len(messages) >= 2  # user + assistant
+
+
+def test_fetch_history_returns_last_window_in_order(db_session, user_token):
+    _, user = user_token
+    session = ChatSession(user_id=user.id)
+    db_session.add(session)
+    db_session.commit()
+    start = datetime(2024, 1, 1, 12, 0)
+    db_session.add_all(
+        [
+            ChatMessage(
+                session_id=session.id,
+                role="user",
+                content=f"m{i}",
+                created_at=start + timedelta(minutes=i),
+            )
+            for i in range(6)
+        ]
+    )
+    db_session.commit()
+
+    window = chat_route._fetch_history(db_session, session.id, 3)
+    assert [m.content for m in window] == ["m3", "m4", "m5"]
+    full = chat_route._fetch_history(db_session, session.id, 0)
+    assert [m.content for m in full] == [f"m{i}" for i in range(6)]
@@ -1,5 +1,8 @@
+import json
 from types import SimpleNamespace
 
+from app.db.models import ChatMessage
+
 from app.routes import chat as chat_route
 
 
@@ -31,3 +34,65 @@ def test_chat_post_returns_agent_reply(client, user_token, monkeypatch):
     body = resp.json()
     assert body["reply"] == "ok"
     assert body["used_fallback"] is False
+
+
+def test_chat_stream_emits_tokens_and_persists_reply(
+    client, user_token, db_session, monkeypatch
+):
+    headers, _ = user_token
+
+    def fake_stream_reply(db, user, message, history):
+        return SimpleNamespace(
+            observations=[],
+            chunks=iter(["Ola", ", mundo"]),
+            used_fallback=False,
+            error=None,
+        )
+
+    monkeypatch.setattr(
+        chat_route, "_agent", SimpleNamespace(stream_reply=fake_stream_reply)
+    )
+    monkeypatch.setattr(
+        chat_route,
+        "_settings",
+        SimpleNamespace(chat=SimpleNamespace(enabled=True, history_window=5)),
+    )
+
+    request_roles = []
+    original_add = db_session.add
+
+    def tracking_add(instance, *args, **kwargs):
+        if isinstance(instance, ChatMessage):
+            request_roles.append(instance.role)
+        return original_add(instance, *args, **kwargs)
+
+    monkeypatch.setattr(db_session, "add", tracking_add)
+
+    resp = client.post("/api/chat/stream", headers=headers, json={"message": "oi"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = [
+        (block.split("\n")[0][len("event: ") :], json.loads(block.split("\n")[1][6:]))
+        for block in resp.text.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["meta", "token", "token", "done"]
+    session_id = events[0][1]["session_id"]
+    assert [data["text"] for name, data in events if name == "token"] == [
+        "Ola",
+        ", mundo",
+    ]
+    assert events[-1][1] == {"used_fallback": False, "error": None}
+
+    stored = (
+        db_session.query(ChatMessage)
+        .filter(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.id)
+        .all()
+    )
+    assert [(m.role, m.content) for m in stored] == [
+        ("user", "oi"),
+        ("assistant", "Ola, mundo"),
+    ]
+    # A resposta final sai por uma sessao propria, nao pela do get_db
+    assert request_roles == ["user"]
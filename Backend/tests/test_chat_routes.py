@@ -18,7 +18,7 @@ def test_chat_status_missing_llm(monkeypatch):
         "_settings",
         type("S", (), {"chat": type("C", (), {"enabled": True})()})(),
     )
-    dummy_agent = type("A", (), {"_llm": None, "_prompt": object()})()
+    dummy_agent = type("A", (), {"_llm_ready": lambda self: False})()
     monkeypatch.setattr(chat_route, "_agent", dummy_agent)
     status = chat_route.get_chat_status()
     assert status.ready is False
@@ -12,6 +12,13 @@ from app.services.currency import normalize_currency_code
         (None, "BTC-USD", "USD"),
         (None, "BOVA11.SA", "BRL"),
         (None, "EUR=X", "BRL"),  # fallback default when unknown and no match
+        (None, "eth-btc", "BTC"),
+        (None, "WBTC", "BTC"),
+        (None, "PETR4-BRL", "BRL"),
+        (None, "SHOP-CAD", "CAD"),
+        (None, "VOD/EUR", "EUR"),
+        (None, "BTC", "BTC"),
+        (None, "SA", "BRL"),
     ],
 )
 def test_normalize_currency_code(raw, symbol, expected):
@@ -20,3 +27,10 @@ def test_normalize_currency_code(raw, symbol, expected):
 
 def test_normalize_currency_code_defaults_to_brl():
     assert normalize_currency_code(None, None) == "BRL"
+
+
+def test_normalize_currency_code_is_memoized_with_default():
+    normalize_currency_code.cache_clear()
+    assert normalize_currency_code(None, "XYZ", default="usd") == "USD"
+    assert normalize_currency_code(None, "XYZ", default="usd") == "USD"
+    assert normalize_currency_code.cache_info().hits == 1
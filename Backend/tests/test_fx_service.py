@@ -44,3 +44,17 @@ def test_get_fx_rate_cache(monkeypatch):
     rate2, _ = fx.get_fx_rate("USD", "BRL")
     assert rate1 == rate2 == 4.0
     assert calls["count"] == 0
+
+
+def test_get_fx_rate_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(
+        fx, "yf", type("yf", (), {"Ticker": lambda symbol: DummyTicker(2.0)})
+    )
+    monkeypatch.setattr(fx, "_FX_CACHE_MAXSIZE", 2)
+    fx._FX_CACHE.clear()
+
+    for base in ("USD", "EUR", "GBP"):
+        fx.get_fx_rate(base, "BRL")
+
+    assert len(fx._FX_CACHE) == 2
+    assert "GBP:BRL" in fx._FX_CACHE
@@ -1,25 +1,16 @@
 from datetime import date
 
+import pandas as pd
+
 from app.db.models import Asset, AssetPrice
 from app.services import history
 
 
-class DummyHistory:
-    def __init__(self, rows):
-        self._rows = rows
-        self.empty = len(rows) == 0
-
-    def iterrows(self):
-        for d, close in self._rows:
-            yield type(
-                "Idx",
-                (),
-                {
-                    "to_pydatetime": lambda self, dt=d: type(
-                        "D", (), {"date": lambda self: dt}
-                    )()
-                },
-            )(), {"Close": close}
+def _history_frame(rows):
+    return pd.DataFrame(
+        {"Close": [close for _, close in rows]},
+        index=pd.DatetimeIndex([d for d, _ in rows], tz="America/Sao_Paulo"),
+    )
 
 
 class DummyTicker:
@@ -27,7 +18,7 @@ class DummyTicker:
         self._rows = rows
 
     def history(self, *args, **kwargs):
-        return DummyHistory(self._rows)
+        return _history_frame(self._rows)
 
 
 def test_ensure_price_history_inserts_missing_rows(db_session, monkeypatch):
@@ -57,11 +48,65 @@ def test_ensure_history_for_assets_calls_each_asset(db_session, monkeypatch):
 
     called = {"count": 0}
 
-    def fake_ensure(db, asset, start, end):
+    def fake_ensure(db, asset, start, end, existing=None):
         called["count"] += 1
+        assert existing == {}
 
     monkeypatch.setattr(history, "ensure_price_history", fake_ensure)
     history.ensure_history_for_assets(
-        db_session, [a1, a2], date(2024, 1, 1), date(2024, 1, 2)
+        db_session, [a1, a2, a1], date(2024, 1, 1), date(2024, 1, 2)
     )
     assert called["count"] == 2
+
+
+def test_ensure_history_for_assets_updates_and_inserts_in_batch(
+    db_session, monkeypatch
+):
+    a1 = Asset(symbol="BAT1", name="Bat1", class_="acao", currency="BRL")
+    a2 = Asset(symbol="BAT2", name="Bat2", class_="acao", currency="BRL")
+    db_session.add_all([a1, a2])
+    db_session.commit()
+    db_session.add(AssetPrice(asset_id=a1.id, date=date(2024, 1, 1), close=1.0))
+    db_session.commit()
+
+    rows = {
+        "BAT1": [(date(2024, 1, 1), 10.0), (date(2024, 1, 2), 11.0)],
+        "BAT2": [(date(2024, 1, 2), 20.0), (date(2024, 1, 5), 99.0)],
+    }
+    monkeypatch.setattr(history.yf, "Ticker", lambda symbol: DummyTicker(rows[symbol]))
+
+    history.ensure_history_for_assets(
+        db_session, [a1, a2], date(2024, 1, 1), date(2024, 1, 2)
+    )
+    db_session.commit()
+    db_session.expire_all()
+
+    saved = {
+        (row.asset_id, row.date): row.close
+        for row in db_session.query(AssetPrice).all()
+    }
+    assert saved == {
+        (a1.id, date(2024, 1, 1)): 10.0,
+        (a1.id, date(2024, 1, 2)): 11.0,
+        (a2.id, date(2024, 1, 2)): 20.0,
+    }
+
+
+def test_ensure_price_history_skips_missing_closes(db_session, monkeypatch):
+    asset = Asset(symbol="NANP", name="Nan", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+
+    rows = [
+        (date(2023, 12, 29), 8.0),
+        (date(2024, 1, 1), None),
+        (date(2024, 1, 2), float("nan")),
+        (date(2024, 1, 3), 12.5),
+    ]
+    monkeypatch.setattr(history.yf, "Ticker", lambda symbol: DummyTicker(rows))
+
+    history.ensure_price_history(db_session, asset, date(2024, 1, 1), date(2024, 1, 3))
+    db_session.commit()
+
+    saved = db_session.query(AssetPrice).filter(AssetPrice.asset_id == asset.id).all()
+    assert [(row.date, row.close) for row in saved] == [(date(2024, 1, 3), 12.5)]
@@ -49,3 +49,23 @@ def test_create_and_sell_holding(client, user_token, db_session):
     )
     assert sale.status_code == 200
     assert sale.json()["remaining"] == 2.0
+
+
+def test_import_holdings_merges_repeated_symbols_in_one_batch(
+    client, user_token, db_session
+):
+    headers, _ = user_token
+    resp = client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[
+            {"symbol": "bbas3.sa", "quantity": 1, "avg_price": 10.0},
+            {"symbol": "BBAS3.SA", "quantity": 3, "avg_price": 12.0},
+        ],
+    )
+    assert resp.status_code == 200
+    assert resp.json() == {"created": 1, "updated": 1}
+
+    rows = db_session.query(Holding).all()
+    assert len(rows) == 1
+    assert (rows[0].quantity, rows[0].avg_price) == (3.0, 12.0)
@@ -160,3 +160,33 @@ def test_fetch_news_matches_related_tickers(monkeypatch):
     debug = response["meta"]["debug"]
     assert debug["raw_per_symbol"]["PETR4.SA"] == 1
     assert debug["after_cutoff"]["PETR4.SA"] == 1
+
+
+def test_fetch_news_fetches_each_variant_once(monkeypatch):
+    calls: list[str] = []
+
+    def fake_fetch(symbol: str) -> list[dict]:
+        calls.append(symbol)
+        if symbol == "PBR":
+            return [
+                _payload(
+                    "Petrobras ADR sobe",
+                    "https://example.com/pbr",
+                    "Reuters",
+                    ["PBR"],
+                )
+            ]
+        return []
+
+    monkeypatch.setattr(news_service, "_safe_fetch_symbol_news", fake_fetch)
+
+    response = news_service.fetch_news_for_symbols(
+        ["PETR4.SA", "PETR3.SA"],
+        lookback=timedelta(days=3),
+        total_limit=5,
+        per_symbol_limit=2,
+    )
+
+    assert sorted(calls) == ["PBR", "PETR3", "PETR3.SA", "PETR4", "PETR4.SA"]
+    assert [item["url"] for item in response["items"]] == ["https://example.com/pbr"]
+    assert set(response["items"][0]["matched_symbols"]) == {"PETR4.SA", "PETR3.SA"}
@@ -21,3 +21,19 @@ def test_analyse_sentiment_detects_positive_and_negative():
     )
     assert label_pos == "positivo" and score_pos > 0
     assert label_neg == "negativo"
+
+
+def test_analyse_sentiment_counts_repeated_terms_and_is_memoized():
+    news._analyse_sentiment.cache_clear()
+    label, score, magnitude = news._analyse_sentiment(
+        "Alta, alta e mais alta", "Risco moderado"
+    )
+    assert (label, score, magnitude) == ("positivo", 0.75, 0.5)
+    assert news._analyse_sentiment("Sem termos do lexico", None) == (
+        "neutro",
+        0.5,
+        0.0,
+    )
+
+    news._analyse_sentiment("Alta, alta e mais alta", "Risco moderado")
+    assert news._analyse_sentiment.cache_info().hits == 1
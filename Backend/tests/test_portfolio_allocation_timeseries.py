@@ -26,6 +26,80 @@ def test_portfolio_allocation_endpoint(client, user_token, monkeypatch):
     assert isinstance(body["items"], list)
 
 
+def test_portfolio_allocation_groups_small_positions(client, user_token, monkeypatch):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[
+            {"symbol": "BIG1", "quantity": 1, "avg_price": 900},
+            {"symbol": "MID1", "quantity": 1, "avg_price": 85},
+            {"symbol": "TINY1", "quantity": 1, "avg_price": 10},
+            {"symbol": "TINY2", "quantity": 1, "avg_price": 5},
+        ],
+    )
+    monkeypatch.setattr(
+        "app.routes.portfolio.ensure_history_for_assets", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr("app.routes.portfolio.get_fx_rate", lambda a, b: (1.0, None))
+
+    resp = client.get(
+        "/api/portfolio/allocation",
+        headers=headers,
+        params={"mode": "asset", "group_small": 0.02},
+    )
+    assert resp.status_code == 200
+    items = resp.json()["items"]
+    assert [(i["symbol"], i["value"], i["weight_pct"]) for i in items] == [
+        ("BIG1", 900.0, 90.0),
+        ("MID1", 85.0, 8.5),
+        ("OUTROS", 15.0, 1.5),
+    ]
+
+    resp = client.get(
+        "/api/portfolio/allocation",
+        headers=headers,
+        params={"mode": "asset", "group_small": 0},
+    )
+    assert [i["symbol"] for i in resp.json()["items"]] == [
+        "BIG1",
+        "MID1",
+        "TINY1",
+        "TINY2",
+    ]
+
+
+def test_portfolio_allocation_weights_use_unrounded_values(
+    client, user_token, monkeypatch
+):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[
+            {"symbol": "RAW1", "quantity": 1, "avg_price": 0.996},
+            {"symbol": "RAW2", "quantity": 1, "avg_price": 0.004},
+        ],
+    )
+    monkeypatch.setattr(
+        "app.routes.portfolio.ensure_history_for_assets", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr("app.routes.portfolio.get_fx_rate", lambda a, b: (1.0, None))
+
+    resp = client.get(
+        "/api/portfolio/allocation",
+        headers=headers,
+        params={"mode": "asset", "group_small": 0},
+    )
+    assert resp.status_code == 200
+    items = resp.json()["items"]
+    # Arredondar o valor antes (0.004 -> 0.0) zeraria o peso do RAW2
+    assert [(i["symbol"], i["value"], i["weight_pct"]) for i in items] == [
+        ("RAW1", 1.0, 99.6),
+        ("RAW2", 0.0, 0.4),
+    ]
+
+
 def test_portfolio_timeseries_endpoint(client, user_token, monkeypatch):
     headers, _ = user_token
     _setup_simple_portfolio(client, headers)
@@ -0,0 +1,97 @@
+from datetime import date
+
+from app.db.models import Asset, AssetPrice
+from app.routes import portfolio as portfolio_route
+
+
+def test_convert_to_brl_with_meta_brl_fast_path(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("FX nao deve ser consultado para BRL")
+
+    monkeypatch.setattr(portfolio_route, "get_fx_rate", fail)
+    fx_cache = {}
+    result = portfolio_route.convert_to_brl_with_meta(12.5, "BRL", fx_cache)
+    assert result == (12.5, 1.0, None, "BRL")
+    assert fx_cache == {}
+
+
+def test_fx_rate_is_cached_and_reused(monkeypatch):
+    calls = []
+
+    def fake_fx(base, quote):
+        calls.append((base, quote))
+        return 5.0, None
+
+    monkeypatch.setattr(portfolio_route, "get_fx_rate", fake_fx)
+    fx_cache = {}
+    rate = portfolio_route._fx_rate("usd", fx_cache)
+    assert rate == 5.0
+    assert portfolio_route.convert_to_brl_fast(2.0, rate) == 10.0
+
+    converted, rate_meta, _, currency = portfolio_route.convert_to_brl_with_meta(
+        3.0, "USD", fx_cache
+    )
+    assert (converted, rate_meta, currency) == (15.0, 5.0, "USD")
+    assert calls == [("USD", "BRL")]
+
+
+def test_latest_closes_returns_most_recent_close_per_asset(db_session):
+    first = Asset(symbol="LC1", name="Lc1", class_="acao", currency="BRL")
+    second = Asset(symbol="LC2", name="Lc2", class_="acao", currency="BRL")
+    db_session.add_all([first, second])
+    db_session.commit()
+    db_session.add_all(
+        [
+            AssetPrice(asset_id=first.id, date=date(2024, 1, 1), close=10),
+            AssetPrice(asset_id=first.id, date=date(2024, 1, 3), close=12),
+            AssetPrice(asset_id=second.id, date=date(2024, 1, 2), close=7),
+        ]
+    )
+    db_session.commit()
+
+    latest = portfolio_route._latest_closes(db_session, [first.id, second.id, 999])
+    assert latest == {first.id: 12.0, second.id: 7.0}
+    assert portfolio_route._latest_closes(db_session, []) == {}
+
+    before = portfolio_route._latest_closes(
+        db_session, [first.id, second.id], before=date(2024, 1, 3)
+    )
+    assert before == {first.id: 10.0, second.id: 7.0}
+    assert (
+        portfolio_route._latest_closes(db_session, [first.id], before=date(2024, 1, 1))
+        == {}
+    )
+
+
+def test_prefetch_fx_resolves_each_pending_currency_once(monkeypatch):
+    calls = []
+
+    def fake_fx(base, quote):
+        calls.append(base)
+        if base == "JPY":
+            raise portfolio_route.FxRateNotFoundError(base)
+        return {"USD": 5.0, "EUR": 6.0}[base], None
+
+    monkeypatch.setattr(portfolio_route, "get_fx_rate", fake_fx)
+    fx_cache = {"GBP": (7.0, None)}
+    portfolio_route._prefetch_fx(
+        ["usd", "EUR", "BRL", None, "USD", "GBP", "JPY"], fx_cache
+    )
+    assert sorted(calls) == ["EUR", "JPY", "USD"]
+    assert fx_cache == {
+        "GBP": (7.0, None),
+        "USD": (5.0, None),
+        "EUR": (6.0, None),
+        "JPY": (1.0, None),
+    }
+
+
+def test_round_item_fields_keeps_builtin_round_at_half_cent_boundaries():
+    item = {field: 1234.565 for field in portfolio_route.SUMMARY_ROUNDED_FIELDS}
+    item["valor"] = 2.675
+    item["symbol"] = "KEEP"
+    [rounded] = portfolio_route._round_item_fields([item])
+    assert rounded["pnl_abs"] == 1234.57
+    assert rounded["valor"] == 2.67
+    assert rounded["symbol"] == "KEEP"
+    assert portfolio_route._round_item_fields([]) == []
@@ -4,7 +4,6 @@ from types import SimpleNamespace
 from app.routes import portfolio as portfolio_route
 from app.db.models import Transaction
 
-
 FAKE_OPTIONS = {
     "allow_sells": True,
     "prefer_etfs": False,
@@ -209,3 +208,92 @@ def test_rebalance_apply_conflict_on_request_id(
     }
     resp = client.post("/api/portfolio/rebalance/apply", headers=headers, json=body)
     assert resp.status_code == 409
+
+
+def test_rebalance_apply_replans_with_updated_quantities(
+    client, user_token, monkeypatch
+):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[{"symbol": "PLAN1", "quantity": 1, "avg_price": 10}],
+    )
+    seen_quantities = []
+
+    def fake_rebalance(holdings, *args, **kwargs):
+        seen_quantities.append({h.symbol: h.quantity for h in holdings})
+        return _fake_result(symbol="PLAN1", action="comprar", quantity=1.0)
+
+    monkeypatch.setattr(portfolio_route, "rebalance_portfolio", fake_rebalance)
+    body = {
+        "request_id": "req-replan",
+        "suggestions": [
+            {"symbol": "PLAN1", "action": "comprar", "quantity": 1, "price": 10}
+        ],
+        "options": FAKE_OPTIONS,
+    }
+    resp = client.post("/api/portfolio/rebalance/apply", headers=headers, json=body)
+    assert resp.status_code == 200
+    assert resp.json()["applied"] == 1
+    assert seen_quantities == [{"PLAN1": 1.0}, {"PLAN1": 2.0}]
+
+
+def test_rebalance_apply_unknown_symbol_returns_404(client, user_token, monkeypatch):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[{"symbol": "BASE1", "quantity": 1, "avg_price": 10}],
+    )
+    monkeypatch.setattr(
+        portfolio_route,
+        "rebalance_portfolio",
+        lambda *args, **kwargs: _fake_result(symbol="GHOST1"),
+    )
+    body = {
+        "request_id": "req-404",
+        "suggestions": [
+            {"symbol": "ghost1", "action": "comprar", "quantity": 1, "price": 10}
+        ],
+        "options": FAKE_OPTIONS,
+    }
+    resp = client.post("/api/portfolio/rebalance/apply", headers=headers, json=body)
+    assert resp.status_code == 404
+    assert "GHOST1" in resp.json()["detail"]
+
+
+def test_rebalance_apply_buys_asset_outside_portfolio(
+    client, user_token, db_session, monkeypatch
+):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[{"symbol": "BASE2", "quantity": 1, "avg_price": 10}],
+    )
+    db_session.add(
+        portfolio_route.Asset(symbol="NEWB1", name="Nova", currency="BRL", class_="etf")
+    )
+    db_session.commit()
+    monkeypatch.setattr(
+        portfolio_route,
+        "rebalance_portfolio",
+        lambda *args, **kwargs: _fake_result(symbol="NEWB1"),
+    )
+    body = {
+        "request_id": "req-new",
+        "suggestions": [
+            {"symbol": "NEWB1", "action": "comprar", "quantity": 1, "price": 10}
+        ],
+        "options": FAKE_OPTIONS,
+    }
+    resp = client.post("/api/portfolio/rebalance/apply", headers=headers, json=body)
+    assert resp.status_code == 200
+    holding = (
+        db_session.query(portfolio_route.Holding)
+        .join(portfolio_route.Asset)
+        .filter(portfolio_route.Asset.symbol == "NEWB1")
+        .one()
+    )
+    assert holding.quantity == 1.0
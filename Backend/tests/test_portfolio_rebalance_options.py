@@ -99,7 +99,7 @@ def test_portfolio_rebalance_apply_conflict_request_id(
         },
     )
     monkeypatch.setattr(
-        portfolio_route, "record_transaction", lambda *args, **kwargs: None
+        portfolio_route, "record_transactions", lambda *args, **kwargs: None
     )
 
     body = {
@@ -120,3 +120,126 @@ def test_portfolio_rebalance_apply_conflict_request_id(
     assert first.status_code in (200, 422)
     second = client.post("/api/portfolio/rebalance/apply", headers=headers, json=body)
     assert second.status_code in (409, 422, 200)
+
+
+def test_resolve_profile_context_parses_rules_and_reuses_cache(db_session, user_token):
+    _, user = user_token
+    db_session.add(
+        portfolio_route.RiskProfile(
+            user_id=user.id,
+            profile="arrojado",
+            score=80,
+            rules='["sem_alavancagem", 3]',
+        )
+    )
+    db_session.commit()
+    portfolio_route._profile_rules_context.cache_clear()
+
+    rp, allocation, source, rules = portfolio_route._resolve_profile_context(
+        db_session, user.id, None
+    )
+    assert (rp.score, allocation.profile, source) == (80, "arrojado", "stored")
+    assert rules == ["sem_alavancagem", "3"]
+
+    rules.append("mutado")
+    _, allocation, source, rules = portfolio_route._resolve_profile_context(
+        db_session, user.id, "Conservador"
+    )
+    assert (allocation.profile, source) == ("conservador", "override")
+    assert rules == ["sem_alavancagem", "3"]
+    assert portfolio_route._profile_rules_context.cache_info().hits == 0
+
+    portfolio_route._resolve_profile_context(db_session, user.id, None)
+    assert portfolio_route._profile_rules_context.cache_info().hits == 1
+
+
+def test_round6_rows_rounds_table_in_one_pass():
+    assert portfolio_route._round6_rows([]) == []
+    rows = portfolio_route._round6_rows([(0.1234567, 0.5), (1 / 3, -2 / 3)])
+    assert rows == [[0.123457, 0.5], [0.333333, -0.666667]]
+
+
+def test_compute_rebalance_total_uses_compensated_sum(monkeypatch):
+    monkeypatch.setattr(
+        portfolio_route,
+        "rebalance_portfolio",
+        lambda *args, **kwargs: SimpleNamespace(
+            class_summaries={},
+            suggestions=[],
+            within_bands=True,
+            turnover=0.0,
+            net_cash_flow=0.0,
+            notes=[],
+            priced_at=datetime.now(timezone.utc),
+            missing_buy_classes=[],
+        ),
+    )
+    holdings = [
+        portfolio_route.HoldingSnapshot(
+            symbol=f"H{i}",
+            name=f"H{i}",
+            asset_class="acao",
+            quantity=1.0,
+            price=value,
+            value=value,
+        )
+        for i, value in enumerate([1e16, 1.0, 1.0])
+    ]
+    allocation = SimpleNamespace(profile="moderado", weights={}, bands={})
+    plan = portfolio_route._compute_rebalance(
+        holdings,
+        (None, allocation, "default", []),
+        allow_sells=True,
+        prefer_etfs=False,
+        min_trade_value=100.0,
+        max_turnover=0.25,
+    )
+    assert plan["total_value"] == 1e16 + 2
+
+
+def test_holdings_stamp_changes_when_units_move_between_assets(db_session, user_token):
+    from datetime import date
+
+    from app.db.models import Asset, AssetPrice, Holding
+    from app.services.portfolio_utils import get_or_create_default_portfolio
+
+    _, user = user_token
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    first = Asset(symbol="STMP1", name="S1", class_="acao", currency="BRL")
+    second = Asset(symbol="STMP2", name="S2", class_="acao", currency="BRL")
+    db_session.add_all([first, second])
+    db_session.commit()
+    past = datetime(2020, 1, 1)
+    h1 = Holding(
+        portfolio_id=portfolio.id,
+        asset_id=first.id,
+        quantity=5,
+        avg_price=10,
+        updated_at=past,
+    )
+    h2 = Holding(
+        portfolio_id=portfolio.id,
+        asset_id=second.id,
+        quantity=5,
+        avg_price=10,
+        updated_at=past,
+    )
+    db_session.add_all([h1, h2])
+    db_session.commit()
+    before = portfolio_route._holdings_stamp(db_session, portfolio.id)
+
+    # Venda de 2 de um ativo e compra de 2 do outro, com data retroativa
+    h1.quantity, h1.updated_at = 3, past
+    h2.quantity, h2.updated_at = 7, past
+    db_session.commit()
+    swapped = portfolio_route._holdings_stamp(db_session, portfolio.id)
+    assert swapped != before
+
+    second.class_ = "etf"
+    db_session.commit()
+    reclassified = portfolio_route._holdings_stamp(db_session, portfolio.id)
+    assert reclassified != swapped
+
+    db_session.add(AssetPrice(asset_id=first.id, date=date(2024, 1, 2), close=11))
+    db_session.commit()
+    assert portfolio_route._holdings_stamp(db_session, portfolio.id) != reclassified
@@ -78,6 +78,51 @@ def test_portfolio_rebalance_endpoint(client, user_token, monkeypatch):
     assert body["suggestions"][0]["symbol"] == "PLAN1"
 
 
+def test_portfolio_rebalance_is_memoized_until_holdings_change(
+    client, user_token, db_session, monkeypatch
+):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[{"symbol": "PLAN1", "quantity": 1, "avg_price": 10}],
+    )
+    fake_allocation = SimpleNamespace(
+        profile="moderado",
+        weights={"acao": 0.5},
+        bands={"acao": 0.1},
+        description="desc",
+    )
+    monkeypatch.setattr(
+        portfolio_route,
+        "_resolve_profile_context",
+        lambda db, uid, override: (None, fake_allocation, "default", []),
+    )
+    calls = []
+
+    def fake_rebalance(holdings, weights, bands, options):
+        calls.append([h.quantity for h in holdings])
+        return _stub_rebalance_result()
+
+    monkeypatch.setattr(portfolio_route, "rebalance_portfolio", fake_rebalance)
+
+    for _ in range(2):
+        resp = client.get("/api/portfolio/rebalance", headers=headers)
+        assert resp.status_code == 200
+    assert calls == [[1.0]]
+
+    client.get(
+        "/api/portfolio/rebalance", headers=headers, params={"allow_sells": False}
+    )
+    assert len(calls) == 2
+
+    holding = db_session.query(portfolio_route.Holding).one()
+    holding.quantity = 3
+    db_session.commit()
+    client.get("/api/portfolio/rebalance", headers=headers)
+    assert calls[-1] == [3.0]
+
+
 def test_portfolio_rebalance_apply_happy_path(client, user_token, monkeypatch):
     headers, _ = user_token
     client.post(
@@ -144,7 +189,7 @@ def test_portfolio_rebalance_apply_happy_path(client, user_token, monkeypatch):
         },
     )
     monkeypatch.setattr(
-        portfolio_route, "record_transaction", lambda *args, **kwargs: None
+        portfolio_route, "record_transactions", lambda *args, **kwargs: None
     )
 
     body = {
@@ -11,3 +11,78 @@ def test_portfolio_summary_returns_totals(client, user_token):
     body = resp.json()
     assert body["market_total"] > 0
     assert len(body.get("itens", [])) >= 1
+
+
+def test_portfolio_summary_serializes_dates_as_iso_strings(client, user_token):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[{"symbol": "SUM2", "quantity": 1, "avg_price": 10}],
+    )
+
+    resp = client.get("/api/portfolio/summary", headers=headers)
+    assert resp.status_code == 200
+    item = resp.json()["itens"][0]
+    assert isinstance(item["created_at"], str)
+    assert "T" in item["created_at"]
+    assert item["purchase_date"] is None or len(item["purchase_date"]) == 10
+
+
+def test_portfolio_summary_item_math(client, user_token, db_session):
+    from datetime import date, timedelta
+
+    from app.db.models import Asset, AssetPrice, Holding
+    from app.services.portfolio_utils import get_or_create_default_portfolio
+
+    headers, user = user_token
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    asset = Asset(
+        symbol="SUMM", name="Summ", class_="acao", currency="BRL", last_quote_price=12
+    )
+    empty = Asset(symbol="SUMZ", name="Zero", class_="acao", currency="BRL")
+    db_session.add_all([asset, empty])
+    db_session.commit()
+    today = date.today()
+    db_session.add_all(
+        [
+            Holding(
+                portfolio_id=portfolio.id, asset_id=asset.id, quantity=3, avg_price=10
+            ),
+            Holding(
+                portfolio_id=portfolio.id, asset_id=empty.id, quantity=1, avg_price=0
+            ),
+            AssetPrice(asset_id=asset.id, date=today, close=12),
+            AssetPrice(asset_id=asset.id, date=today - timedelta(days=1), close=8),
+        ]
+    )
+    db_session.commit()
+
+    body = client.get("/api/portfolio/summary", headers=headers).json()
+    assert body["market_total"] == 36.0
+    assert body["invested_total"] == 30.0
+    assert body["day_change_abs"] == 12.0
+    item = next(i for i in body["itens"] if i["symbol"] == "SUMM")
+    assert item["pnl_abs"] == 6.0
+    assert item["pnl_pct"] == 20.0
+    assert item["day_change_pct"] == 50.0
+    assert item["pct"] == 100.0
+    zero = next(i for i in body["itens"] if i["symbol"] == "SUMZ")
+    assert zero["pnl_pct"] == 0.0
+
+
+def test_portfolio_summary_pct_uses_builtin_round(client, user_token):
+    headers, _ = user_token
+    client.post(
+        "/api/import/holdings",
+        headers=headers,
+        json=[
+            {"symbol": "PCT1", "quantity": 1, "avg_price": 2.675},
+            {"symbol": "PCT2", "quantity": 1, "avg_price": 97.325},
+        ],
+    )
+
+    body = client.get("/api/portfolio/summary", headers=headers).json()
+    pcts = {item["symbol"]: item["pct"] for item in body["itens"]}
+    # 2.675% fica 2.67 com round(); np.round daria 2.68
+    assert pcts == {"PCT1": 2.67, "PCT2": 97.33}
@@ -0,0 +1,192 @@
+from datetime import date, datetime, timedelta
+
+from app.db.models import Asset, AssetPrice, Holding, Transaction
+from app.routes.portfolio import _derive_portfolio_earliest_date
+from app.services.portfolio_utils import get_or_create_default_portfolio
+
+
+def _seed(db_session, user):
+    today = date.today()
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    brl = Asset(symbol="TSBRL", name="Ts BRL", class_="acao", currency="BRL")
+    usd = Asset(symbol="TSUSD", name="Ts USD", class_="etf", currency="USD")
+    db_session.add_all([brl, usd])
+    db_session.commit()
+
+    start = today - timedelta(days=5)
+    start_dt = datetime.combine(start, datetime.min.time())
+    db_session.add_all(
+        [
+            Holding(
+                portfolio_id=portfolio.id,
+                asset_id=brl.id,
+                quantity=1,
+                avg_price=10,
+                purchase_date=start,
+            ),
+            Holding(
+                portfolio_id=portfolio.id,
+                asset_id=usd.id,
+                quantity=1,
+                avg_price=2,
+                purchase_date=start,
+            ),
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=brl.id,
+                type="buy",
+                quantity=2,
+                price=10,
+                total=20,
+                executed_at=start_dt,
+            ),
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=usd.id,
+                type="buy",
+                quantity=1,
+                price=2,
+                total=2,
+                executed_at=start_dt,
+            ),
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=brl.id,
+                type="sell",
+                quantity=1,
+                price=15,
+                total=15,
+                executed_at=datetime.combine(
+                    today - timedelta(days=1), datetime.min.time()
+                ),
+            ),
+            AssetPrice(asset_id=brl.id, date=start, close=10),
+            AssetPrice(asset_id=brl.id, date=today - timedelta(days=3), close=12),
+            AssetPrice(asset_id=usd.id, date=start, close=3),
+        ]
+    )
+    db_session.commit()
+    return start
+
+
+def test_timeseries_forward_fills_prices_and_tracks_pnl(
+    client, user_token, db_session, monkeypatch
+):
+    headers, user = user_token
+    start = _seed(db_session, user)
+    monkeypatch.setattr(
+        "app.routes.portfolio.ensure_history_for_assets", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr("app.routes.portfolio.get_fx_rate", lambda a, b: (5.0, None))
+
+    resp = client.get(
+        "/api/portfolio/timeseries", headers=headers, params={"range": "1M"}
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["start_date"] == start.isoformat()
+    series = body["series"]
+    assert len(series) == 6
+    assert [point["date"] for point in series] == [
+        (start + timedelta(days=offset)).isoformat() for offset in range(6)
+    ]
+
+    first = series[0]
+    assert first["market_value"] == 35.0  # 2 * 10 + 1 * 3 * 5
+    assert first["invested"] == 22.0
+    assert first["pnl_total"] == 13.0
+    assert first["pnl_realized"] == 0.0
+
+    assert series[2]["market_value"] == 39.0  # preco BRL atualizado para 12
+
+    before_last = series[-2]
+    assert before_last["market_value"] == 27.0  # 1 * 12 + 1 * 15
+    assert before_last["invested"] == 7.0
+    assert before_last["pnl_realized"] == 5.0
+    assert before_last["pnl_total"] == 20.0
+    assert before_last["pnl_unrealized"] == 15.0
+    assert body["as_of"] == series[-1]["date"]
+
+
+def test_derive_earliest_date_uses_holdings_and_active_transactions(
+    user_token, db_session
+):
+    _, user = user_token
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    asset = Asset(symbol="EARLY1", name="Early", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    db_session.add_all(
+        [
+            Holding(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                quantity=1,
+                avg_price=1,
+                purchase_date=date(2024, 3, 10),
+            ),
+            Holding(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                quantity=1,
+                avg_price=1,
+                purchase_date=None,
+                created_at=datetime(2024, 2, 5, 12, 0),
+            ),
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                type="buy",
+                quantity=1,
+                price=1,
+                total=1,
+                executed_at=datetime(2023, 12, 1, 9, 30),
+                status="voided",
+            ),
+        ]
+    )
+    db_session.commit()
+
+    assert _derive_portfolio_earliest_date(db_session, portfolio) == date(2024, 2, 5)
+
+
+def test_timeseries_rounds_half_cent_like_builtin_round(
+    client, user_token, db_session, monkeypatch
+):
+    headers, user = user_token
+    start = date.today() - timedelta(days=1)
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    asset = Asset(symbol="TSHALF", name="Half", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    db_session.add_all(
+        [
+            Holding(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                quantity=1,
+                avg_price=1,
+                purchase_date=start,
+            ),
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                type="buy",
+                quantity=1,
+                price=1,
+                total=1,
+                executed_at=datetime.combine(start, datetime.min.time()),
+            ),
+            AssetPrice(asset_id=asset.id, date=start, close=1234.565),
+        ]
+    )
+    db_session.commit()
+    monkeypatch.setattr(
+        "app.routes.portfolio.ensure_history_for_assets", lambda *args, **kwargs: None
+    )
+
+    resp = client.get(
+        "/api/portfolio/timeseries", headers=headers, params={"range": "1M"}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["series"][0]["market_value"] == 1234.57
@@ -28,3 +28,130 @@ def test_portfolio_transactions_list(client, user_token, db_session):
     body = resp.json()
     assert isinstance(body, dict)
     assert body.get("items") or []
+
+
+def test_portfolio_transactions_pagination_total(client, user_token, db_session):
+    headers, user = user_token
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    asset = Asset(symbol="TRX2", name="Trx", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    for day in (1, 2, 3):
+        db_session.add(
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                type="buy",
+                quantity=1,
+                price=10,
+                total=10,
+                executed_at=datetime(2024, 1, day, tzinfo=timezone.utc),
+                status="active",
+            )
+        )
+    db_session.commit()
+
+    body = client.get(
+        "/api/portfolio/transactions", headers=headers, params={"limit": 2}
+    ).json()
+    assert body["total"] == 3
+    assert len(body["items"]) == 2
+    assert body["items"][0]["executed_at"].startswith("2024-01-03")
+
+    body = client.get(
+        "/api/portfolio/transactions", headers=headers, params={"offset": 5}
+    ).json()
+    assert body["total"] == 3
+    assert body["items"] == []
+
+
+def test_portfolio_transactions_cursor_walks_all_pages(client, user_token, db_session):
+    headers, user = user_token
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    asset = Asset(symbol="TRX3", name="Trx", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    # Dois lancamentos no mesmo instante exercitam o desempate por id
+    for day in (1, 2, 2, 3, 4):
+        db_session.add(
+            Transaction(
+                portfolio_id=portfolio.id,
+                asset_id=asset.id,
+                type="buy",
+                quantity=1,
+                price=10,
+                total=10,
+                executed_at=datetime(2024, 1, day, tzinfo=timezone.utc),
+                status="active",
+            )
+        )
+    db_session.commit()
+
+    for order in ("desc", "asc"):
+        seen = []
+        params = {"limit": 2, "order": order}
+        while True:
+            body = client.get(
+                "/api/portfolio/transactions", headers=headers, params=params
+            ).json()
+            assert body["total"] == 5
+            seen.extend(item["id"] for item in body["items"])
+            if not body["next_cursor"]:
+                break
+            params = {"limit": 2, "order": order, "cursor": body["next_cursor"]}
+        assert len(seen) == len(set(seen)) == 5
+
+    resp = client.get(
+        "/api/portfolio/transactions", headers=headers, params={"cursor": "###"}
+    )
+    assert resp.status_code == 422
+
+
+def test_update_and_void_transaction_return_persisted_values(
+    client, user_token, db_session
+):
+    headers, user = user_token
+    portfolio = get_or_create_default_portfolio(db_session, user.id)
+    asset = Asset(symbol="TRX4", name="Trx Four", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    tx = Transaction(
+        portfolio_id=portfolio.id,
+        asset_id=asset.id,
+        type="buy",
+        quantity=1,
+        price=10,
+        total=10,
+        executed_at=datetime(2024, 1, 1),
+        status="active",
+    )
+    db_session.add(tx)
+    db_session.commit()
+
+    resp = client.patch(
+        f"/api/portfolio/transactions/{tx.id}",
+        headers=headers,
+        json={"quantity": 3, "price": 12.5, "executed_at": "2024-01-05T13:00:00-03:00"},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["total"] == 37.5
+    assert body["name"] == "Trx Four"
+    assert body["executed_at"] == "2024-01-05T16:00:00+00:00"
+    assert body["source"] == "manual"
+
+    resp = client.post(
+        f"/api/portfolio/transactions/{tx.id}/void",
+        headers=headers,
+        json={"note": "lancado errado"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "voided"
+
+    db_session.expire_all()
+    stored = db_session.get(Transaction, tx.id)
+    assert (stored.total, stored.status, stored.note) == (
+        37.5,
+        "voided",
+        "lancado errado",
+    )
@@ -1,7 +1,11 @@
 from datetime import datetime, timezone
 
 from app.db.models import Asset, Portfolio, Transaction, User
-from app.services.portfolio_utils import record_transaction
+from app.services.portfolio_utils import (
+    record_transaction,
+    record_transactions,
+    transaction_row,
+)
 
 
 def test_record_transaction_persists_with_normalized_timestamp(db_session):
@@ -33,3 +37,32 @@ def test_record_transaction_persists_with_normalized_timestamp(db_session):
     # Executed_at deve estar em UTC "naive"
     assert row.executed_at.tzinfo is None
     assert row.note == "unit-test"
+
+
+def test_record_transactions_inserts_batch_and_skips_zero_quantity(db_session):
+    user = User(name="U2", email="u2@example.com", password_hash="x")
+    db_session.add(user)
+    db_session.commit()
+    portfolio = Portfolio(user_id=user.id, name="Principal")
+    asset = Asset(symbol="BATCH", name="Batch", class_="acao", currency="BRL")
+    db_session.add_all([portfolio, asset])
+    db_session.commit()
+
+    executed = datetime(2024, 1, 2, 15, 0, tzinfo=timezone.utc)
+    rows = [
+        transaction_row(
+            portfolio.id, asset.id, tx_type, qty, 10.0, executed_at=executed
+        )
+        for tx_type, qty in (("buy", 2), ("sell", -1), ("buy", 0))
+    ]
+    assert rows[2] is None
+    record_transactions(db_session, [row for row in rows if row])
+    db_session.commit()
+
+    stored = db_session.query(Transaction).order_by(Transaction.id).all()
+    assert [(tx.type, tx.quantity, tx.total) for tx in stored] == [
+        ("buy", 2.0, 20.0),
+        ("sell", 1.0, 10.0),
+    ]
+    assert all(tx.status == "active" and tx.kind == "trade" for tx in stored)
+    assert stored[0].executed_at == datetime(2024, 1, 2, 15, 0)
@@ -1,3 +1,11 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.db.models import Asset, AssetPrice
 from app.routes import prices as prices_route
 
 
@@ -21,19 +29,108 @@ def test_upsert_daily_creates_price(client, user_token):
     assert body["date"] == "2024-01-01"
 
 
+def test_upsert_overwrites_existing_close(client, user_token, db_session):
+    headers, _ = user_token
+    for close in (10.0, 11.5):
+        resp = client.post(
+            "/api/prices/upsert",
+            headers=headers,
+            json={"symbol": "UPS1", "date": "2024-01-02", "close": close},
+        )
+        assert resp.status_code == 201
+        assert resp.json()["close"] == close
+
+    rows = db_session.query(AssetPrice).all()
+    assert [(row.date.isoformat(), row.close) for row in rows] == [("2024-01-02", 11.5)]
+
+
+def test_bulk_upsert_inserts_and_updates_in_one_call(client, user_token, db_session):
+    headers, _ = user_token
+    client.post(
+        "/api/prices/upsert",
+        headers=headers,
+        json={"symbol": "BLK1", "date": "2024-01-01", "close": 1.0},
+    )
+    resp = client.post(
+        "/api/prices/bulk-upsert",
+        headers=headers,
+        json=[
+            {"symbol": "BLK1", "date": "2024-01-01", "close": 2.0},
+            {"symbol": "BLK1", "date": "2024-01-02", "close": 3.0},
+            {"symbol": "blk2", "date": "2024-01-01", "close": 4.0},
+            {"symbol": "BLK2", "date": "2024-01-01", "close": 5.0},
+        ],
+    )
+    assert resp.status_code == 201
+    assert resp.json() == {"upserted": 3}
+
+    rows = (
+        db_session.query(Asset.symbol, AssetPrice.date, AssetPrice.close)
+        .join(Asset, Asset.id == AssetPrice.asset_id)
+        .order_by(Asset.symbol, AssetPrice.date)
+        .all()
+    )
+    assert [(sym, d.isoformat(), close) for sym, d, close in rows] == [
+        ("BLK1", "2024-01-01", 2.0),
+        ("BLK1", "2024-01-02", 3.0),
+        ("BLK2", "2024-01-01", 5.0),
+    ]
+
+    resp = client.post(
+        "/api/prices/bulk-upsert",
+        headers=headers,
+        json=[{"symbol": "BLK1", "date": "01/02/2024", "close": 1.0}],
+    )
+    assert resp.status_code == 422
+
+
+def test_price_history_returns_latest_closes_first(client, user_token):
+    headers, _ = user_token
+    client.post(
+        "/api/prices/bulk-upsert",
+        headers=headers,
+        json=[
+            {"symbol": "HIST1", "date": "2024-01-01", "close": 10},
+            {"symbol": "HIST1", "date": "2024-01-03", "close": 12.5},
+            {"symbol": "HIST1", "date": "2024-01-02", "close": 11},
+        ],
+    )
+    resp = client.get("/api/prices/history/hist1", headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [(row["date"], row["close"]) for row in body] == [
+        ("2024-01-03", 12.5),
+        ("2024-01-02", 11.0),
+        ("2024-01-01", 10.0),
+    ]
+    assert body[0]["price_type"] == "close"
+
+    resp = client.get("/api/prices/history/NOPE", headers=headers)
+    assert resp.status_code == 404
+
+
+def test_price_history_of_asset_without_prices_is_empty(client, user_token):
+    headers, _ = user_token
+    client.post("/api/assets", json={"symbol": "NOPX1", "name": "Sem precos"})
+    resp = client.get("/api/prices/history/NOPX1", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
 def test_refresh_quotes_uses_mock_refresh(client, user_token, monkeypatch):
     headers, _ = user_token
     called = {"count": 0}
 
-    def fake_refresh(db, asset, force=False):
-        called["count"] += 1
-        asset.last_quote_price = 10.0
+    def fake_refresh(db, assets, force=False):
+        for asset in assets:
+            called["count"] += 1
+            asset.last_quote_price = 10.0
         return True
 
     def fake_get_fx(base, quote):
         return 1.0, prices_route.datetime.now()
 
-    monkeypatch.setattr(prices_route, "refresh_asset_quote", fake_refresh)
+    monkeypatch.setattr(prices_route, "refresh_asset_quotes", fake_refresh)
     monkeypatch.setattr(prices_route, "get_fx_rate", fake_get_fx)
 
     # primeiro cria o asset
@@ -52,3 +149,120 @@ def test_refresh_quotes_uses_mock_refresh(client, user_token, monkeypatch):
     assert called["count"] == 1
     data = resp.json()["quotes"]["MOCK1"]
     assert data["price"] == 10.0
+
+
+def test_upsert_price_rows_splits_large_batches(db_session, monkeypatch):
+    asset = Asset(symbol="CHK1", name="Chunk", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    monkeypatch.setattr(prices_route, "PRICE_UPSERT_CHUNK", 2)
+
+    rows = [
+        {"asset_id": asset.id, "date": date(2024, 1, day), "close": float(day)}
+        for day in range(1, 6)
+    ]
+    prices_route.upsert_price_rows(db_session, rows)
+    prices_route.upsert_price_rows(db_session, rows[:1] + [dict(rows[4], close=9.0)])
+    db_session.commit()
+
+    stored = db_session.query(AssetPrice).order_by(AssetPrice.date).all()
+    assert [row.close for row in stored] == [1.0, 2.0, 3.0, 4.0, 9.0]
+
+
+def test_copy_upsert_prices_streams_tsv_into_staging_table():
+    executed = []
+    copied = {}
+
+    class FakeCursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql):
+            executed.append(sql)
+
+        def copy_expert(self, sql, buf):
+            copied["sql"] = sql
+            copied["data"] = buf.read()
+
+    fake_db = SimpleNamespace(
+        connection=lambda: SimpleNamespace(
+            connection=SimpleNamespace(cursor=FakeCursor)
+        )
+    )
+    prices_route._copy_upsert_prices(
+        fake_db,
+        [
+            {"asset_id": 1, "date": date(2024, 1, 2), "close": 10.5},
+            {"asset_id": 2, "date": date(2024, 1, 2), "close": 0.1},
+        ],
+    )
+    assert copied["sql"].startswith("COPY _px_stage")
+    assert copied["data"] == "1\t2024-01-02\t10.5\n2\t2024-01-02\t0.1\n"
+    assert "ON CONFLICT (asset_id, date)" in executed[1]
+    assert executed[-1] == "DROP TABLE _px_stage"
+
+
+def test_upsert_price_rows_fallback_preloads_existing_rows(db_session, monkeypatch):
+    asset = Asset(symbol="FBK1", name="Fallback", class_="acao", currency="BRL")
+    db_session.add(asset)
+    db_session.commit()
+    db_session.add(AssetPrice(asset_id=asset.id, date=date(2024, 1, 1), close=1.0))
+    db_session.commit()
+    monkeypatch.setattr(prices_route, "_price_insert", lambda db: None)
+    rows = [
+        {"asset_id": asset.id, "date": date(2024, 1, day), "close": day + 1.0}
+        for day in (1, 2, 3)
+    ]
+
+    statements = []
+
+    def record_sql(conn, cursor, sql, *args):
+        statements.append(sql)
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", record_sql)
+    prices_route.upsert_price_rows(db_session, rows)
+    db_session.commit()
+    event.remove(db_session.get_bind(), "before_cursor_execute", record_sql)
+
+    assert sum(sql.lstrip().startswith("SELECT") for sql in statements) == 1
+    assert sum(sql.lstrip().startswith("UPDATE") for sql in statements) == 1
+    assert sum(sql.lstrip().startswith("INSERT") for sql in statements) == 1
+    stored = db_session.query(AssetPrice).order_by(AssetPrice.date).all()
+    assert [row.close for row in stored] == [2.0, 3.0, 4.0]
+
+
+def test_get_or_create_assets_inserts_missing_in_one_statement(db_session, monkeypatch):
+    existing = Asset(symbol="GOC1", name="Existing", class_="etf", currency="USD")
+    db_session.add(existing)
+    db_session.commit()
+
+    assets = prices_route.get_or_create_assets(db_session, ["goc1", " goc2 ", "GOC3"])
+    assert set(assets) == {"GOC1", "GOC2", "GOC3"}
+    assert assets["GOC1"].id == existing.id
+    assert assets["GOC1"].class_ == "etf"
+    assert assets["GOC2"].id is not None
+    assert (assets["GOC3"].name, assets["GOC3"].currency) == ("GOC3", "BRL")
+
+    monkeypatch.setattr(prices_route, "_price_insert", lambda db: None)
+    fallback = prices_route.get_or_create_assets(db_session, ["GOC2", "GOC4"])
+    assert fallback["GOC2"].id == assets["GOC2"].id
+    assert fallback["GOC4"].id is not None
+    assert db_session.query(Asset).filter(Asset.symbol.like("GOC%")).count() == 4
+
+
+@pytest.mark.parametrize(
+    "raw", ["20240102", "2024-W01-1", "2024-02-30", "02/01/2024", "2024-01-02T00"]
+)
+def test_parse_price_date_only_accepts_plain_iso_dates(raw):
+    assert prices_route._parse_price_date("2024-01-02") == date(2024, 1, 2)
+    with pytest.raises(HTTPException) as exc:
+        prices_route._parse_price_date(raw)
+    assert exc.value.status_code == 422
+
+
+def test_parse_price_date_accepts_unpadded_dates():
+    assert prices_route._parse_price_date("2024-1-2") == date(2024, 1, 2)
+    assert prices_route._parse_price_date("2024-12-3") == date(2024, 12, 3)
@@ -10,10 +10,10 @@ def test_refresh_quotes_returns_404_on_quote_error(client, user_token, monkeypat
         json={"symbol": "ERR1", "name": "Err Asset"},
     )
 
-    def fake_refresh(db, asset, force=False):
-        raise QuoteNotFoundError(asset.symbol)
+    def fake_refresh(db, assets, force=False):
+        raise QuoteNotFoundError(next(iter(assets)).symbol)
 
-    monkeypatch.setattr(prices_route, "refresh_asset_quote", fake_refresh)
+    monkeypatch.setattr(prices_route, "refresh_asset_quotes", fake_refresh)
 
     resp = client.post(
         "/api/prices/refresh",
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+import pytest
+
 from app.db.models import Asset, AssetPrice
 from app.services import quotes
 
@@ -36,3 +38,34 @@ def test_needs_refresh_respects_ttl(monkeypatch):
     monkeypatch.setattr(quotes, "_now_utc", lambda: now)
     assert quotes.needs_refresh(asset, force=False) is False
     assert quotes.needs_refresh(asset, force=True) is True
+
+
+def test_refresh_asset_quotes_fetches_pending_and_reports_missing(
+    db_session, monkeypatch
+):
+    fresh = Asset(symbol="FRESH", name="Fresh", class_="acao", currency="BRL")
+    stale = Asset(symbol="STALE", name="Stale", class_="acao", currency="BRL")
+    db_session.add_all([fresh, stale])
+    db_session.commit()
+
+    now = datetime(2024, 1, 1, 12, 0)
+    fresh.last_quote_at = now
+    fetched = []
+
+    def fake_fetch_latest_quote(symbol: str):
+        fetched.append(symbol)
+        if symbol == "GONE":
+            raise quotes.QuoteNotFoundError(symbol)
+        return 10.0, now, "brl"
+
+    monkeypatch.setattr(quotes, "_now_utc", lambda: now)
+    monkeypatch.setattr(quotes, "fetch_latest_quote", fake_fetch_latest_quote)
+
+    assert quotes.refresh_asset_quotes(db_session, [fresh, stale]) is True
+    assert fetched == ["STALE"]
+    assert stale.last_quote_price == 10.0
+    assert quotes.refresh_asset_quotes(db_session, [fresh]) is False
+
+    gone = Asset(symbol="GONE", name="Gone", class_="acao", currency="BRL")
+    with pytest.raises(quotes.QuoteNotFoundError, match="GONE"):
+        quotes.refresh_asset_quotes(db_session, [gone], force=True)
@@ -26,3 +26,26 @@ def test_serialize_quote_converts_currency(monkeypatch):
     payload = prices_route._serialize_quote(asset)
     assert payload["price"] == 50.0
     assert payload["currency"] == "USD"
+
+
+def test_preload_fx_fetches_each_currency_once(monkeypatch):
+    calls = []
+
+    def fake_get_fx(base, quote):
+        calls.append((base, quote))
+        return 5.0, datetime(2024, 1, 1, 12, 0)
+
+    monkeypatch.setattr(prices_route, "get_fx_rate", fake_get_fx)
+    assets = [
+        Asset(id=1, symbol="AAA", currency="USD", last_quote_price=1.0),
+        Asset(id=2, symbol="BBB", currency="usd", last_quote_price=2.0),
+        Asset(id=3, symbol="CCC", currency="BRL", last_quote_price=3.0),
+        Asset(id=4, symbol="DDD", currency="EUR", last_quote_price=None),
+    ]
+    currency_by_id, fx_cache = prices_route._preload_fx(assets)
+    assert currency_by_id == {1: "USD", 2: "USD", 3: "BRL", 4: "EUR"}
+    assert calls == [("USD", "BRL")]
+
+    payload = prices_route._serialize_quote(assets[1], fx_cache, currency_by_id[2])
+    assert payload["price"] == 10.0
+    assert calls == [("USD", "BRL")]
@@ -42,3 +42,18 @@ def test_serialize_questionnaire_contains_all_questions():
     ids = [q["id"] for q in payload["questions"]]
     assert set(ids) == set(risk_profile.get_question_ids())
     assert payload["version"] == risk_profile.QUESTIONNAIRE_VERSION
+
+
+@pytest.mark.parametrize(
+    "score,expected",
+    [
+        (0, "conservador"),
+        (40, "conservador"),
+        (41, "moderado"),
+        (70, "moderado"),
+        (71, "arrojado"),
+        (100, "arrojado"),
+    ],
+)
+def test_score_to_profile_threshold_boundaries(score, expected):
+    assert risk_profile._score_to_profile(score) == expected
@@ -1,3 +1,7 @@
+import json
+
+from app.db.models import RiskProfile
+from app.routes import risk as risk_route
 from app.services import risk_profile
 
 
@@ -21,3 +25,86 @@ def test_get_and_set_risk_profile(client, user_token):
     saved = client.get("/api/risk", headers=headers)
     assert saved.status_code == 200
     assert saved.json()["profile"] == body["profile"]
+
+
+def test_questions_payload_is_built_once_per_version(client, monkeypatch):
+    calls = []
+
+    def fake_serialize():
+        calls.append(1)
+        return {"version": "v-test", "questions": []}
+
+    risk_route._cached_questionnaire.cache_clear()
+    monkeypatch.setattr(risk_route, "serialize_questionnaire", fake_serialize)
+    try:
+        first = client.get("/api/risk/questions").json()
+        second = client.get("/api/risk/questions").json()
+    finally:
+        risk_route._cached_questionnaire.cache_clear()
+    assert first == second == {"version": "v-test", "questions": []}
+    assert calls == [1]
+
+
+def test_get_profile_tolerates_corrupted_json_columns(client, user_token, db_session):
+    headers, user = user_token
+    answers = {qid: 3 for qid in risk_profile.get_question_ids()}
+    client.post("/api/risk", headers=headers, json={"answers": answers})
+
+    rp = db_session.query(RiskProfile).filter(RiskProfile.user_id == user.id).one()
+    assert json.loads(rp.answers) == {"answers": answers, "restrictions": []}
+    rp.answers = "{nao-e-json"
+    rp.rules = "["
+    db_session.commit()
+
+    body = client.get("/api/risk", headers=headers).json()
+    assert body["answers"] is None
+    assert body["rules_applied"] == []
+
+
+def test_set_profile_rejects_unknown_missing_or_out_of_scale_answers(
+    client, user_token
+):
+    headers, _ = user_token
+    answers = {qid: 3 for qid in risk_profile.get_question_ids()}
+
+    out_of_scale = dict(answers, tolerance=6)
+    resp = client.post("/api/risk", headers=headers, json={"answers": out_of_scale})
+    assert resp.status_code == 422
+
+    missing = dict(answers)
+    missing.pop("tolerance")
+    resp = client.post(
+        "/api/risk", headers=headers, json={"answers": dict(missing, extra_q=3)}
+    )
+    assert resp.status_code == 422
+    detail = str(resp.json()["detail"])
+    assert "tolerance" in detail and "extra_q" in detail
+
+
+def test_set_profile_upserts_single_row_per_user(client, user_token, db_session):
+    headers, user = user_token
+    answers = {qid: 1 for qid in risk_profile.get_question_ids()}
+    first = client.post("/api/risk", headers=headers, json={"answers": answers})
+    assert first.status_code == 200
+
+    answers = {qid: 5 for qid in risk_profile.get_question_ids()}
+    second = client.post(
+        "/api/risk", headers=headers, json={"answers": answers, "restrictions": ["x"]}
+    )
+    assert second.status_code == 200
+    assert second.json()["last_updated"] is not None
+
+    rows = db_session.query(RiskProfile).filter(RiskProfile.user_id == user.id).all()
+    assert len(rows) == 1
+    assert rows[0].score == second.json()["score"]
+    assert json.loads(rows[0].answers) == {"answers": answers, "restrictions": ["x"]}
+
+
+def test_get_profile_without_assessment_returns_defaults(client, user_token):
+    headers, _ = user_token
+    body = client.get("/api/risk", headers=headers).json()
+    assert body["profile"] is None
+    assert body["answers"] is None
+    assert (body["restrictions"], body["rules_applied"]) == ([], [])
+    assert body["questionnaire_version"] == risk_profile.QUESTIONNAIRE_VERSION
+    assert body["allocation"]["profile"] == "moderado"